@@ -0,0 +1,133 @@
+'''
+AI智能体预热
+相机加入房间时，与转推/媒体流输入任务并发启动智能体，用户无需在相机进房后再等待智能体冷启动
+
+会话状态保存在Redis中（回调可能落在其它实例上）：
+    requested_at  发起启动的时间
+    ready_at      启动接口返回的时间
+    joined_at     智能体进房的时间
+    used_at       首个真人用户进房的时间（相机和转推流使用设备的身份进房，不算作使用）
+预热后 ai_prewarm_timeout 秒内仍没有真人用户进房，则停止智能体
+'''
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+from vertc_client import (
+    start_voice_chat,
+    stop_voice_chat,
+    start_video_chat,
+    stop_video_chat,
+    )
+from redis_client import redis_client
+from schemas import HUMAN_USER_ID_LENGTH
+from metrics import metrics
+from utils import current_timestamp_ms
+from config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class AgentPrewarmer:
+    """AI智能体预热管理"""
+
+    def __init__(self):
+        self._timers: Dict[str, asyncio.Task] = {}
+
+    # 智能体在房间内的用户ID
+    def get_bot_id(self, device_sn: str) -> str:
+        return f"{settings.ai_bot_user_prefix}{device_sn}"
+
+    # 是否为预热启动的智能体用户
+    def is_bot(self, user_id: str) -> bool:
+        return settings.ai_prewarm_enabled and user_id.startswith(settings.ai_bot_user_prefix)
+
+    def _session_ttl(self) -> int:
+        return int(settings.ai_prewarm_timeout + settings.token_expire_ts)
+
+    # 预热智能体；失败不影响相机进房，返回启动接口的响应（失败时返回None）
+    async def prewarm(self, room_id: str, device_sn: str) -> Optional[Dict[str, Any]]:
+        agent = settings.ai_prewarm_agent
+        bot_id = self.get_bot_id(device_sn)
+        requested_at = current_timestamp_ms()
+        redis_client.set_agent_session(room_id, {
+            "agent": agent,
+            "task_id": device_sn,
+            "bot_id": bot_id,
+            "requested_at": requested_at,
+        }, self._session_ttl())
+
+        try:
+            if agent == "video_chat":
+                response = await start_video_chat(room_id=room_id, bot_id=bot_id, user_id=device_sn, task_id=device_sn)
+            else:
+                response = await start_voice_chat(
+                    room_id=room_id, bot_id=bot_id, user_id=device_sn, task_id=device_sn, dialog_id=device_sn,
+                )
+        except Exception as e:
+            logger.error(f"预热AI智能体失败: {room_id}/{device_sn}, {str(e)}")
+            redis_client.delete_agent_session(room_id)
+            metrics.inc("agent_prewarm_total", agent=agent, result="failed")
+            return None
+
+        ready_at = current_timestamp_ms()
+        redis_client.set_agent_session(room_id, {"ready_at": ready_at}, self._session_ttl())
+        metrics.inc("agent_prewarm_total", agent=agent, result="ok")
+        metrics.observe("agent_time_to_ready_ms", ready_at - requested_at, agent=agent)
+
+        # 超时未被使用时自动停止
+        self._cancel_timer(room_id)
+        self._timers[room_id] = asyncio.create_task(self._expire_unused(room_id, device_sn))
+        return response
+
+    # 停止智能体并清理会话
+    async def stop(self, room_id: str, device_sn: str) -> None:
+        self._cancel_timer(room_id)
+        session = redis_client.get_agent_session(room_id)
+        if not session or session.get("task_id") != device_sn:
+            return
+        redis_client.delete_agent_session(room_id)
+        if session.get("agent") == "video_chat":
+            await stop_video_chat(room_id=room_id, task_id=device_sn)
+        else:
+            await stop_voice_chat(room_id=room_id, task_id=device_sn)
+
+    # 处理用户进房回调，返回该用户是否为智能体本身
+    def on_user_join(self, room_id: str, user_id: str) -> bool:
+        session = redis_client.get_agent_session(room_id)
+        if not session:
+            return self.is_bot(user_id)
+
+        now = current_timestamp_ms()
+        agent = session.get("agent", "")
+        if user_id == session.get("bot_id"):
+            if not session.get("joined_at"):
+                redis_client.set_agent_session(room_id, {"joined_at": now}, self._session_ttl())
+                metrics.observe("agent_time_to_join_ms", now - int(session["requested_at"]), agent=agent)
+            return True
+
+        if len(user_id) == HUMAN_USER_ID_LENGTH and not session.get("used_at"):
+            redis_client.set_agent_session(room_id, {"used_at": now}, self._session_ttl())
+            metrics.inc("agent_prewarm_used_total", agent=agent)
+        return False
+
+    def _cancel_timer(self, room_id: str) -> None:
+        timer = self._timers.pop(room_id, None)
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
+
+    async def _expire_unused(self, room_id: str, device_sn: str) -> None:
+        await asyncio.sleep(settings.ai_prewarm_timeout)
+        self._timers.pop(room_id, None)
+        session = redis_client.get_agent_session(room_id)
+        if session and session.get("task_id") == device_sn and not session.get("used_at"):
+            logger.warning(f"预热的AI智能体超时未被使用，停止: {room_id}/{device_sn}")
+            metrics.inc("agent_prewarm_expired_total", agent=session.get("agent", ""))
+            try:
+                await self.stop(room_id, device_sn)
+            except Exception as e:
+                logger.error(f"停止预热的AI智能体失败: {room_id}/{device_sn}, {str(e)}")
+
+
+# 创建智能体预热管理实例
+agent_prewarmer = AgentPrewarmer()
@@ -0,0 +1,269 @@
+'''
+AI智能体启动请求模板
+StartVoiceChat/StartVideoChat 的请求体绝大部分是静态配置（人设、TTS参数等），
+启动时只序列化一次，每次调用仅拼接 RoomId、TaskId、UserId、dialog_id 等少量字段
+
+模板可以从 agent_template_dir 目录下的 {name}.json 文件加载（文件修改后自动重新加载），
+文件不存在时使用内置模板。模板中的占位符写法：
+    "${room_id}"             每次调用时替换的字段
+    "${settings.rtc_app_id}"  加载模板时替换为配置项的值
+'''
+import os
+import re
+import json
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+from config import settings
+
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_VOICE_CHAT = "voice_chat"
+TEMPLATE_VIDEO_CHAT = "video_chat"
+
+# 智能体人设
+SYSTEM_ROLE = (
+    "##人设\n你的名字叫巨思（英文Juice），是一个全能的超级助手，具备强大的知识库、情感理解能力和解决问题的能力。"
+    "你的目标是高效、专业、友好地帮助用户完成各类任务，包括但不限于日常生活、工作安排、信息检索、学习辅导、创意写作、语言翻译和技术支持等；"
+    "\n\n##约束\n始终主动、礼貌、有条理；\n回答准确但不冗长，必要时可提供简洁总结+详细解释；\n不清楚的任务会主动澄清，不假设、不误导。"
+)
+WELCOME_MESSAGE = "我是巨思AI助手，有什么需要我为您效劳的吗？"
+
+# 内置模板
+BUILTIN_TEMPLATES: Dict[str, Dict[str, Any]] = {
+    # 实时对话式AI（StartVoiceChat）
+    TEMPLATE_VOICE_CHAT: {
+        "AppId": "${settings.rtc_app_id}",
+        "RoomId": "${room_id}",
+        "TaskId": "${task_id}",
+        "Config": {
+            "S2SConfig": {           # 端到端语音模型核心配置
+                "Provider": "volcano",  # 端到端语音模型服务提供商，当前固定取值 volcano
+                "ProviderParams": {  # 语音端到端模型的详细配置
+                    "app": {         # 认证信息
+                        "appid": "${settings.doubao_s2s_app_id}",  # 必填，端到端模型的appid
+                        "token": "${settings.doubao_s2s_access_token}"  # 必填，端到端模型的token
+                    },
+                    "tts": {  # TTS配置
+                        "speaker": "zh_female_vv_jupiter_bigtts"  # 指定发音人
+                    },
+                    "dialog": {  # 对话设定
+                        "bot_name": "巨思AI助手",
+                        "system_role": SYSTEM_ROLE,
+                        "speaking_style": "亲切",
+                        "dialog_id": "${dialog_id}"  # 可选项，加载相同dialog id的对话历史，如未设置，会默认生成一个唯一的 ID
+                    }
+                }
+            }
+        },
+        "AgentConfig": {
+            "TargetUserId": ["${user_id}"],  # 单个房间内，仅支持一个用户与智能体一对一通话
+            "WelcomeMessage": WELCOME_MESSAGE,  # 智能体启动后的欢迎词
+            "UserId": "${bot_id}"  # 智能体 ID，用于标识智能体
+        }
+    },
+
+    # 音视频互动智能体（StartVideoChat）
+    TEMPLATE_VIDEO_CHAT: {
+        "AppId": "${settings.volc_cai_app_id}",
+        "RoomId": "${room_id}",  # 房间ID
+        "TaskId": "${task_id}",  # 任务ID
+        "Config": {
+            "ASRConfig": {
+                "Provider": "volcano",
+                "ProviderParams": {
+                    "Mode": "bigmodel",
+                    "StreamMode": 0
+                },
+                "VADConfig": {},
+                "InterruptConfig": {}
+            },
+            "LLMConfig": {
+                "Mode": "ArkV3",
+                "ModelName": "doubao-seed-1-6-251015",
+                "TopP": 0.3,
+                "SystemMessages": [SYSTEM_ROLE],
+                "HistoryLength": 10,
+                "ThinkingType": "disabled",
+                "VisionConfig": {
+                    "SnapshotConfig": {},
+                    "StorageConfig": {
+                        "TosConfig": {}
+                    }
+                }
+            },
+            "TTSConfig": {
+                "Provider": "volcano_bidirection",
+                "ProviderParams": {
+                    "Credential": {
+                        "ResourceId": "seed-tts-1.0"
+                    },
+                    "VolcanoTTSParameters": json.dumps({
+                        "req_params": {
+                            "speaker": "zh_female_shuangkuaisisi_emo_v2_mars_bigtts",
+                            "audio_params": {"speech_rate": 0}
+                        }
+                    }, separators=(",", ":"))
+                }
+            },
+            "SubtitleConfig": {
+                "DisableRTSSubtitle": True
+            },
+            "InterruptMode": 0,
+            "FunctionCallingConfig": {},
+            "WebSearchAgentConfig": {},
+            "MemoryConfig": {},
+            "MusicAgentConfig": {}
+        },
+        "AgentConfig": {
+            "TargetUserId": ["${user_id}"],  # 目前仅支持一个用户与智能体对话
+            "UserId": "${bot_id}",
+            "WelcomeMessage": WELCOME_MESSAGE,
+            "Burst": {
+                "Enable": False,
+                "BufferSize": 0,
+                "Interval": 0
+            },
+            "VoicePrint": {
+                "MetaList": None,
+                "VoicePrintList": None
+            }
+        }
+    },
+}
+
+_SETTINGS_PLACEHOLDER = re.compile(r"^\$\{settings\.(\w+)\}$")
+_FIELD_PLACEHOLDER = re.compile(r'"\$\{(\w+)\}"')
+
+
+# 将模板中的配置项占位符替换为配置值
+def _resolve_settings(node: Any) -> Any:
+    if isinstance(node, dict):
+        return {k: _resolve_settings(v) for k, v in node.items()}
+    if isinstance(node, list):
+        return [_resolve_settings(v) for v in node]
+    if isinstance(node, str):
+        match = _SETTINGS_PLACEHOLDER.match(node)
+        if match:
+            return getattr(settings, match.group(1))
+    return node
+
+
+class RequestTemplate:
+    """预编译的请求模板：静态部分序列化为JSON片段，调用时只拼接字段值"""
+
+    def __init__(self, name: str, template: Dict[str, Any], source: str = "builtin"):
+        self.name = name
+        self.source = source
+        # 与原实现一致使用ASCII转义，SDK以str发送请求体时不能包含非ASCII字符
+        text = json.dumps(_resolve_settings(template))
+        parts = _FIELD_PLACEHOLDER.split(text)
+        # parts 为 [片段, 字段名, 片段, 字段名, ..., 片段]
+        self._fragments: List[str] = parts[0::2]
+        self.fields: List[str] = parts[1::2]
+
+    # 生成请求体JSON字符串
+    def render(self, **values: Any) -> str:
+        out = [self._fragments[0]]
+        for field, fragment in zip(self.fields, self._fragments[1:]):
+            out.append(json.dumps(values.get(field)))
+            out.append(fragment)
+        return "".join(out)
+
+
+class AgentTemplates:
+    """模板管理：按需加载、文件变化时热替换"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._templates: Dict[str, RequestTemplate] = {}
+        self._mtimes: Dict[str, Optional[float]] = {}
+        self._checked_at: Dict[str, float] = {}
+
+    def _template_path(self, name: str) -> Optional[str]:
+        if not settings.agent_template_dir:
+            return None
+        return os.path.join(settings.agent_template_dir, f"{name}.json")
+
+    def _load(self, name: str, path: Optional[str], mtime: Optional[float]) -> RequestTemplate:
+        if mtime is not None:
+            with open(path, "r", encoding="utf-8") as f:
+                template = RequestTemplate(name, json.load(f), source=path)
+        else:
+            template = RequestTemplate(name, BUILTIN_TEMPLATES[name])
+        logger.info(f"加载智能体请求模板: {name}, 来源: {template.source}, 字段: {template.fields}")
+        return template
+
+    # 获取模板，距上次检查超过 agent_template_reload_interval 时检查文件是否变化
+    def get(self, name: str) -> RequestTemplate:
+        now = time.monotonic()
+        template = self._templates.get(name)
+        if template is not None and now - self._checked_at.get(name, 0) < settings.agent_template_reload_interval:
+            return template
+
+        with self._lock:
+            self._checked_at[name] = now
+            path = self._template_path(name)
+            mtime = os.path.getmtime(path) if path and os.path.exists(path) else None
+            if template is None or mtime != self._mtimes.get(name):
+                try:
+                    template = self._load(name, path, mtime)
+                    self._templates[name] = template
+                    self._mtimes[name] = mtime
+                except Exception as e:
+                    # 新模板有误时继续使用旧模板
+                    if template is None:
+                        raise
+                    logger.error(f"加载智能体请求模板失败，继续使用旧模板: {name}, {e}")
+            return template
+
+    # 替换模板（不经过文件），用于运行时热更新
+    def set(self, name: str, template: Dict[str, Any]) -> None:
+        with self._lock:
+            self._templates[name] = RequestTemplate(name, template, source="runtime")
+            self._mtimes[name] = self._mtimes.get(name)
+            self._checked_at[name] = float("inf")  # 运行时设置的模板不再被文件覆盖
+
+    # 使用模板生成请求体
+    def render(self, name: str, **values: Any) -> str:
+        return self.get(name).render(**values)
+
+
+# 创建模板管理实例
+agent_templates = AgentTemplates()
+
+
+# 每次调用构建请求的耗时对比：原先的逐次构建字典并序列化 vs 预编译模板
+if __name__ == "__main__":
+    import timeit
+
+    rounds = 20000
+    values = dict(room_id="100", task_id="400", user_id="user_615", bot_id="bot_008", dialog_id="dialog_123")
+
+    # 逐层复制嵌套字典，开销与原实现中每次构建字典字面量相当
+    def copy_tree(node):
+        if isinstance(node, dict):
+            return {k: copy_tree(v) for k, v in node.items()}
+        if isinstance(node, list):
+            return [copy_tree(v) for v in node]
+        return node
+
+    for name in (TEMPLATE_VOICE_CHAT, TEMPLATE_VIDEO_CHAT):
+        resolved = _resolve_settings(BUILTIN_TEMPLATES[name])
+
+        def build_dict():
+            request = copy_tree(resolved)
+            request["RoomId"] = values["room_id"]
+            request["TaskId"] = values["task_id"]
+            request["AgentConfig"]["TargetUserId"] = [values["user_id"]]
+            request["AgentConfig"]["UserId"] = values["bot_id"]
+            json.dumps(request, indent=2, ensure_ascii=False)  # 原实现的调试日志
+            return json.dumps(request)
+
+        template = agent_templates.get(name)
+        assert json.loads(template.render(**values))["RoomId"] == "100"
+        dict_us = timeit.timeit(build_dict, number=rounds) / rounds * 1e6
+        template_us = timeit.timeit(lambda: template.render(**values), number=rounds) / rounds * 1e6
+        print(f"{name}: 逐次构建 {dict_us:.2f}us/次, 预编译模板 {template_us:.2f}us/次, 提升 {dict_us / template_us:.1f}x")
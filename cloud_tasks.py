@@ -0,0 +1,115 @@
+'''
+云端任务回收
+定期检查任务注册表，停止房间已不存在（崩溃、解散后遗留）的转推、媒体流输入和AI智能体任务
+'''
+import asyncio
+import logging
+from typing import List, Tuple
+from vertc_client import (
+    TASK_PUSH_MIXED_STREAM,
+    TASK_RELAY_STREAM,
+    TASK_VOICE_CHAT,
+    TASK_VIDEO_CHAT,
+    stop_push_stream_to_cdn,
+    stop_relay_stream,
+    stop_voice_chat,
+    stop_video_chat,
+    )
+from redis_client import redis_client
+from metrics import metrics
+from config import settings
+
+
+logger = logging.getLogger(__name__)
+
+# 各类型任务的停止方法
+TASK_STOPPERS = {
+    TASK_PUSH_MIXED_STREAM: stop_push_stream_to_cdn,
+    TASK_RELAY_STREAM: stop_relay_stream,
+    TASK_VOICE_CHAT: stop_voice_chat,
+    TASK_VIDEO_CHAT: stop_video_chat,
+}
+
+
+# 分批并发停止云端任务，返回停止成功的数量
+async def stop_cloud_tasks(tasks: List[Tuple[str, str, str]]) -> int:
+    """
+    Args:
+        tasks: [(房间ID, 任务类型, 任务ID), ...]
+    """
+    stopped = 0
+    batch_size = max(1, settings.cloud_task_stop_batch_size)
+    for i in range(0, len(tasks), batch_size):
+        batch = tasks[i:i + batch_size]
+        results = await asyncio.gather(
+            *[TASK_STOPPERS[kind](room_id, task_id) for room_id, kind, task_id in batch],
+            return_exceptions=True,
+        )
+        for (room_id, kind, task_id), result in zip(batch, results):
+            if isinstance(result, BaseException):
+                logger.error(f"停止云端任务失败: {room_id}/{kind}:{task_id}, {str(result)}")
+                metrics.inc("cloud_task_stop_total", kind=kind, result="failed")
+            else:
+                stopped += 1
+                metrics.inc("cloud_task_stop_total", kind=kind, result="ok")
+    return stopped
+
+
+# 停止房间内登记的所有云端任务
+async def stop_room_tasks(room_id: str) -> int:
+    tasks = [
+        (room_id, info["kind"], info["task_id"])
+        for info in redis_client.get_room_cloud_tasks(room_id).values()
+        if info.get("kind") in TASK_STOPPERS
+    ]
+    if not tasks:
+        return 0
+    logger.debug(f"停止房间内的云端任务: {room_id}, {len(tasks)}个")
+    return await stop_cloud_tasks(tasks)
+
+
+class CloudTaskReconciler:
+    """云端任务回收器"""
+
+    def __init__(self):
+        self._task: asyncio.Task = None
+
+    # 执行一轮回收：停止房间已不存在的任务
+    async def reconcile_once(self) -> int:
+        stale_tasks = []
+        for room_id in redis_client.iter_cloud_task_room_ids():
+            if redis_client.exists_room(room_id):
+                continue
+            for info in redis_client.get_room_cloud_tasks(room_id).values():
+                if info.get("kind") in TASK_STOPPERS:
+                    stale_tasks.append((room_id, info["kind"], info["task_id"]))
+
+        metrics.set("cloud_task_stale", len(stale_tasks))
+        if not stale_tasks:
+            return 0
+        logger.warning(f"发现遗留的云端任务: {len(stale_tasks)}个，开始停止")
+        return await stop_cloud_tasks(stale_tasks)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.cloud_task_reconcile_interval)
+            try:
+                await self.reconcile_once()
+            except Exception as e:
+                logger.error(f"云端任务回收失败: {e}")
+
+    # 启动周期回收
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    # 停止周期回收
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# 创建云端任务回收器实例
+cloud_task_reconciler = CloudTaskReconciler()
@@ -1,3 +1,4 @@
+from typing import Dict
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -39,6 +40,21 @@ class Settings(BaseSettings):
     redis_port: int = 6379
     redis_db: int = 0
     redis_password: str = ""
+    # Redis集群模式：同一房间的键使用哈希标签位于同一个槽；跨槽的全局索引不再与房间数据原子更新
+    redis_cluster: bool = False
+    # 集群的启动节点，逗号分隔的 host:port，为空时使用 redis_host:redis_port
+    redis_cluster_nodes: str = ""
+    # 只读副本，逗号分隔的 host:port（集群模式下不使用）；可以容忍短暂延迟的读请求
+    # （查询会议列表、设备所在房间、用户列表、重连同步）路由到副本，加入房间等需要读到自己写入的请求仍读取主节点
+    redis_replicas: str = ""
+    redis_replica_max_lag_ms: int = 1000        # 复制延迟超过此值的副本不再路由读请求
+    redis_replica_check_interval: float = 0.5   # 检测复制延迟的周期，单位秒
+    # 成员记录的编码：json 或 compact；读取时自动识别，所有实例都升级后再切换为compact
+    redis_record_codec: str = "json"
+    # 用户->房间映射的分片数，每个分片Hash的成员数保持在 hash-max-listpack-entries（默认128）以内；修改后需要重新迁移
+    user_room_shards: int = 1024
+    # 其他实例正在迁移键结构时，启动等待迁移完成的最长时间，单位秒；超时后启动失败
+    schema_migrate_wait_seconds: int = 900
 
     # MySQL配置
     mysql_host: str = "localhost"
@@ -47,6 +63,86 @@ class Settings(BaseSettings):
     mysql_password: str = ""
     mysql_database: str = "jusi_db"
 
+    # VeRTC OpenAPI 限流配置（按Action的令牌桶，QPS需与控制台配额保持一致）
+    vertc_rate_limit_enabled: bool = True
+    vertc_rate_limit_default_qps: float = 20
+    vertc_rate_limit_action_qps: Dict[str, float] = {
+        "SendUnicast": 50,
+        "SendBroadcast": 20,
+        "SendRoomUnicast": 50,
+        "StartPushMixedStreamToCDN": 10,
+        "StopPushStreamToCDN": 10,
+        "StartRelayStream": 10,
+        "StopRelayStream": 10,
+        "StartVoiceChat": 10,
+        "StopVoiceChat": 10,
+        "StartVideoChat": 10,
+        "StopVideoChat": 10,
+        "BanRoomUser": 10,
+    }
+    vertc_rate_limit_shared: bool = False  # 是否通过Redis在多个worker进程间共享令牌桶
+
+    # VeRTC OpenAPI 重试与熔断配置
+    vertc_retry_max_attempts: int = 3        # 最大尝试次数（含首次调用）
+    vertc_retry_base_delay: float = 0.2      # 退避基数，单位秒
+    vertc_retry_max_delay: float = 2.0       # 单次退避上限，单位秒
+    vertc_circuit_failure_threshold: int = 5  # 连续失败多少次后熔断
+    vertc_circuit_reset_timeout: float = 30  # 熔断后多久进入半开状态，单位秒
+
+    # 出站消息队列（Redis Stream + 消费组，至少一次投递）
+    outbox_enabled: bool = True
+    outbox_workers: int = 4               # 每个进程的投递worker数量
+    outbox_batch_size: int = 20           # 每次读取的消息数量
+    outbox_block_ms: int = 1000           # 无消息时阻塞等待的时长，单位毫秒
+    outbox_retry_idle_ms: int = 5000      # 投递失败的消息多久后重新投递，单位毫秒
+    outbox_max_attempts: int = 5          # 最大投递次数，超过后转入死信流
+    outbox_dead_letter_maxlen: int = 10000  # 死信流的最大长度
+    outbox_starvation_interval: int = 8   # 每隔多少轮优先调度低优先级消息，防止饿死
+
+    # 房间状态版本与变更日志，用于断线重连时增量同步
+    room_change_log_size: int = 200  # 每个房间保留的最近变更条数，超出后重连回退为全量同步
+    user_list_max_page_size: int = 200  # vcGetUserList分页获取时每页的最大数量
+    room_snapshot_cache_bytes: int = 64 * 1024 * 1024  # 房间快照缓存的最大字节数
+    # 房间近端缓存：各实例在内存中缓存房间状态和成员，修改时通过Redis发布订阅通知所有实例失效；所有实例都升级后再开启
+    room_cache_enabled: bool = False
+    room_cache_max_rooms: int = 1000    # 缓存的最大房间数，超出后按LRU淘汰
+    room_cache_ttl: float = 30          # 每个房间最多缓存的时长（兜底房间过期等没有通知的变化），单位秒
+    # 房间归属：多实例部署时按在线实例上的rendezvous哈希将每个房间的事件交给固定的实例处理，
+    # 其他实例收到的RTS消息和回调通过Redis发布订阅转发给归属实例
+    room_owner_enabled: bool = False
+    instance_heartbeat_interval: float = 2  # 实例心跳和房间归属租约续约的周期，单位秒
+    instance_lease_seconds: float = 10      # 实例在线和房间归属租约的时长，超时未续约的实例视为下线
+
+    # 房间数据过期与回收
+    room_idle_ttl: int = 7 * 24 * 60 * 60      # 房间数据的滑动过期时间，每次活跃时刷新，单位秒
+    room_touch_interval: int = 60              # 同一用户刷新房间活跃的最小间隔，单位秒
+    room_reap_idle_seconds: int = 6 * 60 * 60  # 有成员的房间超过该时间没有活跃则视为遗弃并关闭，单位秒
+    room_reap_interval: int = 300              # 回收遗弃房间的周期，单位秒
+    room_reap_batch_size: int = 100            # 每批回收的房间数量
+    room_scan_batch_size: int = 500            # 遍历所有房间时每批扫描的数量
+    room_number_lease_seconds: int = 600       # 分配的房间号在该时间内没有创建房间则归还号池，单位秒
+
+    # 在线状态检测：用户超过 presence_timeout 没有发送任何RTS消息则视为掉线并移出房间
+    presence_enabled: bool = False
+    presence_timeout: int = 60              # 单位秒，客户端需要在此时间内至少发送一次消息（如 vcHeartbeat）
+    presence_check_interval: float = 5      # 检查的周期，单位秒
+    presence_batch_size: int = 500          # 每批处理的房间/用户数量
+
+    # 云端任务（转推、媒体流输入、AI智能体）登记与回收
+    cloud_task_dedupe_seconds: int = 10      # 去重窗口，窗口内重复启动同一任务直接跳过
+    cloud_task_reconcile_interval: int = 60  # 回收已不存在房间的任务的周期，单位秒
+    cloud_task_stop_batch_size: int = 10     # 每批并发停止的任务数量
+
+    # AI智能体启动请求模板
+    agent_template_dir: str = ""               # 模板文件目录（{name}.json），为空时使用内置模板
+    agent_template_reload_interval: float = 5  # 检查模板文件是否变化的间隔，单位秒
+
+    # AI智能体预热：相机加入房间时与媒体流任务并发启动智能体
+    ai_prewarm_enabled: bool = False
+    ai_prewarm_agent: str = "voice_chat"   # voice_chat: 实时对话式AI, video_chat: 音视频互动智能体
+    ai_prewarm_timeout: int = 60           # 预热后多久内设备未进房则停止智能体，单位秒
+    ai_bot_user_prefix: str = "bot_"       # 智能体在房间内的用户ID前缀
+
     # 其他配置项
     token_expire_ts: int = 24 * 60 * 60
     app_name: str = "JUSI RTS"
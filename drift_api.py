@@ -1,19 +1,51 @@
 '''
 面向APP提供的API接口
 '''
+import time
+import asyncio
 import logging
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
 from vertc_client import (
     start_push_mixed_stream,
     stop_push_stream_to_cdn,
     start_relay_stream,
     stop_relay_stream,
-    ) 
+    )
+from agent_prewarm import agent_prewarmer
+from metrics import metrics
 from config import settings
 from schemas import *
 
 
 logger = logging.getLogger(__name__)
 
+
+# 执行一个云端任务阶段，记录该阶段耗时
+async def _run_stage(stage: str, coro: Awaitable[Any]) -> Any:
+    start = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        metrics.observe("drift_stage_latency_ms", elapsed_ms, stage=stage)
+        logger.debug(f"云端任务阶段 {stage} 耗时: {elapsed_ms:.1f}ms")
+
+
+# 并发执行多个相互独立的云端任务阶段，返回 (成功的阶段, 失败的阶段及异常)
+async def _run_stages(stages: Dict[str, Awaitable[Any]]) -> Tuple[List[str], List[Tuple[str, BaseException]]]:
+    results = await asyncio.gather(
+        *[_run_stage(stage, coro) for stage, coro in stages.items()],
+        return_exceptions=True,
+    )
+    succeeded, failed = [], []
+    for stage, result in zip(stages.keys(), results):
+        if isinstance(result, BaseException):
+            failed.append((stage, result))
+        else:
+            succeeded.append(stage)
+    return succeeded, failed
+
+
 # 摄像头加入房间接口
 async def drift_join_room(data: DriftJoinRequest):
     # 上行媒体流
@@ -22,33 +54,52 @@ async def drift_join_room(data: DriftJoinRequest):
     dn_rtmp_url = f"rtmp://{settings.audio_rtmp_host}:{settings.audio_rtmp_port}/live/{data.device_sn}"
     dn_rtsp_url = f"rtsp://{settings.audio_rtmp_host}:{settings.audio_rtsp_port}/live_{data.device_sn}"
 
+    # 各阶段的补偿操作：某个阶段失败时，停止已经启动成功的任务，避免任务泄漏
+    compensations: Dict[str, Callable[[], Awaitable[Any]]] = {
+        "push_mixed_stream": lambda: stop_push_stream_to_cdn(room_id=data.room_id, task_id=data.device_sn),
+        "relay_stream": lambda: stop_relay_stream(room_id=data.room_id, task_id=data.device_sn),
+        "agent": lambda: agent_prewarmer.stop(room_id=data.room_id, device_sn=data.device_sn),
+    }
+
+    start = time.perf_counter()
     try:
-        # 启动合流转推
-        await start_push_mixed_stream(
-            room_id=data.room_id,
-            user_id=data.device_sn,  # 排除的用户ID
-            task_id=data.device_sn,
-            push_url=dn_rtmp_url,
-        )
+        # 合流转推与在线媒体流输入相互独立，并发启动
+        stages = {
+            # 启动合流转推
+            "push_mixed_stream": start_push_mixed_stream(
+                room_id=data.room_id,
+                user_id=data.device_sn,  # 排除的用户ID
+                task_id=data.device_sn,
+                push_url=dn_rtmp_url,
+            ),
+            # 启动在线媒体流输入
+            "relay_stream": start_relay_stream(
+                room_id=data.room_id,
+                user_id=data.device_sn,  # 在线媒体流输入的用户ID
+                task_id=data.device_sn,
+                stream_url=up_rtmp_url,
+            ),
+        }
+        # 预热模式下同时启动AI智能体，智能体启动失败不影响相机进房
+        if settings.ai_prewarm_enabled:
+            stages["agent"] = agent_prewarmer.prewarm(room_id=data.room_id, device_sn=data.device_sn)
+        succeeded, failed = await _run_stages(stages)
 
-        # 启动在线媒体流输入
-        await start_relay_stream(
-            room_id=data.room_id,
-            user_id=data.device_sn,  # 在线媒体流输入的用户ID
-            task_id=data.device_sn,
-            stream_url=up_rtmp_url,
-        )
+        if failed:
+            # 回滚已启动成功的任务
+            if succeeded:
+                logger.warning(f"CameraJoinRoom部分失败，回滚已启动的任务: {succeeded}")
+                _, rollback_failed = await _run_stages({
+                    f"rollback_{stage}": compensations[stage]() for stage in succeeded
+                })
+                for stage, e in rollback_failed:
+                    logger.error(f"CameraJoinRoom回滚失败: {stage}, {str(e)}")
+            metrics.inc("drift_join_total", result="failed")
+            stage, e = failed[0]
+            raise Exception(f"{stage}: {str(e)}")
 
-        # 启动实时对话式AI
-        '''
-        await start_voice_chat(
-            room_id=data.room_id,
-            bot_id=data.device_sn,
-            user_id=data.user_id,
-            task_id=data.device_sn,
-            dialog_id=data.device_sn,
-        )
-        '''
+        metrics.inc("drift_join_total", result="ok")
+        metrics.observe("drift_join_latency_ms", (time.perf_counter() - start) * 1000)
 
         response_data = DriftJoinRspData(
             rtmp_url=up_rtmp_url,
@@ -68,26 +119,33 @@ async def drift_join_room(data: DriftJoinRequest):
 # 摄像头离开房间接口
 async def drift_leave_room(data: DriftLeaveRequest):
 
+    start = time.perf_counter()
     try:
-        # 停止合流转推
-        await stop_push_stream_to_cdn(
-            room_id=data.room_id,
-            task_id=data.device_sn
-        )
+        # 并发停止合流转推、在线媒体流输入和AI智能体，其中一个失败不影响其它任务的停止
+        _, failed = await _run_stages({
+            # 停止合流转推
+            "stop_push_mixed_stream": stop_push_stream_to_cdn(
+                room_id=data.room_id,
+                task_id=data.device_sn
+            ),
+            # 停止在线媒体流输入
+            "stop_relay_stream": stop_relay_stream(
+                room_id=data.room_id,
+                task_id=data.device_sn
+            ),
+            # 停止预热的AI智能体（未预热时不做任何操作）
+            "stop_agent": agent_prewarmer.stop(
+                room_id=data.room_id,
+                device_sn=data.device_sn
+            ),
+        })
 
-        # 停止在线媒体流输入
-        await stop_relay_stream(
-            room_id=data.room_id,
-            task_id=data.device_sn
-        )
+        metrics.observe("drift_leave_latency_ms", (time.perf_counter() - start) * 1000)
+
+        if failed:
+            stage, e = failed[0]
+            raise Exception(f"{stage}: {str(e)}")
 
-        # 关闭实时对话式AI
-        '''
-        await stop_voice_chat(
-            room_id=data.room_id,
-            task_id=data.device_sn
-        )
-        '''
         return DriftResponseBase()
 
     except Exception as e:
@@ -4,6 +4,18 @@ from fastapi.middleware.cors import CORSMiddleware
 from rts_message import message_router
 from rts_callback import callback_router
 from meeting_api import meeting_router
+from metrics import metrics_router
+from rts_outbox import rts_outbox
+from cloud_tasks import cloud_task_reconciler
+from room_reaper import room_reaper
+from presence import presence_monitor
+from replica_monitor import replica_monitor
+from room_cache import room_cache
+from room_owner import room_ownership
+from rts_service import rtsService
+from room_numbers import room_number_allocator
+from migrate_keys import key_migrator
+from redis_client import redis_client
 from config import settings
 from log_mw import RequestLoggingMiddleware
 import uvicorn
@@ -28,8 +40,37 @@ async def lifespan(app: FastAPI):
     # 连接 Redis
     # await manager.connect_redis()
     
+    # 迁移旧版的Redis键结构（房间键改名后才能重建房间ID集合）
+    await key_migrator.migrate_if_needed()
+
+    # 房间ID集合不存在时（首次升级），根据已有的房间键重建
+    if not redis_client.exists_room_index():
+        count = await rtsService.rebuild_room_index()
+        logger.info(f"重建房间ID集合: {count}个房间")
+
+    # 初始化房间号池
+    await room_number_allocator.ensure_pool()
+
+    # 启动Redis副本延迟检测
+    await replica_monitor.start()
+
+    # 启动房间近端缓存的变更订阅
+    await room_cache.start()
+
+    # 加入在线实例，开始接收转发给本实例的房间事件
+    await room_ownership.start()
+
     # 启动心跳监控
-    #await manager.start_heartbeat_monitor()
+    await presence_monitor.start()
+
+    # 启动出站消息投递
+    await rts_outbox.start()
+
+    # 启动云端任务回收
+    await cloud_task_reconciler.start()
+
+    # 启动遗弃房间回收
+    await room_reaper.start()
     
     logger.info("应用启动完成")
     
@@ -38,9 +79,30 @@ async def lifespan(app: FastAPI):
     # 关闭事件
     logger.info("应用正在关闭...")
     
+    # 退出在线实例并释放房间归属，其他实例立即接管
+    await room_ownership.stop()
+
     # 关闭所有 WebSocket 连接
     #for connection_id in list(manager.active_connections.keys()):
     #    await manager.disconnect(connection_id, reason="服务器关闭")
+
+    # 停止心跳监控
+    await presence_monitor.stop()
+
+    # 停止遗弃房间回收
+    await room_reaper.stop()
+
+    # 停止云端任务回收
+    await cloud_task_reconciler.stop()
+
+    # 停止出站消息投递
+    await rts_outbox.stop()
+
+    # 停止Redis副本延迟检测
+    await replica_monitor.stop()
+
+    # 停止房间近端缓存的变更订阅
+    await room_cache.stop()
     
     logger.info("应用已关闭")
 
@@ -66,6 +128,7 @@ app.add_middleware(RequestLoggingMiddleware)
 app.include_router(message_router, prefix=settings.api_vstr, tags=["RTS Message"])
 app.include_router(callback_router, prefix=settings.api_vstr, tags=["RTS Callback"])
 app.include_router(meeting_router, prefix=settings.api_vstr, tags=["Meeting API"])
+app.include_router(metrics_router, prefix=settings.api_vstr, tags=["Metrics"])
 
 # 处理根路径请求
 @app.get("/")
@@ -7,10 +7,10 @@
 如需使用会议管理功能，请通过 jusi_meet_server 项目的接口访问
 """
 import logging
-import random
 from fastapi import APIRouter
 from schemas import *
 from rts_service import rtsService
+from room_numbers import room_number_allocator
 from drift_api import drift_join_room, drift_leave_room
 
 
@@ -54,7 +54,9 @@ async def cancel_meeting(request: CancelMeetingRequest):
 @meeting_router.post("/meeting/get-my", response_model=GetMyMeetingsResponse)
 async def get_my_meetings(request: GetMyMeetingsRequest):
     try:
-        meetings_data = await rtsService.get_my_rooms(request.user_id)
+        # 会议列表可以容忍短暂的延迟，从Redis只读副本读取
+        with rtsService.replica_reads():
+            meetings_data = await rtsService.get_my_rooms(request.user_id)
 
         # 转换为MeetingInfo对象
         meetings = [MeetingInfo(**meeting) for meeting in meetings_data]
@@ -187,29 +189,21 @@ async def camera_leave(request: CameraLeaveRequest):
 @meeting_router.post("/meeting/generate-room-id", response_model=GenerateRoomIdResponse)
 async def generate_room_id():
     """
-    生成一个不与现有会议号冲突的6位随机会议号
+    从号池中分配一个未被占用的6位会议号
 
     Returns:
         生成的会议号
     """
     try:
-        max_attempts = 100  # 最大尝试次数，避免无限循环
-
-        for _ in range(max_attempts):
-            # 生成6位随机正整数 (100000-999999)
-            room_id = str(random.randint(100000, 999999))
-
-            # 检查是否与现有会议号冲突
-            exists = await rtsService.check_room_exists(room_id=room_id)
-
-            if not exists:
-                return GenerateRoomIdResponse(
-                    code=200,
-                    room_id=room_id,
-                    message="生成会议号成功"
-                )
+        room_id = await room_number_allocator.allocate()
+        if room_id:
+            return GenerateRoomIdResponse(
+                code=200,
+                room_id=room_id,
+                message="生成会议号成功"
+            )
 
-        # 如果尝试了max_attempts次仍未找到可用的会议号
+        # 号池已耗尽
         return GenerateRoomIdResponse(
             code=500,
             message="生成会议号失败，请稍后重试"
@@ -236,7 +230,8 @@ async def get_device_room(request: GetDeviceRoomRequest):
         设备所在的房间信息
     """
     try:
-        room_id = await rtsService.get_device_room(device_sn=request.device_sn)
+        with rtsService.replica_reads():
+            room_id = await rtsService.get_device_room(device_sn=request.device_sn)
 
         if room_id:
             return GetDeviceRoomResponse(
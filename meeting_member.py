@@ -4,7 +4,10 @@ from utils import current_timestamp_ms
 
 
 # 用户模型
+# 从Redis加载的可信数据以字典形式保存，只读访问不创建 UserModel，需要修改时才转换
 class MeetingMember:
+    __slots__ = ("_user", "_data")
+
     def __init__(self, user: UserModel):
         """
         从 UserModel 创建 MeetingMember 实例
@@ -13,68 +16,84 @@ class MeetingMember:
             user: UserModel 实例
         """
         self._user = user
+        self._data = None
 
+    # 获取 UserModel，可信数据在第一次修改时才校验并转换
+    @property
+    def _model(self) -> UserModel:
+        if self._user is None:
+            self._user = UserModel.model_validate(self._data)
+            self._data = None
+        return self._user
 
     @property
     def id(self) -> str:
-        return self._user.user_id
+        return self._data["user_id"] if self._user is None else self._user.user_id
     
     @property
     def name(self) -> str:
-        return self._user.user_name
+        return self._data["user_name"] if self._user is None else self._user.user_name
     
     @property
     def role(self) -> UserRole:
-        return self._user.user_role
+        return UserRole(self._data["user_role"]) if self._user is None else self._user.user_role
 
     # 进入房间
     def join_room(self, room_id: str, role: UserRole) -> None:
-        self._user.join_time = current_timestamp_ms()
-        self._user.room_id = room_id
-        self._user.user_role = role
+        self._model.join_time = current_timestamp_ms()
+        self._model.room_id = room_id
+        self._model.user_role = role
     
     # 操纵自己的摄像头
     def operate_camera(self, operate: DeviceState) -> None:
-        self._user.camera = operate
+        self._model.camera = operate
 
     # 操纵自己的麦克风
     def operate_mic(self, operate: DeviceState) -> None:
-        self._user.mic = operate
+        self._model.mic = operate
     
     # 更新屏幕共享权限
     def update_share_permission(self, permission: Permission) -> None:
-        self._user.share_permission = permission
+        self._model.share_permission = permission
     
     # 更新麦克风权限
     def update_mic_permission(self, permission: Permission) -> None:
-        self._user.operate_mic_permission = permission
+        self._model.operate_mic_permission = permission
 
     # 开始共享
     def start_share(self, share_type: ShareType) -> None:
-        self._user.share_status = ShareStatus.SHARING
-        self._user.share_type = share_type
+        self._model.share_status = ShareStatus.SHARING
+        self._model.share_type = share_type
 
     # 结束共享
     def finish_share(self) -> None:
-        self._user.share_status = ShareStatus.NOT_SHARING
-        self._user.share_type = ShareType.SCREEN
+        self._model.share_status = ShareStatus.NOT_SHARING
+        self._model.share_type = ShareType.SCREEN
 
     # 转换成字典对象
     def to_dict(self) -> Dict[str, Any]:
+        if self._user is None:
+            return dict(self._data)
         return self._user.model_dump()
 
     # 从字典对象创建用户实例
     @staticmethod
-    def from_dict(data: Dict[str, Any]) -> 'MeetingMember':
+    def from_dict(data: Dict[str, Any], trusted: bool = False) -> 'MeetingMember':
         """
         从字典创建 MeetingMember 实例
 
         Args:
             data: 用户数据字典
+            trusted: 数据是否由服务自己写入（如从Redis读取），字段完整的可信数据跳过校验
 
         Returns:
             MeetingMember 实例
         """
+        if trusted and len(data) == len(UserModel.model_fields):
+            member = MeetingMember.__new__(MeetingMember)
+            member._user = None
+            member._data = data
+            return member
         # 使用 Pydantic 的 model_validate 方法从字典创建 UserModel
         # Pydantic 会自动处理类型转换和验证
         user_model = UserModel.model_validate(data)
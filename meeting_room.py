@@ -1,13 +1,16 @@
-from typing import List, Dict, OrderedDict, Any
-from schemas import UserModel, RoomState, UserRole
+from typing import List, Dict, OrderedDict, Any, Callable, Optional
+from schemas import UserModel, RoomState, UserRole, HUMAN_USER_ID_LENGTH
 from meeting_member import MeetingMember
 
 # 房间模型
 class MeetingRoom:
+    __slots__ = ("_room", "_users", "version")
+
     # 构造函数
     def __init__(self, room: RoomState):
         self._room = room
         self._users = OrderedDict()
+        self.version = 0  # 加载房间时的状态版本号
 
     # 析构函数
     def __del__(self):
@@ -23,6 +26,16 @@ class MeetingRoom:
     def user_count(self) -> int:
         return len(self._users)
 
+    # 房间内所有用户ID
+    @property
+    def user_ids(self) -> List[str]:
+        return list(self._users.keys())
+
+    # 房间内的真人用户ID（通知的接收者）
+    @property
+    def human_ids(self) -> List[str]:
+        return [user_id for user_id in self._users if len(user_id) == HUMAN_USER_ID_LENGTH]
+
     # 用户进入房间
     def add_user(self, user: MeetingMember) -> None:
         # 如果用户ID与房间主持人ID匹配，则为主持人
@@ -55,8 +68,9 @@ class MeetingRoom:
         }
 
     # 从字典对象创建房间实例
+    # trusted: 用户数据是否由服务自己写入（如从Redis读取），可信数据跳过校验
     @staticmethod
-    def from_dict(room_data: Dict[str, Any], user_list: List[Dict[str, Any]] = None) -> 'MeetingRoom':
+    def from_dict(room_data: Dict[str, Any], user_list: List[Dict[str, Any]] = None, trusted: bool = False) -> 'MeetingRoom':
         # 使用 Pydantic 的 model_validate 从字典创建 RoomState
         room_state = RoomState.model_validate(room_data)
         # 创建房间实例
@@ -64,10 +78,107 @@ class MeetingRoom:
         # 添加所有用户
         if user_list:
             for user_dict in user_list:
-                user = MeetingMember.from_dict(user_dict)
+                user = MeetingMember.from_dict(user_dict, trusted)
                 room._users[user.id] = user
         return room
 
     # 获取所有用户对象（用于遍历操作）
     def get_all_users(self) -> List[MeetingMember]:
         return list(self._users.values())
+
+
+# 房间状态视图：只包含房间状态，不加载用户
+class RoomHeader:
+    __slots__ = ("_room",)
+
+    def __init__(self, room: RoomState):
+        self._room = room
+
+    # 房间ID
+    @property
+    def room_id(self) -> str:
+        return self._room.room_id
+
+    # 主持人ID
+    @property
+    def host_uid(self) -> str:
+        return self._room.host_user_id
+
+    # 房间状态
+    @property
+    def state(self) -> RoomState:
+        return self._room
+
+
+# 房间成员视图：只包含用户ID，用户数据在需要时才读取
+class RoomMembers:
+    __slots__ = ("room_id", "_human_ids", "_device_ids", "_user_ids", "_loader")
+
+    def __init__(
+            self, room_id: str,
+            human_ids: List[str],
+            device_ids: List[str],
+            loader: Callable[[str], Optional[Dict[str, Any]]]
+            ):
+        """
+        Args:
+            room_id: 房间ID
+            human_ids: 房间内的真人用户ID
+            device_ids: 房间内的设备ID
+            loader: 按用户ID读取用户数据的方法
+        """
+        self.room_id = room_id
+        self._human_ids = human_ids
+        self._device_ids = device_ids
+        self._user_ids = set(human_ids) | set(device_ids)
+        self._loader = loader
+
+    # 获取用户数量
+    @property
+    def user_count(self) -> int:
+        return len(self._user_ids)
+
+    # 房间内所有用户ID
+    @property
+    def user_ids(self) -> List[str]:
+        return self._human_ids + self._device_ids
+
+    # 房间内的真人用户ID（通知的接收者）
+    @property
+    def human_ids(self) -> List[str]:
+        return self._human_ids
+
+    # 房间内的设备ID
+    @property
+    def device_ids(self) -> List[str]:
+        return self._device_ids
+
+    # 检查用户是否在房间中
+    def user_in_room(self, user_id: str) -> bool:
+        return user_id in self._user_ids
+
+    # 获取用户（读取用户数据）
+    def get_user(self, user_id: str) -> Optional[MeetingMember]:
+        if user_id not in self._user_ids:
+            return None
+        data = self._loader(user_id)
+        return MeetingMember.from_dict(data, trusted=True) if data else None
+
+
+# 从Redis数据加载房间的耗时对比：完整校验 vs 可信数据直接使用
+if __name__ == "__main__":
+    import sys
+    import timeit
+
+    room_data = RoomState(app_id="app", room_id="100", room_name="会议", host_user_id="host").model_dump()
+    for count in (10, 100, 1000):
+        user_list = [UserModel(user_id=f"{i:032d}", user_name=f"用户{i}", join_time=i).model_dump() for i in range(count)]
+        assert MeetingRoom.from_dict(room_data, user_list, trusted=True).to_dict() == MeetingRoom.from_dict(room_data, user_list).to_dict()
+
+        rounds = max(10, 20000 // count)
+        validated_us = timeit.timeit(lambda: MeetingRoom.from_dict(room_data, user_list).to_dict(), number=rounds) / rounds * 1e6
+        trusted_us = timeit.timeit(lambda: MeetingRoom.from_dict(room_data, user_list, trusted=True).to_dict(), number=rounds) / rounds * 1e6
+        print(f"{count}人房间 加载+转换字典: 完整校验 {validated_us:.1f}us/次, 可信数据 {trusted_us:.1f}us/次, 提升 {validated_us / trusted_us:.1f}x")
+
+    member = MeetingMember.from_dict(user_list[0], trusted=True)
+    print(f"单个成员对象大小: {sys.getsizeof(member)}字节（无__dict__）")
@@ -0,0 +1,98 @@
+'''
+进程内运行指标
+提供计数器、仪表盘和耗时分布统计，通过 /metrics 接口以JSON形式输出
+'''
+import threading
+from collections import deque
+from typing import Dict, Any
+from fastapi import APIRouter
+
+
+# 耗时分布（保留最近的采样用于计算分位数）
+class Histogram:
+    def __init__(self, reservoir_size: int = 1024):
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._samples = deque(maxlen=reservoir_size)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        self._samples.append(value)
+
+    def _quantile(self, samples: list, q: float) -> float:
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+    def to_dict(self) -> Dict[str, float]:
+        samples = sorted(self._samples)
+        return {
+            "count": self.count,
+            "avg": round(self.sum / self.count, 3) if self.count else 0.0,
+            "max": round(self.max, 3),
+            "p50": round(self._quantile(samples, 0.50), 3),
+            "p95": round(self._quantile(samples, 0.95), 3),
+            "p99": round(self._quantile(samples, 0.99), 3),
+        }
+
+
+class Metrics:
+    """进程内指标注册表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._histograms: Dict[str, Histogram] = {}
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, Any]) -> str:
+        """生成带标签的指标名，如 vertc_requests_total{api="SendUnicast"}"""
+        if not labels:
+            return name
+        label_str = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+        return f"{name}{{{label_str}}}"
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """计数器累加"""
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        """设置仪表盘数值"""
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """记录一次耗时/大小等分布数据"""
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """获取所有指标的快照"""
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "histograms": {k: h.to_dict() for k, h in self._histograms.items()},
+            }
+
+
+# 全局指标实例
+metrics = Metrics()
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get("/metrics")
+async def get_metrics():
+    return metrics.snapshot()
@@ -0,0 +1,201 @@
+'''
+Redis键结构迁移
+    版本2：用户->房间映射由每个用户一个字符串键（meet:user:{id}:room）改为按用户ID分片的Hash（meet:userroom:{分片}），
+          分片Hash和房间成员Hash都保持Redis的紧凑编码（listpack），省去每个键的固定开销；
+          成员记录按 redis_record_codec 重新编码（compact 编码不再重复保存 user_id 和 room_id）
+    版本3：房间的键加上哈希标签（meet:room:{123456}:users），同一房间的键在Redis集群中位于同一个槽；
+          房间号池（meet:{roomno}:*）和消息外发队列（meet:{outbox}:*）同理。
+          集群模式下无法改名到其他槽，需要先在单节点上完成迁移，再切换到集群
+
+服务启动时自动迁移（多实例只有一个执行），滚动升级完成后再执行一次，迁移旧实例在升级期间写入的映射：
+    python migrate_keys.py migrate
+对比迁移前后的内存占用（在独立的键前缀下生成合成数据，需要真实的Redis，MEMORY USAGE）：
+    python migrate_keys.py report --rooms 10000 --members 5
+'''
+import re
+import time
+import asyncio
+import logging
+from typing import Dict
+from redis_client import redis_client
+from rts_service import rtsService
+from config import settings
+
+
+logger = logging.getLogger(__name__)
+
+# 当前的键结构版本
+SCHEMA_VERSION = 3
+
+# 迁移的锁名
+MIGRATE_LOCK = "schema:migrate"
+
+# 等待其他实例迁移时检查键结构版本的间隔，单位秒
+MIGRATE_POLL_INTERVAL = 1
+
+
+class KeyMigrator:
+    """Redis键结构迁移"""
+
+    # 没有哈希标签的旧版键改名，返回改名的数量
+    async def migrate_untagged_keys(self) -> int:
+        if settings.redis_cluster:
+            logger.warning("集群模式下跳过键改名迁移，请先在单节点上执行 python migrate_keys.py migrate")
+            return 0
+        renamed = kept = 0
+        for count, skipped in redis_client.migrate_untagged_keys(settings.room_scan_batch_size):
+            renamed += count
+            kept += skipped
+            await asyncio.sleep(0)
+        if kept:
+            logger.warning(f"新键已存在，保留旧键: {kept}个")
+        return renamed
+
+    # 迁移旧版的用户->房间映射键，返回迁移的数量
+    async def migrate_user_rooms(self) -> int:
+        migrated = 0
+        for count in redis_client.migrate_user_room_keys(settings.room_scan_batch_size):
+            migrated += count
+            await asyncio.sleep(0)
+        return migrated
+
+    # 按当前编码重新写入所有房间的成员记录，返回重新编码的数量
+    async def reencode_members(self) -> int:
+        reencoded = 0
+        async for room_ids in rtsService.iter_room_ids():
+            for room_id in room_ids:
+                reencoded += redis_client.reencode_room_users(room_id)
+        return reencoded
+
+    # 执行迁移（可重复执行）
+    async def migrate(self) -> Dict[str, int]:
+        result = {
+            "untagged_keys": await self.migrate_untagged_keys(),
+            "user_rooms": await self.migrate_user_rooms(),
+            "members": await self.reencode_members(),
+        }
+        redis_client.set_schema_version(SCHEMA_VERSION)
+        logger.info(f"Redis键结构迁移到版本{SCHEMA_VERSION}: {result}")
+        return result
+
+    # 键结构版本低于当前版本时迁移；其他实例正在迁移时等待其完成，不在迁移了一半的键上提供服务
+    async def migrate_if_needed(self) -> None:
+        deadline = time.monotonic() + settings.schema_migrate_wait_seconds
+        while redis_client.get_schema_version() < SCHEMA_VERSION:
+            # 持有锁的实例中途退出时，锁过期后由等待的实例接着迁移（迁移可重复执行）
+            if redis_client.acquire_lock(MIGRATE_LOCK, 600):
+                try:
+                    await self.migrate()
+                finally:
+                    redis_client.release_lock(MIGRATE_LOCK)
+                return
+            if time.monotonic() >= deadline:
+                raise RuntimeError(f"等待其他实例完成Redis键结构迁移超时（{settings.schema_migrate_wait_seconds}s）")
+            logger.info("其他实例正在迁移Redis键结构，等待迁移完成")
+            await asyncio.sleep(MIGRATE_POLL_INTERVAL)
+
+
+# 创建键结构迁移实例
+key_migrator = KeyMigrator()
+
+
+# 按键的类型统计内存
+_KEY_KINDS = (
+    ("房间数据", re.compile(r"^room:\{[^}]+\}$")),
+    ("成员记录", re.compile(r"^room:\{[^}]+\}:users$")),
+    ("房间其它子键", re.compile(r"^room:\{[^}]+\}:.+$")),
+    ("用户->房间映射", re.compile(r"^(user:.+:room|userroom:\d+)$")),
+)
+
+
+def memory_report(prefix: str) -> Dict[str, tuple[int, int]]:
+    """统计键前缀下各类键的 (数量, 字节数)"""
+    report: Dict[str, tuple[int, int]] = {}
+    for usage in redis_client.iter_memory_usage(f"{prefix}*", 1000):
+        for key, size in usage.items():
+            name = key[len(prefix):]
+            kind = next((kind for kind, pattern in _KEY_KINDS if pattern.match(name)), "其它")
+            count, total = report.get(kind, (0, 0))
+            report[kind] = (count + 1, total + (size or 0))
+    return report
+
+
+if __name__ == "__main__":
+    import sys
+    import json
+    import argparse
+    import redis_client as redis_module
+    from record_codec import get_codec
+    from schemas import UserModel
+    from utils import current_timestamp_ms, current_timestamp_s
+
+    parser = argparse.ArgumentParser(description="Redis键结构迁移")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("migrate", help="迁移到当前的键结构")
+    report_parser = subparsers.add_parser("report", help="合成数据迁移前后的内存对比")
+    report_parser.add_argument("--rooms", type=int, default=10000)
+    report_parser.add_argument("--members", type=int, default=5)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "migrate":
+        print(asyncio.run(key_migrator.migrate()))
+        sys.exit(0)
+
+    # 在独立的键前缀下生成旧版结构的合成数据：JSON成员记录、每个用户一个映射键
+    prefix = "bench:"
+    redis_module.REDIS_PREFIX = prefix
+    client = redis_client._client
+
+    def clear():
+        keys = list(client.scan_iter(f"{prefix}*", count=1000))
+        for i in range(0, len(keys), 1000):
+            client.delete(*keys[i:i + 1000])
+
+    def write_legacy_dataset():
+        json_codec = get_codec("json")
+        now, now_ms, ttl = current_timestamp_s(), current_timestamp_ms(), settings.room_idle_ttl
+        for start in range(0, args.rooms, 500):
+            pipeline = client.pipeline(transaction=False)
+            for i in range(start, min(start + 500, args.rooms)):
+                room_id = str(100000 + i)
+                host_id = f"{i:032x}"
+                room = {"app_id": settings.rtc_app_id, "room_id": room_id, "room_name": f"会议{room_id}",
+                        "host_user_id": host_id, "host_user_name": "主持人", "host_device_sn": f"X5{i:08d}",
+                        "room_mic_status": 1, "operate_self_mic_permission": 1, "share_status": 0, "share_type": 0,
+                        "share_user_id": "", "share_user_name": "", "start_time": now, "base_time": now,
+                        "record_status": 0, "record_start_time": 0}
+                pipeline.set(redis_client._get_room_key(room_id), json.dumps(room, ensure_ascii=False), ex=ttl)
+                pipeline.set(redis_client._get_room_version_key(room_id), now_ms, ex=ttl)
+                pipeline.sadd(redis_client._get_room_index_key(), room_id)
+                pipeline.zadd(redis_client._get_room_activity_key(), {room_id: now})
+                for m in range(args.members):
+                    # 每个房间一台设备，其余为真人用户
+                    user_id = f"X5{i:08d}" if m == 0 else f"{i:028x}{m:04x}"
+                    user = UserModel(user_id=user_id, user_name=f"用户{m}", join_time=now_ms + m,
+                                     room_id=room_id).model_dump()
+                    pipeline.hset(redis_client._get_users_key(room_id), user_id, json_codec.encode(user))
+                    pipeline.zadd(redis_client._get_members_key(room_id), {user_id: user["join_time"]})
+                    pipeline.sadd(redis_client._get_member_set_key(room_id, user_id), user_id)
+                    pipeline.set(redis_client._get_user_room_key(user_id), room_id, ex=ttl)
+            pipeline.execute()
+
+    def print_report(title: str, report: Dict[str, tuple[int, int]]) -> int:
+        total = sum(size for _, size in report.values())
+        print(f"{title}: 共 {total / 1024 / 1024:.2f}MB, 每个成员 {total / (args.rooms * args.members):.0f}字节")
+        for kind, (count, size) in sorted(report.items()):
+            print(f"    {kind}: {count}个键, {size / 1024 / 1024:.2f}MB")
+        sample = redis_client._get_users_key("100000")
+        print(f"    成员Hash编码: {redis_client.get_encoding(sample)}")
+        return total
+
+    clear()
+    try:
+        write_legacy_dataset()
+        before = print_report(f"迁移前（{args.rooms}个房间，每个房间{args.members}个成员）", memory_report(prefix))
+        redis_client._member_codec = get_codec("compact")
+        print(asyncio.run(key_migrator.migrate()))
+        after = print_report("迁移后（分片映射 + compact成员记录）", memory_report(prefix))
+        print(f"减少 {1 - after / before:.0%}")
+    finally:
+        clear()
@@ -0,0 +1,78 @@
+'''
+在线状态检测
+收到用户的任意RTS消息时，在房间的在线状态有序集合中记录最近在线时间（meet:room:{id}:presence），
+并用房间内最早的在线时间更新全局索引（meet:presence:rooms）。
+检测任务只读取全局索引中已超时的房间，再取出这些房间内超时的用户，将其移出房间并发送正常的离开通知，
+不需要遍历所有房间和用户
+'''
+import asyncio
+import logging
+from redis_client import redis_client
+from rts_service import rtsService
+from rts_message import on_user_left
+from metrics import metrics
+from utils import current_timestamp_ms
+from config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class PresenceMonitor:
+    """在线状态检测"""
+
+    def __init__(self):
+        self._task: asyncio.Task = None
+
+    # 执行一轮检测，返回移出房间的用户数量
+    async def check_once(self) -> int:
+        before_ms = current_timestamp_ms() - settings.presence_timeout * 1000
+        batch_size = max(1, settings.presence_batch_size)
+        evicted = 0
+        for room_id in redis_client.get_presence_expired_rooms(before_ms, batch_size):
+            # 原子地取出并移除在线记录，多个实例同时检测时只处理本实例取出的用户
+            user_ids = redis_client.pop_presence_expired_users(room_id, before_ms, batch_size)
+            for user_id in user_ids:
+                try:
+                    if await self._evict(room_id, user_id):
+                        evicted += 1
+                except Exception as e:
+                    logger.error(f"移出掉线用户失败: {room_id}/{user_id}, {str(e)}")
+
+        if evicted:
+            logger.warning(f"移出掉线用户: {evicted}个")
+            metrics.inc("presence_evicted_total", evicted)
+        return evicted
+
+    # 将掉线用户移出房间，并发送离开通知
+    async def _evict(self, room_id: str, user_id: str) -> bool:
+        if await rtsService.check_user_in_room(room_id, user_id) != 1:
+            return False
+        logger.debug(f"用户超时未活跃，移出房间: {room_id}/{user_id}")
+        version = await rtsService.leave_room(user_id, room_id)
+        await on_user_left(settings.rtc_app_id, room_id, user_id, version)
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.presence_check_interval)
+            try:
+                await self.check_once()
+            except Exception as e:
+                logger.error(f"在线状态检测失败: {e}")
+
+    # 启动在线状态检测
+    async def start(self) -> None:
+        if settings.presence_enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    # 停止在线状态检测
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# 创建在线状态检测实例
+presence_monitor = PresenceMonitor()
@@ -0,0 +1,211 @@
+'''
+Redis记录编码
+房间成员记录（meet:room:{id}:users 中的值）原先是完整的JSON，每条记录都重复保存一遍字段名，
+大部分字段又是取值只有0/1的枚举。compact 编码去掉字段名，将枚举字段打包为位，整数使用变长编码
+
+Redis客户端开启了 decode_responses，读出的值会按UTF-8解码，因此编码结果是文本安全的：
+除字符串字段本身的内容外只使用 0x00-0x7F 的字符。格式（版本1）：
+    \\x01            版本号（JSON记录以 { 开头，可以直接区分）
+    3个字符          9个枚举字段，每个占2位（0/1/2，3表示None），每个字符6位
+    变长整数         join_time + 1（0表示None）
+    变长整数 + 字符  user_id、user_name、room_id：长度 + 1（0表示None）和内容
+变长整数每个字符保存6位，0x40表示后面还有字符
+版本2与版本1相同，但不保存 user_id 和 room_id（与所在的Hash键和字段重复），解码时由调用方传入；
+成员记录因此不超过64字节，房间成员Hash可以保持Redis的紧凑编码（listpack）
+
+读取时根据首字符自动识别编码，JSON和compact记录可以混合存在：
+先升级所有实例（都能读取compact），再将 redis_record_codec 切换为 compact
+'''
+import json
+from typing import Any, Dict, List, Optional
+from schemas import UserModel
+
+
+# compact 编码的版本号
+COMPACT_VERSION_1 = "\x01"
+COMPACT_VERSION_2 = "\x02"
+
+# 枚举字段（顺序是编码格式的一部分，修改时需要新的版本号）
+MEMBER_ENUM_FIELDS = (
+    "user_role",
+    "camera",
+    "mic",
+    "share_permission",
+    "share_status",
+    "share_type",
+    "operate_camera_permission",
+    "operate_mic_permission",
+    "is_silence",
+)
+MEMBER_STR_FIELDS = ("user_id", "user_name", "room_id")
+# 版本2中由键决定、不保存的字段
+MEMBER_KEY_FIELDS = ("user_id", "room_id")
+MEMBER_FIELDS = frozenset(MEMBER_ENUM_FIELDS + MEMBER_STR_FIELDS + ("join_time",))
+# 解码结果的字段顺序与 UserModel.model_dump() 一致，序列化后的响应与原来相同
+MEMBER_FIELD_ORDER = tuple(UserModel.model_fields)
+assert MEMBER_FIELDS == frozenset(MEMBER_FIELD_ORDER), "成员字段变化时需要新的compact版本"
+
+
+def _put_varint(out: List[str], value: int) -> None:
+    while value >= 0x40:
+        out.append(chr(0x40 | (value & 0x3F)))
+        value >>= 6
+    out.append(chr(value))
+
+
+def _get_varint(data: str, pos: int) -> tuple[int, int]:
+    value = shift = 0
+    while True:
+        c = ord(data[pos])
+        pos += 1
+        value |= (c & 0x3F) << shift
+        if c < 0x40:
+            return value, pos
+        shift += 6
+
+
+class RecordCodec:
+    """记录编码"""
+    name = ""
+
+    # 编码记录；keys 为记录所在的键已经确定的字段（如 user_id、room_id），编码可以省略这些字段
+    def encode(self, record: Dict[str, Any], keys: Optional[Dict[str, str]] = None) -> str:
+        raise NotImplementedError
+
+    # 解码记录；keys 与编码时相同
+    def decode(self, data: str, keys: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class JsonCodec(RecordCodec):
+    """JSON编码（原格式）"""
+    name = "json"
+
+    def encode(self, record: Dict[str, Any], keys: Optional[Dict[str, str]] = None) -> str:
+        return json.dumps(record, ensure_ascii=False)
+
+    def decode(self, data: str, keys: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        return json.loads(data)
+
+
+class CompactMemberCodec(RecordCodec):
+    """成员记录的紧凑编码，字段与 UserModel 不一致的记录仍编码为JSON"""
+    name = "compact"
+
+    def __init__(self):
+        self._json = JsonCodec()
+
+    def _encodable(self, record: Dict[str, Any]) -> bool:
+        if record.keys() != MEMBER_FIELDS:
+            return False
+        for field in MEMBER_ENUM_FIELDS:
+            value = record[field]
+            if value is not None and value not in (0, 1, 2):
+                return False
+        for field in MEMBER_STR_FIELDS:
+            if record[field] is not None and not isinstance(record[field], str):
+                return False
+        join_time = record["join_time"]
+        return join_time is None or (isinstance(join_time, int) and join_time >= 0)
+
+    def encode(self, record: Dict[str, Any], keys: Optional[Dict[str, str]] = None) -> str:
+        if not self._encodable(record):
+            return self._json.encode(record)
+
+        omit_keys = bool(keys) and all(record[field] == keys.get(field) for field in MEMBER_KEY_FIELDS)
+
+        bits = 0
+        for i, field in enumerate(MEMBER_ENUM_FIELDS):
+            value = record[field]
+            bits |= (3 if value is None else int(value)) << (i * 2)
+        version = COMPACT_VERSION_2 if omit_keys else COMPACT_VERSION_1
+        out = [version, chr(bits & 0x3F), chr((bits >> 6) & 0x3F), chr(bits >> 12)]
+        join_time = record["join_time"]
+        _put_varint(out, 0 if join_time is None else join_time + 1)
+        for field in MEMBER_STR_FIELDS:
+            if omit_keys and field in MEMBER_KEY_FIELDS:
+                continue
+            value = record[field]
+            if value is None:
+                out.append("\x00")
+            else:
+                _put_varint(out, len(value) + 1)
+                out.append(value)
+        return "".join(out)
+
+    def decode(self, data: str, keys: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        version = data[0]
+        if version != COMPACT_VERSION_1 and version != COMPACT_VERSION_2:
+            return self._json.decode(data)
+
+        bits = ord(data[1]) | (ord(data[2]) << 6) | (ord(data[3]) << 12)
+        record: Dict[str, Any] = {}
+        for i, field in enumerate(MEMBER_ENUM_FIELDS):
+            value = (bits >> (i * 2)) & 3
+            record[field] = None if value == 3 else value
+        join_time, pos = _get_varint(data, 4)
+        record["join_time"] = join_time - 1 if join_time else None
+        if version == COMPACT_VERSION_2:
+            for field in MEMBER_KEY_FIELDS:
+                record[field] = keys[field]
+        for field in MEMBER_STR_FIELDS:
+            if field in record:
+                continue
+            length, pos = _get_varint(data, pos)
+            if length:
+                record[field] = data[pos:pos + length - 1]
+                pos += length - 1
+            else:
+                record[field] = None
+        return {field: record[field] for field in MEMBER_FIELD_ORDER}
+
+
+# 可选的成员记录编码
+CODECS: Dict[str, RecordCodec] = {codec.name: codec for codec in (JsonCodec(), CompactMemberCodec())}
+
+# 读取时按首字符识别编码
+_decoder = CODECS["compact"]
+
+
+# 获取编码
+def get_codec(name: str) -> RecordCodec:
+    if name not in CODECS:
+        raise ValueError(f"未知的记录编码: {name}")
+    return CODECS[name]
+
+
+# 解码记录（自动识别JSON和compact编码）
+def decode_record(data: Optional[str], keys: Optional[Dict[str, str]] = None) -> Optional[Dict[str, Any]]:
+    return _decoder.decode(data, keys) if data else None
+
+
+# 每个成员记录的字节数和编解码耗时对比：JSON vs compact
+if __name__ == "__main__":
+    import timeit
+    from schemas import UserRole
+
+    rounds = 50000
+    members = {
+        "真人用户": UserModel(user_id="u" * 32, user_name="张三的iPhone", user_role=UserRole.HOST,
+                          join_time=1760000000123, room_id="123456").model_dump(),
+        "设备": UserModel(user_id="X5A1B2C3D4", user_name="X5-Camera", join_time=1760000000456,
+                        room_id="123456").model_dump(),
+    }
+    json_codec, compact_codec = CODECS["json"], CODECS["compact"]
+    for label, member in members.items():
+        keys = {"user_id": member["user_id"], "room_id": member["room_id"]}
+        json_data = json_codec.encode(member)
+        json_bytes = len(json_data.encode())
+        print(f"{label}: JSON {json_bytes}字节")
+        for name, codec, codec_keys in (
+            ("JSON", json_codec, None),
+            ("compact", compact_codec, None),
+            ("compact（省略键字段）", compact_codec, keys),
+        ):
+            data = codec.encode(member, codec_keys)
+            assert json.dumps(decode_record(data, keys), ensure_ascii=False) == json_data
+            size = len(data.encode())
+            encode_us = timeit.timeit(lambda: codec.encode(member, codec_keys), number=rounds) / rounds * 1e6
+            decode_us = timeit.timeit(lambda: decode_record(data, keys), number=rounds) / rounds * 1e6
+            print(f"    {name}: {size}字节（减少 {1 - size / json_bytes:.0%}）, "
+                  f"编码 {encode_us:.2f}us/条, 解码 {decode_us:.2f}us/条")
@@ -1,38 +1,568 @@
+import os
 import json
+import time
+import socket
+import logging
+import functools
 import redis
-from typing import Dict, Optional, Any
+from contextlib import contextmanager
+from contextvars import ContextVar
+from redis.cluster import RedisCluster, ClusterNode
+from typing import Callable, Dict, Iterator, Optional, Any, List, Tuple
 from config import settings
+from schemas import HUMAN_USER_ID_LENGTH
+from record_codec import get_codec, decode_record
+from metrics import metrics
+
+
+logger = logging.getLogger(__name__)
 
 REDIS_PREFIX: str = "meet:"
 
+# 令牌桶脚本：按Redis服务器时间补充令牌，返回需要等待的秒数（0表示已获取令牌）
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or burst
+local ts = tonumber(data[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+# 登记云端任务：同一任务在去重窗口内重复登记时返回0，否则写入任务信息并返回1
+REGISTER_CLOUD_TASK_SCRIPT = """
+local old = redis.call('HGET', KEYS[1], ARGV[1])
+if old then
+    local ok, info = pcall(cjson.decode, old)
+    if ok and tonumber(ARGV[3]) - (tonumber(info['started_at']) or 0) < tonumber(ARGV[4]) then
+        return 0
+    end
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+if #KEYS > 1 then
+    redis.call('SADD', KEYS[2], ARGV[5])
+end
+return 1
+"""
+
+# 注销云端任务：房间内没有任务时，从有任务的房间集合中移除；返回房间内剩余的任务数量
+UNREGISTER_CLOUD_TASK_SCRIPT = """
+redis.call('HDEL', KEYS[1], ARGV[1])
+local remaining = redis.call('HLEN', KEYS[1])
+if remaining == 0 and #KEYS > 1 then
+    redis.call('SREM', KEYS[2], ARGV[2])
+end
+return remaining
+"""
+
+# 记录房间变更：版本号加一，追加到变更日志并截断为最近的N条，返回新版本号
+RECORD_ROOM_CHANGE_SCRIPT = """
+local version = redis.call('INCR', KEYS[1])
+-- ARGV[1]为JSON对象，直接在开头拼接版本号，避免cjson重新编码时丢失大整数精度
+redis.call('RPUSH', KEYS[2], '{"version":' .. version .. ',' .. string.sub(ARGV[1], 2))
+redis.call('LTRIM', KEYS[2], -tonumber(ARGV[2]), -1)
+-- ARGV[3]不为空时向该频道发布房间变更通知（ARGV[4]为房间ID）
+if ARGV[3] ~= '' then
+    redis.call('PUBLISH', ARGV[3], ARGV[4])
+end
+return version
+"""
+
+# 更新房间在线状态：ARGV[2]不为空时记录用户最近在线时间，否则移除用户；
+# 然后用房间内最早的在线时间更新全局索引，房间没有在线用户时从索引中移除；返回最早的在线时间
+UPDATE_PRESENCE_SCRIPT = """
+for i = 3, #ARGV do
+    if ARGV[2] ~= '' then
+        redis.call('ZADD', KEYS[1], ARGV[2], ARGV[i])
+    else
+        redis.call('ZREM', KEYS[1], ARGV[i])
+    end
+end
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+if #KEYS > 1 then
+    if #oldest == 0 then
+        redis.call('ZREM', KEYS[2], ARGV[1])
+    else
+        redis.call('ZADD', KEYS[2], oldest[2], ARGV[1])
+    end
+end
+return oldest[2]
+"""
+
+# 取出并移除房间内在线时间早于ARGV[2]的用户（最多ARGV[3]个），更新全局索引，返回 {用户ID列表, 最早的在线时间}
+POP_EXPIRED_PRESENCE_SCRIPT = """
+local user_ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[2], 'LIMIT', 0, tonumber(ARGV[3]))
+if #user_ids > 0 then
+    redis.call('ZREM', KEYS[1], unpack(user_ids))
+end
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+if #KEYS > 1 then
+    if #oldest == 0 then
+        redis.call('ZREM', KEYS[2], ARGV[1])
+    else
+        redis.call('ZADD', KEYS[2], oldest[2], ARGV[1])
+    end
+end
+return {user_ids, oldest[2] or false}
+"""
+
+# 分配房间号：先回收到期的租约，再从号池头部取出一个未被占用的号码并登记租约
+# 租约（KEYS[2]）记录所有从号池取出的号码：分配后未确认的号码到期时间为 ARGV[1] 秒后，
+# 房间使用中的号码随房间数据的过期时间（ARGV[5]秒）续期；房间已过期（没有删除）的号码在租约到期后归还号池
+# 房间键为 ARGV[2] .. 号码 .. ARGV[4]；集群模式下房间键不在同一节点，ARGV[2]为空，不检查房间是否存在
+ALLOCATE_ROOM_NUMBER_SCRIPT = """
+local now = tonumber(redis.call('TIME')[1])
+local function room_exists(number)
+    return ARGV[2] ~= '' and redis.call('EXISTS', ARGV[2] .. number .. ARGV[4]) == 1
+end
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now, 'LIMIT', 0, 10)
+for _, number in ipairs(expired) do
+    if room_exists(number) then
+        redis.call('ZADD', KEYS[2], now + tonumber(ARGV[5]), number)
+    else
+        redis.call('ZREM', KEYS[2], number)
+        redis.call('RPUSH', KEYS[1], number)
+    end
+end
+for i = 1, tonumber(ARGV[3]) do
+    local number = redis.call('LPOP', KEYS[1])
+    if not number then
+        return false
+    end
+    -- 已有租约的号码是号池中的重复项，丢弃；被同号房间占用的号码登记租约，房间删除时归还
+    if not redis.call('ZSCORE', KEYS[2], number) then
+        if room_exists(number) then
+            redis.call('ZADD', KEYS[2], now + tonumber(ARGV[5]), number)
+        else
+            redis.call('ZADD', KEYS[2], now + tonumber(ARGV[1]), number)
+            return number
+        end
+    end
+end
+return false
+"""
+
+# 归还房间号（ARGV）：只归还有租约的号码（从号池分配的），删除租约和放回号池在同一个脚本中，号池中不会出现重复的号码
+RETURN_ROOM_NUMBERS_SCRIPT = """
+local returned = 0
+for _, number in ipairs(ARGV) do
+    if redis.call('ZREM', KEYS[2], number) == 1 then
+        redis.call('RPUSH', KEYS[1], number)
+        returned = returned + 1
+    end
+end
+return returned
+"""
+
+# Lua中计算用户->房间映射所在的分片Hash键，与 user_room_shard 一致
+USER_ROOM_SHARD_LUA = """
+local function user_room_key(prefix, shards, user_id)
+    local shard = 0
+    for i = 1, #user_id do
+        shard = (shard * 31 + string.byte(user_id, i)) % shards
+    end
+    return prefix .. shard
+end
+"""
+
+# 创建房间：房间已存在返回1，主持设备已在其他房间中返回2，成功返回0
+# 同时写入初始版本号、加入房间ID集合和最近活跃时间集合、确认房间号租约（续期到房间数据的过期时间）
+# KEYS[1-3]为房间的键，KEYS[4-7]为全局键（集群模式下不在同一节点，不传入，由调用方检查和更新）
+CREATE_ROOM_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 1
+end
+if #KEYS > 3 and redis.call('HEXISTS', KEYS[7], ARGV[6]) == 1 then
+    return 2
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[4])
+redis.call('SET', KEYS[2], ARGV[3], 'EX', ARGV[4])
+redis.call('DEL', KEYS[3])
+if #KEYS > 3 then
+    redis.call('SADD', KEYS[4], ARGV[1])
+    redis.call('ZADD', KEYS[5], ARGV[5], ARGV[1])
+    redis.call('ZADD', KEYS[6], 'XX', tonumber(ARGV[5]) + tonumber(ARGV[4]), ARGV[1])
+end
+return 0
+"""
+
+# 删除房间的所有数据键（KEYS的前ARGV[3]个），并从房间ID、最近活跃时间、在线状态索引中移除，
+# 房间号有租约（从号池分配）时删除租约并归还号池
+# 集群模式下全局键不在同一节点，不传入，由调用方更新
+DELETE_ROOM_LUA = """
+local n = tonumber(ARGV[3])
+for i = 1, n do
+    redis.call('DEL', KEYS[i])
+end
+if #KEYS > n then
+    redis.call('SREM', KEYS[n + 1], ARGV[1])
+    redis.call('ZREM', KEYS[n + 2], ARGV[1])
+    redis.call('ZREM', KEYS[n + 3], ARGV[1])
+    if redis.call('ZREM', KEYS[n + 5], ARGV[1]) == 1 then
+        redis.call('RPUSH', KEYS[n + 4], ARGV[1])
+    end
+end
+"""
+
+# 取消会议：房间不存在返回404，不是主持人返回403，会议中有人返回409，成功返回200
+CANCEL_ROOM_SCRIPT = """
+local data = redis.call('GET', KEYS[1])
+if not data then
+    return 404
+end
+if cjson.decode(data)['host_user_id'] ~= ARGV[2] then
+    return 403
+end
+if redis.call('HLEN', KEYS[2]) > 0 then
+    return 409
+end
+""" + DELETE_ROOM_LUA + """
+return 200
+"""
+
+# 关闭房间：返回 {结果, 成员ID...}，结果为 房间不存在0，不是主持人-1，成功1
+# 解除仍指向本房间的用户->房间映射（分片Hash键前缀ARGV[4]，分片数ARGV[5]；集群模式下由调用方解除）后删除房间
+FINISH_ROOM_SCRIPT = USER_ROOM_SHARD_LUA + """
+local data = redis.call('GET', KEYS[1])
+if not data then
+    return {0}
+end
+if cjson.decode(data)['host_user_id'] ~= ARGV[2] then
+    return {-1}
+end
+local user_ids = redis.call('HKEYS', KEYS[2])
+if #KEYS > tonumber(ARGV[3]) then
+    for _, user_id in ipairs(user_ids) do
+        local key = user_room_key(ARGV[4], tonumber(ARGV[5]), user_id)
+        if redis.call('HGET', key, user_id) == ARGV[1] then
+            redis.call('HDEL', key, user_id)
+        end
+    end
+end
+""" + DELETE_ROOM_LUA + """
+table.insert(user_ids, 1, 1)
+return user_ids
+"""
+
+# 获取或续约房间归属租约：租约不存在或属于ARGV[1]时设置租约并返回ARGV[1]，否则返回当前的归属实例
+CLAIM_ROOM_SCRIPT = """
+local owner = redis.call('GET', KEYS[1])
+if not owner or owner == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return ARGV[1]
+end
+return owner
+"""
+
+# 释放房间归属租约（只释放属于ARGV[1]的租约）
+RELEASE_ROOM_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# 计算用户->房间映射的分片，与Lua中的 USER_ROOM_SHARD_LUA 一致
+def user_room_shard(user_id: str) -> int:
+    shard = 0
+    for b in user_id.encode():
+        shard = (shard * 31 + b) % settings.user_room_shards
+    return shard
+
+
+# 房间号池中的号码范围（6位数字）
+ROOM_NUMBER_MIN = 100000
+ROOM_NUMBER_MAX = 999999
+
+# 号池的结构版本（版本2：使用中的号码保留租约），版本不一致时重新初始化号池
+ROOM_NUMBER_POOL_VERSION = "2"
+
+
+def is_pool_room_number(room_id: str) -> bool:
+    """房间ID是否为号池中的房间号"""
+    return room_id.isdigit() and ROOM_NUMBER_MIN <= int(room_id) <= ROOM_NUMBER_MAX
+
+
+class RedisReadNode:
+    """读节点：主节点或只读副本，副本记录最近一次检测的复制延迟"""
+
+    def __init__(self, name: str, client):
+        self.name = name
+        self.client = client
+        self.lag_ms: Optional[int] = None
+        # 最近一次检测的时间（time.monotonic）
+        self.checked_at = 0.0
+        self.healthy = False
+
+
+# replica_reads() 中选定的读节点，None表示不在 replica_reads() 中
+_read_node: ContextVar[Optional[RedisReadNode]] = ContextVar("redis_read_node", default=None)
+
+
+def replica_read(method):
+    """
+    可以由只读副本执行的读操作，方法内通过 self._reader 读取：
+    在 replica_reads() 中使用选定的读节点，副本连接失败时改为读取主节点
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        node = _read_node.get()
+        if node is None:
+            return method(self, *args, **kwargs)
+        if node is not self._primary:
+            try:
+                result = method(self, *args, **kwargs)
+                metrics.inc("redis_routed_reads_total", target="replica")
+                return result
+            except (redis.ConnectionError, redis.TimeoutError) as e:
+                logger.warning(f"读取Redis副本失败，改为读取主节点: {node.name}, {e}")
+                node.healthy = False
+                metrics.inc("redis_replica_errors_total", replica=node.name)
+                _read_node.set(self._primary)
+        metrics.inc("redis_routed_reads_total", target="primary")
+        return method(self, *args, **kwargs)
+    return wrapper
+
 
 class RedisClient:
     """Redis客户端管理类，用于管理房间数据的存储和检索"""
 
     def __init__(self):
         """初始化Redis连接"""
-        self._client = redis.Redis(
-            host=settings.redis_host,
-            port=settings.redis_port,
-            db=settings.redis_db,
-            password=settings.redis_password if settings.redis_password else None,
-            decode_responses=True,  # 自动解码为字符串
-            socket_connect_timeout=5,
-            socket_timeout=5,
-        )
+        # 集群模式：房间的所有键通过哈希标签 {房间ID} 落在同一个槽，房间内的多键操作和Lua脚本不跨节点；
+        # 涉及全局索引的操作拆分为房间内的原子操作 + 索引更新
+        self._cluster = settings.redis_cluster
+        if self._cluster:
+            nodes = settings.redis_cluster_nodes or f"{settings.redis_host}:{settings.redis_port}"
+            self._client = RedisCluster(
+                startup_nodes=[ClusterNode(*node.strip().rsplit(":", 1)) for node in nodes.split(",")],
+                password=settings.redis_password if settings.redis_password else None,
+                decode_responses=True,
+                socket_connect_timeout=5,
+                socket_timeout=5,
+            )
+        else:
+            self._client = redis.Redis(
+                host=settings.redis_host,
+                port=settings.redis_port,
+                db=settings.redis_db,
+                password=settings.redis_password if settings.redis_password else None,
+                decode_responses=True,  # 自动解码为字符串
+                socket_connect_timeout=5,
+                socket_timeout=5,
+            )
+        self._primary = RedisReadNode("primary", self._client)
+        self._primary.healthy = True
+        # 只读副本（集群模式下不使用）
+        self.replicas: List[RedisReadNode] = []
+        if settings.redis_replicas and not self._cluster:
+            for node in settings.redis_replicas.split(","):
+                host, port = node.strip().rsplit(":", 1)
+                self.replicas.append(RedisReadNode(f"{host}:{port}", redis.Redis(
+                    host=host,
+                    port=int(port),
+                    db=settings.redis_db,
+                    password=settings.redis_password if settings.redis_password else None,
+                    decode_responses=True,
+                    socket_connect_timeout=5,
+                    socket_timeout=5,
+                )))
+        self._replica_turn = 0
+        # 房间变更的本进程监听者（近端缓存）
+        self._room_change_listeners: List[Callable[[List[str]], None]] = []
+        # 成员记录的编码
+        self._member_codec = get_codec(settings.redis_record_codec)
+        self._token_bucket = self._client.register_script(TOKEN_BUCKET_SCRIPT)
+        self._register_cloud_task = self._client.register_script(REGISTER_CLOUD_TASK_SCRIPT)
+        self._unregister_cloud_task = self._client.register_script(UNREGISTER_CLOUD_TASK_SCRIPT)
+        self._record_room_change = self._client.register_script(RECORD_ROOM_CHANGE_SCRIPT)
+        self._update_presence = self._client.register_script(UPDATE_PRESENCE_SCRIPT)
+        self._pop_expired_presence = self._client.register_script(POP_EXPIRED_PRESENCE_SCRIPT)
+        self._allocate_room_number = self._client.register_script(ALLOCATE_ROOM_NUMBER_SCRIPT)
+        self._return_room_numbers = self._client.register_script(RETURN_ROOM_NUMBERS_SCRIPT)
+        self._create_room = self._client.register_script(CREATE_ROOM_SCRIPT)
+        self._cancel_room = self._client.register_script(CANCEL_ROOM_SCRIPT)
+        self._finish_room = self._client.register_script(FINISH_ROOM_SCRIPT)
+
+    @property
+    def _reader(self):
+        """读操作（@replica_read）使用的连接：replica_reads() 中为选定的读节点，否则为主节点"""
+        node = _read_node.get()
+        return self._client if node is None else node.client
+
+    def _read_pipeline(self, transaction: bool = True):
+        """创建读操作（@replica_read）使用的pipeline"""
+        return self._reader.pipeline(transaction=transaction and not self._cluster)
+
+    def _pipeline(self, transaction: bool = True):
+        """创建pipeline；集群模式不支持事务，命令按节点分组发送"""
+        return self._client.pipeline(transaction=transaction and not self._cluster)
+
+    def _delete_keys(self, pipeline, keys: List[str]) -> None:
+        """在pipeline中删除多个键（集群模式的pipeline每条DEL只能有一个键）"""
+        if self._cluster:
+            for key in keys:
+                pipeline.delete(key)
+        elif keys:
+            pipeline.delete(*keys)
+
+    def _with_global_keys(self, room_keys: List[str], *global_keys: str) -> List[str]:
+        """Lua脚本的键：房间的键 + 全局键（集群模式下全局键不在同一节点，不传入，由调用方单独更新）"""
+        if self._cluster:
+            return room_keys
+        return room_keys + list(global_keys)
+
+    def _mget(self, keys: List[str]) -> List[Optional[str]]:
+        """批量读取字符串键（集群模式下按槽拆分）"""
+        if self._cluster:
+            return self._client.mget_nonatomic(keys)
+        return self._reader.mget(keys)
+
+    def _scan_batches(self, match: str, batch_size: int) -> Iterator[List[str]]:
+        """分批遍历匹配的键（集群模式下遍历所有主节点）"""
+        batch = []
+        for key in self._client.scan_iter(match=match, count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
 
     def _get_room_key(self, room_id: str) -> str:
-        """生成房间的Redis键"""
-        return f"{REDIS_PREFIX}room:{room_id}"
+        """生成房间的Redis键；房间的所有键使用哈希标签 {房间ID}，集群模式下落在同一个槽"""
+        return f"{REDIS_PREFIX}room:{{{room_id}}}"
 
     def _get_users_key(self, room_id: str) -> str:
         """生成房间用户列表的Redis键"""
-        return f"{REDIS_PREFIX}room:{room_id}:users"
+        return f"{REDIS_PREFIX}room:{{{room_id}}}:users"
+
+    def _get_members_key(self, room_id: str) -> str:
+        """生成房间成员按加入时间排序的索引的Redis键"""
+        return f"{REDIS_PREFIX}room:{{{room_id}}}:members"
+
+    def _get_humans_key(self, room_id: str) -> str:
+        """生成房间内真人用户ID集合的Redis键"""
+        return f"{REDIS_PREFIX}room:{{{room_id}}}:humans"
+
+    def _get_devices_key(self, room_id: str) -> str:
+        """生成房间内设备ID集合的Redis键"""
+        return f"{REDIS_PREFIX}room:{{{room_id}}}:devices"
+
+    def _get_member_set_key(self, room_id: str, user_id: str) -> str:
+        """按用户ID判断是真人用户还是设备，返回对应集合的Redis键"""
+        if len(user_id) == HUMAN_USER_ID_LENGTH:
+            return self._get_humans_key(room_id)
+        return self._get_devices_key(room_id)
+
+    def _get_presence_key(self, room_id: str) -> str:
+        """生成房间内用户最近在线时间有序集合的Redis键"""
+        return f"{REDIS_PREFIX}room:{{{room_id}}}:presence"
+
+    def _get_presence_index_key(self) -> str:
+        """生成按最早在线时间排序的房间索引的Redis键"""
+        return f"{REDIS_PREFIX}presence:rooms"
 
     def _get_user_room_key(self, user_id: str) -> str:
-        """生成用户->房间映射的Redis键"""
+        """生成旧版用户->房间映射的Redis键（每个用户一个字符串键，仅用于迁移）"""
         return f"{REDIS_PREFIX}user:{user_id}:room"
 
+    def _get_user_room_shard_key(self, user_id: str) -> str:
+        """生成用户->房间映射所在分片Hash的Redis键"""
+        return f"{REDIS_PREFIX}userroom:{user_room_shard(user_id)}"
+
+    def _get_room_version_key(self, room_id: str) -> str:
+        """生成房间状态版本号的Redis键"""
+        return f"{REDIS_PREFIX}room:{{{room_id}}}:version"
+
+    def _get_room_changes_key(self, room_id: str) -> str:
+        """生成房间变更日志的Redis键"""
+        return f"{REDIS_PREFIX}room:{{{room_id}}}:changes"
+
+    def _get_room_tasks_key(self, room_id: str) -> str:
+        """生成房间云端任务列表的Redis键"""
+        return f"{REDIS_PREFIX}room:{{{room_id}}}:tasks"
+
+    def _get_room_agent_key(self, room_id: str) -> str:
+        """生成房间AI智能体会话的Redis键"""
+        return f"{REDIS_PREFIX}room:{{{room_id}}}:agent"
+
+    def _get_room_data_keys(self, room_id: str) -> List[str]:
+        """房间状态相关的所有Redis键（不含云端任务和AI智能体会话，它们有各自的清理流程）"""
+        return [
+            self._get_room_key(room_id),
+            self._get_users_key(room_id),
+            self._get_members_key(room_id),
+            self._get_humans_key(room_id),
+            self._get_devices_key(room_id),
+            self._get_room_version_key(room_id),
+            self._get_room_changes_key(room_id),
+            self._get_presence_key(room_id),
+        ]
+
+    def _get_room_index_key(self) -> str:
+        """生成所有房间ID集合的Redis键"""
+        return f"{REDIS_PREFIX}rooms"
+
+    def _get_room_number_pool_key(self) -> str:
+        """生成空闲房间号池的Redis键"""
+        return f"{REDIS_PREFIX}{{roomno}}:pool"
+
+    def _get_room_number_leases_key(self) -> str:
+        """生成已分配未确认房间号租约的Redis键"""
+        return f"{REDIS_PREFIX}{{roomno}}:leases"
+
+    def _get_room_number_ready_key(self) -> str:
+        """生成房间号池已初始化标记的Redis键"""
+        return f"{REDIS_PREFIX}{{roomno}}:ready"
+
+    def _get_room_changes_channel(self) -> str:
+        """房间变更通知的发布订阅频道"""
+        return f"{REDIS_PREFIX}rooms:changed"
+
+    def _get_instances_key(self) -> str:
+        """在线实例的有序集合（分数为实例租约的到期时间，毫秒）"""
+        return f"{REDIS_PREFIX}instances"
+
+    def _get_instance_channel(self, instance_id: str) -> str:
+        """实例间转发消息的频道"""
+        return f"{REDIS_PREFIX}instance:{instance_id}"
+
+    def _get_room_owner_key(self, room_id: str) -> str:
+        """房间归属租约的Redis键"""
+        return f"{REDIS_PREFIX}room:{{{room_id}}}:owner"
+
+    def _get_lock_key(self, name: str) -> str:
+        """生成分布式锁的Redis键"""
+        return f"{REDIS_PREFIX}lock:{name}"
+
+    def _get_room_activity_key(self) -> str:
+        """生成房间最近活跃时间有序集合的Redis键"""
+        return f"{REDIS_PREFIX}rooms:activity"
+
+    def _get_task_rooms_key(self) -> str:
+        """生成有云端任务的房间集合的Redis键"""
+        return f"{REDIS_PREFIX}tasks:rooms"
+
+    def _get_outbox_key(self, name: str) -> str:
+        """生成出站消息流的Redis键；所有消息流在同一个槽，可以一次读取多个流"""
+        return f"{REDIS_PREFIX}{{outbox}}:{name}"
+
+    def _get_rate_limit_key(self, name: str) -> str:
+        """生成限流令牌桶的Redis键"""
+        return f"{REDIS_PREFIX}ratelimit:{name}"
+
     def set_room(self, room_id: str, room_data: Dict[str, Any]) -> None:
         """
         保存房间信息到Redis
@@ -42,8 +572,13 @@ class RedisClient:
             room_data: 房间数据字典
         """
         key = self._get_room_key(room_id)
-        self._client.set(key, json.dumps(room_data, ensure_ascii=False))
+        pipeline = self._pipeline()
+        pipeline.set(key, json.dumps(room_data, ensure_ascii=False))
+        pipeline.sadd(self._get_room_index_key(), room_id)
+        self._notify_room_changes([room_id], pipeline)
+        pipeline.execute()
 
+    @replica_read
     def get_room(self, room_id: str) -> Optional[Dict[str, Any]]:
         """
         从Redis获取房间信息
@@ -55,7 +590,7 @@ class RedisClient:
             房间数据字典，如果不存在则返回None
         """
         key = self._get_room_key(room_id)
-        data = self._client.get(key)
+        data = self._reader.get(key)
         if data:
             return json.loads(data)
         return None
@@ -67,9 +602,132 @@ class RedisClient:
         Args:
             room_id: 房间ID
         """
-        room_key = self._get_room_key(room_id)
-        users_key = self._get_users_key(room_id)
-        self._client.delete(room_key, users_key)
+        pipeline = self._pipeline()
+        self._delete_keys(pipeline, self._get_room_data_keys(room_id))
+        self._remove_room_indexes(pipeline, [room_id])
+        self._notify_room_changes([room_id], pipeline)
+        pipeline.execute()
+
+    def _remove_room_indexes(self, pipeline, room_ids: List[str]) -> None:
+        """在pipeline中将已删除的房间从房间ID、最近活跃时间、在线状态索引中移除，从号池分配的房间号归还到号池"""
+        pipeline.srem(self._get_room_index_key(), *room_ids)
+        pipeline.zrem(self._get_room_activity_key(), *room_ids)
+        pipeline.zrem(self._get_presence_index_key(), *room_ids)
+        pool_numbers = [room_id for room_id in room_ids if is_pool_room_number(room_id)]
+        if pool_numbers:
+            self._return_numbers(pipeline, pool_numbers)
+
+    def _return_numbers(self, pipeline, numbers: List[str]) -> None:
+        """在pipeline中归还有租约的房间号（集群模式的pipeline不会自动加载脚本，使用EVAL）"""
+        pipeline.eval(RETURN_ROOM_NUMBERS_SCRIPT, 2,
+                      self._get_room_number_pool_key(), self._get_room_number_leases_key(), *numbers)
+
+    def _get_delete_room_keys(self, room_id: str) -> List[str]:
+        """DELETE_ROOM_LUA 使用的键：房间数据键 + 房间ID集合、最近活跃时间、在线状态索引、房间号池、房间号租约（集群模式下只有房间数据键）"""
+        keys = self._get_room_data_keys(room_id)
+        if self._cluster:
+            return keys
+        return keys + [
+            self._get_room_index_key(),
+            self._get_room_activity_key(),
+            self._get_presence_index_key(),
+            self._get_room_number_pool_key(),
+            self._get_room_number_leases_key(),
+        ]
+
+    def create_room(
+            self, room_id: str, room_data: Dict[str, Any], host_device_sn: str, version: int, ttl_seconds: int, now: int,
+            ) -> int:
+        """
+        原子地创建房间（一次请求；集群模式下主持设备检查和全局索引更新不在同一个原子操作中）
+
+        Args:
+            room_id: 房间ID
+            room_data: 房间数据字典
+            host_device_sn: 主持设备SN，设备已在其他房间中时不创建
+            version: 初始版本号
+            ttl_seconds: 房间数据的过期时间，单位秒
+            now: 当前时间戳，单位秒
+
+        Returns:
+            0: 成功
+            1: 房间已存在
+            2: 设备已有房间
+        """
+        keys = [
+            self._get_room_key(room_id),
+            self._get_room_version_key(room_id),
+            self._get_room_changes_key(room_id),
+        ]
+        if not self._cluster:
+            keys += [
+                self._get_room_index_key(),
+                self._get_room_activity_key(),
+                self._get_room_number_leases_key(),
+                self._get_user_room_shard_key(host_device_sn),
+            ]
+        elif self.get_user_room(host_device_sn):
+            return 2
+
+        result = self._create_room(
+            keys=keys,
+            args=[room_id, json.dumps(room_data, ensure_ascii=False), version, ttl_seconds, now, host_device_sn],
+        )
+        if self._cluster and result == 0:
+            pipeline = self._pipeline()
+            pipeline.sadd(self._get_room_index_key(), room_id)
+            pipeline.zadd(self._get_room_activity_key(), {room_id: now})
+            pipeline.zadd(self._get_room_number_leases_key(), {room_id: now + ttl_seconds}, xx=True)
+            pipeline.execute()
+        return result
+
+    def cancel_room(self, room_id: str, user_id: str) -> int:
+        """
+        原子地取消会议（一次请求）：只有主持人可以取消，且会议中没有人
+
+        Returns:
+            200: 成功
+            403: 不是主持人
+            404: 房间不存在
+            409: 会议中有人
+        """
+        result = self._cancel_room(
+            keys=self._get_delete_room_keys(room_id),
+            args=[room_id, user_id, len(self._get_room_data_keys(room_id))],
+        )
+        if result == 200:
+            pipeline = self._pipeline()
+            if self._cluster:
+                self._remove_room_indexes(pipeline, [room_id])
+            self._notify_room_changes([room_id], pipeline)
+            pipeline.execute()
+        return result
+
+    def finish_room(self, room_id: str, user_id: str) -> int:
+        """
+        原子地关闭房间（一次请求）：只有主持人可以关闭，解除成员的用户->房间映射并删除房间
+
+        Returns:
+            1: 成功
+            0: 房间不存在
+            -1: 不是主持人
+        """
+        result, *user_ids = self._finish_room(
+            keys=self._get_delete_room_keys(room_id),
+            args=[
+                room_id, user_id, len(self._get_room_data_keys(room_id)),
+                f"{REDIS_PREFIX}userroom:", settings.user_room_shards,
+            ],
+        )
+        if result == 1:
+            pipeline = self._pipeline()
+            if self._cluster:
+                self._remove_room_indexes(pipeline, [room_id])
+            self._notify_room_changes([room_id], pipeline)
+            pipeline.execute()
+            if self._cluster:
+                self._remove_user_rooms([(room_id, uid) for uid in user_ids])
+        return result
 
     def exists_room(self, room_id: str) -> bool:
         """
@@ -84,6 +742,14 @@ class RedisClient:
         key = self._get_room_key(room_id)
         return self._client.exists(key) > 0
 
+    def _encode_member(self, room_id: str, user_id: str, user_data: Dict[str, Any]) -> str:
+        """编码成员记录，与Hash键和字段重复的 room_id、user_id 可以省略"""
+        return self._member_codec.encode(user_data, {"user_id": user_id, "room_id": room_id})
+
+    def _decode_member(self, room_id: str, user_id: str, user_json: str) -> Dict[str, Any]:
+        """解码成员记录"""
+        return decode_record(user_json, {"user_id": user_id, "room_id": room_id})
+
     def set_room_users(self, room_id: str, users_data: Dict[str, Dict[str, Any]]) -> None:
         """
         保存房间用户列表到Redis
@@ -93,16 +759,24 @@ class RedisClient:
             users_data: 用户数据字典，格式为 {user_id: user_dict}
         """
         key = self._get_users_key(room_id)
+        members_key = self._get_members_key(room_id)
+        humans_key = self._get_humans_key(room_id)
+        devices_key = self._get_devices_key(room_id)
         # 使用hash存储，每个用户ID作为field，用户数据作为value
         if users_data:
-            pipeline = self._client.pipeline()
-            pipeline.delete(key)  # 先清空
+            pipeline = self._pipeline()
+            self._delete_keys(pipeline, [key, members_key, humans_key, devices_key])  # 先清空
             for user_id, user_dict in users_data.items():
-                pipeline.hset(key, user_id, json.dumps(user_dict, ensure_ascii=False))
+                pipeline.hset(key, user_id, self._encode_member(room_id, user_id, user_dict))
+                pipeline.sadd(self._get_member_set_key(room_id, user_id), user_id)
+            pipeline.zadd(members_key, {
+                user_id: user_dict.get("join_time") or 0 for user_id, user_dict in users_data.items()
+            })
             pipeline.execute()
         else:
-            self._client.delete(key)
+            self._client.delete(key, members_key, humans_key, devices_key)
 
+    @replica_read
     def get_room_users(self, room_id: str) -> Dict[str, Dict[str, Any]]:
         """
         从Redis获取房间用户列表
@@ -114,14 +788,15 @@ class RedisClient:
             用户数据字典，格式为 {user_id: user_dict}
         """
         key = self._get_users_key(room_id)
-        users_data = self._client.hgetall(key)
+        users_data = self._reader.hgetall(key)
         if users_data:
             return {
-                user_id: json.loads(user_json)
+                user_id: self._decode_member(room_id, user_id, user_json)
                 for user_id, user_json in users_data.items()
             }
         return {}
 
+    @replica_read
     def get_room_user(self, room_id: str, user_id: str) -> Optional[Dict[str, Any]]:
         """
         获取房间内的单个用户数据
@@ -134,9 +809,9 @@ class RedisClient:
             用户数据字典，如果不存在则返回None
         """
         key = self._get_users_key(room_id)
-        user_json = self._client.hget(key, user_id)
+        user_json = self._reader.hget(key, user_id)
         if user_json:
-            return json.loads(user_json)
+            return self._decode_member(room_id, user_id, user_json)
         return None
 
     def set_room_user(self, room_id: str, user_id: str, user_data: Dict[str, Any]) -> None:
@@ -149,18 +824,22 @@ class RedisClient:
             user_data: 用户数据字典
         """
         key = self._get_users_key(room_id)
-        self._client.hset(key, user_id, json.dumps(user_data, ensure_ascii=False))
+        self._client.hset(key, user_id, self._encode_member(room_id, user_id, user_data))
 
     def add_room_user(self, room_id: str, user_id: str, user_data: Dict[str, Any]) -> None:
         """
-        添加用户到房间（别名方法，实际调用set_room_user）
+        添加用户到房间，同时写入按加入时间排序的成员索引和真人用户/设备集合
 
         Args:
             room_id: 房间ID
             user_id: 用户ID
             user_data: 用户数据字典
         """
-        self.set_room_user(room_id, user_id, user_data)
+        pipeline = self._pipeline()
+        pipeline.hset(self._get_users_key(room_id), user_id, self._encode_member(room_id, user_id, user_data))
+        pipeline.zadd(self._get_members_key(room_id), {user_id: user_data.get("join_time") or 0})
+        pipeline.sadd(self._get_member_set_key(room_id, user_id), user_id)
+        pipeline.execute()
 
     def remove_room_user(self, room_id: str, user_id: str) -> None:
         """
@@ -170,32 +849,70 @@ class RedisClient:
             room_id: 房间ID
             user_id: 用户ID
         """
-        key = self._get_users_key(room_id)
-        self._client.hdel(key, user_id)
+        pipeline = self._pipeline()
+        pipeline.hdel(self._get_users_key(room_id), user_id)
+        pipeline.zrem(self._get_members_key(room_id), user_id)
+        pipeline.srem(self._get_member_set_key(room_id, user_id), user_id)
+        pipeline.execute()
 
-    def clear_room_users(self, room_id: str) -> None:
+    def get_room_user_ids(self, room_id: str) -> list[str]:
         """
-        清空房间内的所有用户
+        获取房间内所有用户ID列表
 
         Args:
             room_id: 房间ID
+
+        Returns:
+            用户ID列表
         """
         key = self._get_users_key(room_id)
-        self._client.delete(key)
+        return list(self._client.hkeys(key))
 
-    def get_room_user_ids(self, room_id: str) -> list[str]:
+    def get_room_member_ids(self, room_id: str) -> Optional[Tuple[List[str], List[str]]]:
         """
-        获取房间内所有用户ID列表
+        房间存在时获取房间内的真人用户ID和设备ID
 
         Args:
             room_id: 房间ID
 
         Returns:
-            用户ID列表
+            (真人用户ID列表, 设备ID列表)，房间不存在时返回None
         """
-        key = self._get_users_key(room_id)
-        return list(self._client.hkeys(key))
+        pipeline = self._pipeline()
+        pipeline.exists(self._get_room_key(room_id))
+        pipeline.smembers(self._get_humans_key(room_id))
+        pipeline.smembers(self._get_devices_key(room_id))
+        pipeline.hlen(self._get_users_key(room_id))
+        exists, human_ids, device_ids, user_count = pipeline.execute()
+        if not exists:
+            return None
+        if len(human_ids) + len(device_ids) != user_count:
+            # 集合与用户数据不一致（如集合上线前创建的房间），根据用户数据重建
+            return self.rebuild_room_member_sets(room_id)
+        return list(human_ids), list(device_ids)
+
+    def rebuild_room_member_sets(self, room_id: str) -> Tuple[List[str], List[str]]:
+        """
+        根据房间用户数据重建真人用户/设备集合
+
+        Returns:
+            (真人用户ID列表, 设备ID列表)
+        """
+        user_ids = self.get_room_user_ids(room_id)
+        human_ids = [user_id for user_id in user_ids if len(user_id) == HUMAN_USER_ID_LENGTH]
+        device_ids = [user_id for user_id in user_ids if len(user_id) != HUMAN_USER_ID_LENGTH]
+        humans_key = self._get_humans_key(room_id)
+        devices_key = self._get_devices_key(room_id)
+        pipeline = self._pipeline()
+        self._delete_keys(pipeline, [humans_key, devices_key])
+        if human_ids:
+            pipeline.sadd(humans_key, *human_ids)
+        if device_ids:
+            pipeline.sadd(devices_key, *device_ids)
+        pipeline.execute()
+        return human_ids, device_ids
 
+    @replica_read
     def get_room_user_count(self, room_id: str) -> int:
         """
         获取房间内用户数量
@@ -207,37 +924,526 @@ class RedisClient:
             用户数量
         """
         key = self._get_users_key(room_id)
-        return self._client.hlen(key)
+        return self._reader.hlen(key)
 
-    def get_all_room_ids(self) -> list[str]:
+    @replica_read
+    def get_room_version(self, room_id: str) -> int:
         """
-        获取所有房间ID
+        获取房间当前的版本号
+
+        Args:
+            room_id: 房间ID
+
+        Returns:
+            版本号，没有记录时返回0
+        """
+        return int(self._reader.get(self._get_room_version_key(room_id)) or 0)
+
+    def record_room_change(self, room_id: str, change: Dict[str, Any], max_changes: int) -> int:
+        """
+        记录一次房间变更，版本号加一
+
+        Args:
+            room_id: 房间ID
+            change: 变更内容
+            max_changes: 变更日志最多保留的条数
+
+        Returns:
+            变更后的版本号
+        """
+        # 在脚本中发布房间变更通知，不增加请求次数
+        self._notify_room_changes([room_id])
+        return int(self._record_room_change(
+            keys=[self._get_room_version_key(room_id), self._get_room_changes_key(room_id)],
+            args=[
+                json.dumps(change, ensure_ascii=False), max_changes,
+                self._get_room_changes_channel() if settings.room_cache_enabled else "", room_id,
+            ],
+        ))
+
+    def add_room_change_listener(self, listener: Callable[[List[str]], None]) -> None:
+        """
+        添加本进程的房间变更监听者，房间状态或成员每次修改时以变更的房间ID列表调用
+        （其他实例的修改通过 subscribe_room_changes 订阅）
+        """
+        self._room_change_listeners.append(listener)
+
+    def _notify_room_changes(self, room_ids: List[str], pipeline=None) -> None:
+        """
+        房间状态或成员被修改：通知本进程的监听者，开启近端缓存时发布房间变更通知
+
+        Args:
+            room_ids: 变更的房间ID
+            pipeline: 在此pipeline中发布，None表示不发布（由脚本发布）
+        """
+        for listener in self._room_change_listeners:
+            listener(room_ids)
+        if pipeline is not None and settings.room_cache_enabled:
+            for room_id in room_ids:
+                pipeline.publish(self._get_room_changes_channel(), room_id)
+
+    def subscribe_room_changes(self):
+        """
+        订阅房间变更通知
+
+        Returns:
+            PubSub对象，用于 wait_messages
+        """
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self._get_room_changes_channel())
+        return pubsub
+
+    def wait_messages(self, pubsub, timeout: float, sharded: bool = False) -> List[str]:
+        """
+        等待订阅的消息（阻塞，最多等待timeout秒），连接断开时抛出异常
+
+        Args:
+            pubsub: subscribe_* 返回的PubSub对象
+            timeout: 最长等待时间，单位秒
+            sharded: 是否为分片频道（集群模式下的实例消息）
+
+        Returns:
+            消息内容列表，超时时为空
+        """
+        get_message = pubsub.get_sharded_message if sharded and self._cluster else pubsub.get_message
+        messages = []
+        message = get_message(timeout=timeout)
+        while message is not None:
+            messages.append(message["data"])
+            message = get_message(timeout=0)
+        return messages
+
+    def heartbeat_instance(self, instance_id: str, lease_ms: int) -> List[str]:
+        """
+        续约实例的在线租约，并清理租约已过期的实例（一次请求）
+
+        Returns:
+            在线的实例ID列表
+        """
+        now_ms = int(time.time() * 1000)
+        pipeline = self._pipeline()
+        pipeline.zadd(self._get_instances_key(), {instance_id: now_ms + lease_ms})
+        pipeline.zremrangebyscore(self._get_instances_key(), "-inf", now_ms)
+        pipeline.zrange(self._get_instances_key(), 0, -1)
+        return pipeline.execute()[-1]
+
+    def remove_instance(self, instance_id: str) -> None:
+        """
+        实例下线，从在线实例中移除
+        """
+        self._client.zrem(self._get_instances_key(), instance_id)
+
+    def claim_rooms(self, room_ids: List[str], instance_id: str, lease_ms: int) -> List[str]:
+        """
+        获取或续约房间归属租约（一次请求）
+
+        Returns:
+            与room_ids顺序对应的归属实例ID，等于instance_id表示获取成功
+        """
+        if not room_ids:
+            return []
+        # 集群模式的pipeline不会自动加载脚本，租约脚本很短，直接使用EVAL
+        pipeline = self._pipeline(transaction=False)
+        for room_id in room_ids:
+            pipeline.eval(CLAIM_ROOM_SCRIPT, 1, self._get_room_owner_key(room_id), instance_id, lease_ms)
+        return pipeline.execute()
+
+    def release_rooms(self, room_ids: List[str], instance_id: str) -> None:
+        """
+        释放本实例持有的房间归属租约
+        """
+        if not room_ids:
+            return
+        pipeline = self._pipeline(transaction=False)
+        for room_id in room_ids:
+            pipeline.eval(RELEASE_ROOM_SCRIPT, 1, self._get_room_owner_key(room_id), instance_id)
+        pipeline.execute()
+
+    def subscribe_instance_messages(self, instance_id: str):
+        """
+        订阅转发给实例的消息（集群模式下使用分片频道，发布时可以知道实例是否在订阅）
 
         Returns:
-            房间ID列表
+            PubSub对象，用于 wait_messages(sharded=True)
         """
-        pattern = f"{REDIS_PREFIX}room:*"
-        keys = self._client.keys(pattern)
-        # 提取room_id，过滤掉users键
-        room_ids = []
-        for key in keys:
-            if not key.endswith(":users"):
-                # 提取 "jusi_meet:room:{room_id}" 中的 room_id
-                room_id = key.replace(f"{REDIS_PREFIX}room:", "")
-                room_ids.append(room_id)
-        return room_ids
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        if self._cluster:
+            pubsub.ssubscribe(self._get_instance_channel(instance_id))
+        else:
+            pubsub.subscribe(self._get_instance_channel(instance_id))
+        return pubsub
+
+    def publish_instance_message(self, instance_id: str, data: str) -> int:
+        """
+        向实例转发消息
+
+        Returns:
+            收到消息的订阅者数量，0表示实例不在线
+        """
+        if self._cluster:
+            return self._client.spublish(self._get_instance_channel(instance_id), data)
+        return self._client.publish(self._get_instance_channel(instance_id), data)
+
+    @replica_read
+    def get_room_changes(self, room_id: str) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        获取房间当前版本号及变更日志
+
+        Args:
+            room_id: 房间ID
+
+        Returns:
+            (版本号, 按版本号升序排列的变更列表)
+        """
+        pipeline = self._read_pipeline()
+        pipeline.get(self._get_room_version_key(room_id))
+        pipeline.lrange(self._get_room_changes_key(room_id), 0, -1)
+        version, changes = pipeline.execute()
+        return int(version or 0), [json.loads(change) for change in changes]
+
+    @replica_read
+    def get_room_users_page(
+            self, room_id: str,
+            after: Optional[Tuple[int, str]],
+            count: int
+            ) -> Tuple[List[Dict[str, Any]], Optional[Tuple[int, str]]]:
+        """
+        按加入时间分页获取房间用户
+
+        Args:
+            room_id: 房间ID
+            after: 上一页最后一个用户的 (加入时间, 用户ID)，None表示从头开始
+            count: 每页数量
+
+        Returns:
+            (用户数据列表, 下一页的起始位置)，没有更多数据时起始位置为None
+        """
+        members_key = self._get_members_key(room_id)
+        if after is None:
+            members = self._reader.zrangebyscore(members_key, "-inf", "+inf", start=0, num=count + 1, withscores=True)
+        else:
+            # 加入时间相同的成员按用户ID字典序排列，分别取同一时间内排在后面的成员和更晚加入的成员
+            join_time, user_id = after
+            pipeline = self._read_pipeline()
+            pipeline.zrangebyscore(members_key, join_time, join_time, withscores=True)
+            pipeline.zrangebyscore(members_key, f"({join_time}", "+inf", start=0, num=count + 1, withscores=True)
+            same_time, later = pipeline.execute()
+            members = [m for m in same_time if m[0] > user_id] + later
+        members = members[:count + 1]
+
+        page = members[:count]
+        if not page:
+            return [], None
+        user_ids = [user_id for user_id, _ in page]
+        users_json = self._reader.hmget(self._get_users_key(room_id), user_ids)
+        users = [
+            self._decode_member(room_id, user_id, user_json)
+            for user_id, user_json in zip(user_ids, users_json) if user_json
+        ]
+        last_user_id, last_join_time = page[-1]
+        next_after = (int(last_join_time), last_user_id) if len(members) > count else None
+        return users, next_after
+
+    def rebuild_room_members_index(self, room_id: str) -> int:
+        """
+        根据房间用户数据重建成员索引（兼容索引上线前创建的房间）
+
+        Returns:
+            索引中的成员数量
+        """
+        # 根据主节点上的用户数据重建（可能在 replica_reads() 中调用）
+        token = _read_node.set(None)
+        try:
+            users_data = self.get_room_users(room_id)
+        finally:
+            _read_node.reset(token)
+        if users_data:
+            self._client.zadd(self._get_members_key(room_id), {
+                user_id: user_dict.get("join_time") or 0 for user_id, user_dict in users_data.items()
+            })
+        return len(users_data)
+
+    @replica_read
+    def get_room_members_count(self, room_id: str) -> int:
+        """
+        获取成员索引中的成员数量
+        """
+        return self._reader.zcard(self._get_members_key(room_id))
+
+    def acquire_lock(self, name: str, ttl_seconds: int) -> bool:
+        """
+        获取简单的分布式锁（SET NX），到期自动释放
+
+        Returns:
+            是否获取成功
+        """
+        return bool(self._client.set(self._get_lock_key(name), 1, nx=True, ex=ttl_seconds))
+
+    def release_lock(self, name: str) -> None:
+        """
+        释放分布式锁
+        """
+        self._client.delete(self._get_lock_key(name))
+
+    def is_room_number_pool_ready(self) -> bool:
+        """
+        房间号池是否已初始化
+        """
+        return self._client.get(self._get_room_number_ready_key()) == ROOM_NUMBER_POOL_VERSION
+
+    def init_room_number_pool(self, numbers: List[str], in_use: List[str], ttl_seconds: int, batch_size: int = 10000) -> None:
+        """
+        初始化房间号池（覆盖已有的号池），已被房间占用的号码登记租约，房间删除时归还号池
+
+        Args:
+            numbers: 打乱顺序后的空闲房间号
+            in_use: 已被房间占用的号码
+            ttl_seconds: 已占用号码的租约时长（房间数据的过期时间），单位秒
+            batch_size: 每次写入的数量
+        """
+        expire_at = int(time.time()) + ttl_seconds
+        for i in range(0, len(in_use), batch_size):
+            self._client.zadd(self._get_room_number_leases_key(), {number: expire_at for number in in_use[i:i + batch_size]})
+        pool_key = self._get_room_number_pool_key()
+        tmp_key = f"{pool_key}:building"
+        self._client.delete(tmp_key)
+        for i in range(0, len(numbers), batch_size):
+            self._client.rpush(tmp_key, *numbers[i:i + batch_size])
+        # 写入完成后再替换，构建期间的分配请求仍使用旧号池
+        pipeline = self._pipeline()
+        if numbers:
+            pipeline.rename(tmp_key, pool_key)
+        else:
+            pipeline.delete(pool_key)
+        pipeline.set(self._get_room_number_ready_key(), ROOM_NUMBER_POOL_VERSION)
+        pipeline.execute()
+
+    def pop_room_number(self, lease_seconds: int, max_skips: int = 100) -> Optional[str]:
+        """
+        从号池中取出一个空闲的房间号，并登记租约（租约到期前未确认则归还号池）
+
+        Args:
+            lease_seconds: 租约时长，单位秒
+            max_skips: 最多跳过的已被占用的号码数量
+
+        Returns:
+            房间号，号池为空时返回None
+        """
+        keys = [self._get_room_number_pool_key(), self._get_room_number_leases_key()]
+        if not self._cluster:
+            return self._allocate_room_number(
+                keys=keys, args=[lease_seconds, f"{REDIS_PREFIX}room:{{", max_skips, "}", settings.room_idle_ttl],
+            )
+
+        # 集群模式下房间键在其他节点，脚本内无法检查号码是否被占用，取出后再检查
+        for _ in range(max_skips):
+            number = self._allocate_room_number(keys=keys, args=[lease_seconds, "", 1, "", settings.room_idle_ttl])
+            if number is None or not self.exists_room(number):
+                return number
+            # 号码已被占用，租约续期到房间数据的过期时间（房间删除时归还号池）
+            self.hold_room_number(number)
+        return None
+
+    def hold_room_number(self, room_id: str) -> None:
+        """
+        房间号被房间占用，租约续期到房间数据的过期时间
+        """
+        self._client.zadd(self._get_room_number_leases_key(), {room_id: int(time.time()) + settings.room_idle_ttl}, xx=True)
+
+    def release_room_number(self, room_id: str) -> None:
+        """
+        归还分配后未使用的房间号（只归还有租约的号码）
+        """
+        if not is_pool_room_number(room_id):
+            return
+        pipeline = self._pipeline(transaction=False)
+        self._return_numbers(pipeline, [room_id])
+        pipeline.execute()
+
+    @replica_read
+    def scan_room_ids(self, cursor: int, batch_size: int) -> Tuple[int, List[str]]:
+        """
+        增量遍历房间ID集合（SSCAN，不阻塞Redis）
+
+        Args:
+            cursor: 游标，第一次调用传0
+            batch_size: 每次扫描的数量（COUNT提示值）
+
+        Returns:
+            (下一次的游标, 房间ID列表)，游标为0表示遍历结束
+        """
+        return self._reader.sscan(self._get_room_index_key(), cursor, count=batch_size)
+
+    def iter_room_keys(self, batch_size: int) -> Iterator[List[str]]:
+        """
+        分批扫描房间键（SCAN），用于重建房间ID集合
+
+        Args:
+            batch_size: 每批的数量
+
+        Returns:
+            每批的房间ID列表
+        """
+        prefix = f"{REDIS_PREFIX}room:{{"
+        for keys in self._scan_batches(f"{prefix}*}}", batch_size):
+            # 匹配模式以 } 结尾，不包含users、tasks等房间子键
+            yield [key[len(prefix):-1] for key in keys]
+
+    def migrate_user_room_keys(self, batch_size: int) -> Iterator[int]:
+        """
+        分批迁移旧版的用户->房间映射键（meet:user:{id}:room）到分片Hash，已有新映射的用户保留新映射
+
+        Args:
+            batch_size: 每批的数量
+
+        Returns:
+            每批迁移的数量
+        """
+        prefix, suffix = f"{REDIS_PREFIX}user:", ":room"
+        for keys in self._scan_batches(f"{prefix}*{suffix}", batch_size):
+            room_ids = self._mget(keys)
+            pipeline = self._pipeline(transaction=False)
+            for key, room_id in zip(keys, room_ids):
+                if room_id:
+                    user_id = key[len(prefix):-len(suffix)]
+                    pipeline.hsetnx(self._get_user_room_shard_key(user_id), user_id, room_id)
+            self._delete_keys(pipeline, keys)
+            pipeline.execute()
+            yield len(keys)
+
+    def migrate_untagged_keys(self, batch_size: int) -> Iterator[Tuple[int, int]]:
+        """
+        分批将没有哈希标签的旧版键改名为当前的键名（RENAMENX，仅限单节点）：
+            meet:room:{房间ID}[:子键] -> meet:room:{{房间ID}}[:子键]
+            meet:roomno:* -> meet:{roomno}:*
+            meet:outbox:* -> meet:{outbox}:*
+        新键已存在（升级后的实例已写入）时保留旧键
+
+        Returns:
+            每批的 (改名的数量, 保留的数量)
+        """
+        renames = {
+            f"{REDIS_PREFIX}room:": lambda rest: (
+                self._get_room_key(rest.split(":", 1)[0]) + rest[len(rest.split(":", 1)[0]):]
+            ),
+            f"{REDIS_PREFIX}roomno:": lambda rest: f"{REDIS_PREFIX}{{roomno}}:{rest}",
+            f"{REDIS_PREFIX}outbox:": lambda rest: self._get_outbox_key(rest),
+        }
+        for prefix, new_key in renames.items():
+            for keys in self._scan_batches(f"{prefix}*", batch_size):
+                keys = [key for key in keys if not key[len(prefix):].startswith("{")]
+                if not keys:
+                    continue
+                pipeline = self._pipeline(transaction=False)
+                for key in keys:
+                    pipeline.renamenx(key, new_key(key[len(prefix):]))
+                renamed = sum(1 for result in pipeline.execute() if result)
+                yield renamed, len(keys) - renamed
+
+    def reencode_room_users(self, room_id: str) -> int:
+        """
+        按当前的成员记录编码重新写入房间成员数据
+
+        Returns:
+            重新编码的成员数量
+        """
+        key = self._get_users_key(room_id)
+        users_json = self._client.hgetall(key)
+        changed = {}
+        for user_id, user_json in users_json.items():
+            data = self._encode_member(room_id, user_id, self._decode_member(room_id, user_id, user_json))
+            if data != user_json:
+                changed[user_id] = data
+        if changed:
+            self._client.hset(key, mapping=changed)
+        return len(changed)
+
+    def iter_memory_usage(self, match: str, batch_size: int) -> Iterator[Dict[str, int]]:
+        """
+        分批统计匹配的键占用的内存（SCAN + MEMORY USAGE）
+
+        Returns:
+            每批的 {键: 字节数}
+        """
+        for keys in self._scan_batches(match, batch_size):
+            pipeline = self._pipeline(transaction=False)
+            for key in keys:
+                pipeline.memory_usage(key, samples=0)
+            yield dict(zip(keys, pipeline.execute()))
+
+    def get_encoding(self, key: str) -> Optional[str]:
+        """
+        获取键的内部编码（OBJECT ENCODING）
+        """
+        return self._client.object("encoding", key)
+
+    def get_schema_version(self) -> int:
+        """
+        获取Redis键结构的版本，没有记录时返回1（最初的结构）
+        """
+        return int(self._client.get(f"{REDIS_PREFIX}schema:version") or 1)
+
+    def set_schema_version(self, version: int) -> None:
+        """
+        记录Redis键结构的版本
+        """
+        self._client.set(f"{REDIS_PREFIX}schema:version", version)
+
+    def exists_room_index(self) -> bool:
+        """
+        房间ID集合是否存在
+        """
+        return self._client.exists(self._get_room_index_key()) > 0
+
+    def add_room_index(self, room_ids: List[str]) -> None:
+        """
+        将房间ID加入房间ID集合
+        """
+        if room_ids:
+            self._client.sadd(self._get_room_index_key(), *room_ids)
+
+    def remove_room_index(self, room_ids: List[str]) -> None:
+        """
+        从房间ID集合中移除房间ID（房间数据已过期）
+        """
+        if room_ids:
+            self._client.srem(self._get_room_index_key(), *room_ids)
+
+    @replica_read
+    def get_rooms(self, room_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        批量获取房间信息
+
+        Returns:
+            与room_ids顺序对应的房间数据字典，房间不存在时为None
+        """
+        if not room_ids:
+            return []
+        values = self._mget([self._get_room_key(room_id) for room_id in room_ids])
+        return [json.loads(value) if value else None for value in values]
+
+    @replica_read
+    def get_room_user_counts(self, room_ids: List[str]) -> List[int]:
+        """
+        批量获取房间内用户数量
+        """
+        pipeline = self._read_pipeline(transaction=False)
+        for room_id in room_ids:
+            pipeline.hlen(self._get_users_key(room_id))
+        return pipeline.execute()
 
     def set_user_room(self, user_id: str, room_id: str) -> None:
         """
         设置用户所在的房间（建立映射关系）
+        映射按用户ID分片保存在Hash中（没有单独的过期时间），由离开房间、关闭房间和遗弃房间回收解除
 
         Args:
             user_id: 用户ID
             room_id: 房间ID
         """
-        key = self._get_user_room_key(user_id)
-        self._client.set(key, room_id)
+        self._client.hset(self._get_user_room_shard_key(user_id), user_id, room_id)
 
+    @replica_read
     def get_user_room(self, user_id: str) -> Optional[str]:
         """
         获取用户所在的房间ID
@@ -248,8 +1454,7 @@ class RedisClient:
         Returns:
             房间ID，如果用户不在任何房间则返回None
         """
-        key = self._get_user_room_key(user_id)
-        return self._client.get(key)
+        return self._reader.hget(self._get_user_room_shard_key(user_id), user_id)
 
     def remove_user_room(self, user_id: str) -> None:
         """
@@ -258,8 +1463,365 @@ class RedisClient:
         Args:
             user_id: 用户ID
         """
-        key = self._get_user_room_key(user_id)
-        self._client.delete(key)
+        self._client.hdel(self._get_user_room_shard_key(user_id), user_id)
+
+    def register_cloud_task(self, room_id: str, field: str, task_info: Dict[str, Any], dedupe_seconds: int) -> bool:
+        """
+        登记正在运行的云端任务
+
+        Args:
+            room_id: 房间ID
+            field: 任务标识，格式为 {kind}:{task_id}
+            task_info: 任务信息，需包含 started_at（秒级时间戳）
+            dedupe_seconds: 去重窗口，窗口内重复登记视为重复启动
+
+        Returns:
+            是否登记成功（False表示任务刚刚已启动过）
+        """
+        registered = bool(self._register_cloud_task(
+            keys=self._with_global_keys([self._get_room_tasks_key(room_id)], self._get_task_rooms_key()),
+            args=[field, json.dumps(task_info, ensure_ascii=False), task_info["started_at"], dedupe_seconds, room_id],
+        ))
+        if self._cluster and registered:
+            self._client.sadd(self._get_task_rooms_key(), room_id)
+        return registered
+
+    def unregister_cloud_task(self, room_id: str, field: str) -> None:
+        """
+        注销云端任务
+
+        Args:
+            room_id: 房间ID
+            field: 任务标识，格式为 {kind}:{task_id}
+        """
+        remaining = self._unregister_cloud_task(
+            keys=self._with_global_keys([self._get_room_tasks_key(room_id)], self._get_task_rooms_key()),
+            args=[field, room_id],
+        )
+        if self._cluster and remaining == 0:
+            self._client.srem(self._get_task_rooms_key(), room_id)
+
+    def get_room_cloud_tasks(self, room_id: str) -> Dict[str, Dict[str, Any]]:
+        """
+        获取房间内登记的所有云端任务
+
+        Returns:
+            任务字典，格式为 {field: task_info}
+        """
+        tasks = self._client.hgetall(self._get_room_tasks_key(room_id))
+        return {field: json.loads(info) for field, info in tasks.items()}
+
+    def touch_room(self, room_id: str, ttl_seconds: int, now: int, add: bool = True) -> None:
+        """
+        记录房间活跃：刷新房间相关键的过期时间，更新最近活跃时间
+
+        Args:
+            room_id: 房间ID
+            ttl_seconds: 过期时间，单位秒
+            now: 当前时间戳，单位秒
+            add: 房间不在最近活跃时间集合中时是否添加，为False时只更新已有的房间
+        """
+        pipeline = self._pipeline(transaction=False)
+        for key in self._get_room_data_keys(room_id):
+            pipeline.expire(key, ttl_seconds)
+        pipeline.zadd(self._get_room_activity_key(), {room_id: now}, xx=not add)
+        if is_pool_room_number(room_id):
+            # 房间号的租约与房间数据同时续期，房间过期后号码由分配请求回收
+            pipeline.zadd(self._get_room_number_leases_key(), {room_id: now + ttl_seconds}, xx=True)
+        pipeline.execute()
+
+    def get_idle_room_ids(self, before: int, count: int) -> List[str]:
+        """
+        获取最近活跃时间早于指定时间的房间ID
+
+        Args:
+            before: 时间戳，单位秒
+            count: 最多返回的数量
+        """
+        return self._client.zrangebyscore(self._get_room_activity_key(), "-inf", before, start=0, num=count)
+
+    def defer_room_activity(self, room_ids: List[str], now: int) -> None:
+        """
+        更新房间的最近活跃时间，不刷新房间数据的过期时间（回收时发现仍有成员在线的房间）
+
+        Args:
+            room_ids: 房间ID列表
+            now: 当前时间戳，单位秒
+        """
+        if room_ids:
+            self._client.zadd(self._get_room_activity_key(), {room_id: now for room_id in room_ids}, xx=True)
+
+    def remove_room_activity(self, room_ids: List[str]) -> None:
+        """
+        从最近活跃时间集合中移除房间
+        """
+        if room_ids:
+            self._client.zrem(self._get_room_activity_key(), *room_ids)
+
+    def purge_rooms(self, room_ids: List[str]) -> Dict[str, List[str]]:
+        """
+        批量删除房间数据，并解除仍指向这些房间的用户->房间映射
+
+        Args:
+            room_ids: 房间ID列表
+
+        Returns:
+            {房间ID: 房间内的用户ID列表}
+        """
+        if not room_ids:
+            return {}
+        pipeline = self._pipeline(transaction=False)
+        for room_id in room_ids:
+            pipeline.hkeys(self._get_users_key(room_id))
+        room_users = dict(zip(room_ids, pipeline.execute()))
+
+        self._remove_user_rooms([(room_id, user_id) for room_id, user_ids in room_users.items() for user_id in user_ids])
+
+        pipeline = self._pipeline(transaction=False)
+        for room_id in room_ids:
+            self._delete_keys(pipeline, self._get_room_data_keys(room_id))
+        self._remove_room_indexes(pipeline, room_ids)
+        self._notify_room_changes(room_ids, pipeline)
+        pipeline.execute()
+        return room_users
+
+    def _remove_user_rooms(self, mappings: List[Tuple[str, str]]) -> None:
+        """
+        解除用户->房间映射；用户可能已经加入了其它房间，只解除仍指向本房间的映射
+
+        Args:
+            mappings: [(房间ID, 用户ID), ...]
+        """
+        if not mappings:
+            return
+        pipeline = self._pipeline(transaction=False)
+        for _, user_id in mappings:
+            pipeline.hget(self._get_user_room_shard_key(user_id), user_id)
+        current_rooms = pipeline.execute()
+
+        pipeline = self._pipeline(transaction=False)
+        for (room_id, user_id), current_room in zip(mappings, current_rooms):
+            if current_room == room_id:
+                pipeline.hdel(self._get_user_room_shard_key(user_id), user_id)
+        pipeline.execute()
+
+    def update_presence(self, room_id: str, user_ids: List[str], now_ms: Optional[int]) -> int:
+        """
+        记录或移除用户的在线状态
+
+        Args:
+            room_id: 房间ID
+            user_ids: 用户ID列表
+            now_ms: 最近在线时间戳（毫秒），None表示移除这些用户
+
+        Returns:
+            房间内是否还有在线用户（0/1）
+        """
+        oldest = self._update_presence(
+            keys=self._with_global_keys([self._get_presence_key(room_id)], self._get_presence_index_key()),
+            args=[room_id, "" if now_ms is None else now_ms, *user_ids],
+        )
+        self._sync_presence_index(room_id, oldest)
+        return int(oldest is not None)
+
+    def _sync_presence_index(self, room_id: str, oldest: Optional[str]) -> None:
+        """集群模式下在脚本之外更新全局的在线状态索引（单节点模式已在脚本中更新）"""
+        if self._cluster:
+            if oldest is None:
+                self._client.zrem(self._get_presence_index_key(), room_id)
+            else:
+                self._client.zadd(self._get_presence_index_key(), {room_id: oldest})
+
+    def get_presence_expired_rooms(self, before_ms: int, count: int) -> List[str]:
+        """
+        获取有用户最近在线时间早于指定时间的房间ID
+
+        Args:
+            before_ms: 时间戳，单位毫秒
+            count: 最多返回的数量
+        """
+        return self._client.zrangebyscore(self._get_presence_index_key(), "-inf", before_ms, start=0, num=count)
+
+    def get_presence_times(self, room_id: str, user_ids: List[str]) -> List[Optional[int]]:
+        """
+        获取用户的最近在线时间
+
+        Returns:
+            与user_ids顺序对应的最近在线时间戳（毫秒），没有在线记录时为None
+        """
+        if not user_ids:
+            return []
+        return [None if score is None else int(score) for score in self._client.zmscore(self._get_presence_key(room_id), user_ids)]
+
+    def pop_presence_expired_users(self, room_id: str, before_ms: int, count: int) -> List[str]:
+        """
+        取出并移除房间内最近在线时间早于指定时间的用户（原子操作，多个实例同时检测时每个用户只会被一个实例取出）
+
+        Args:
+            room_id: 房间ID
+            before_ms: 时间戳，单位毫秒
+            count: 最多取出的数量
+
+        Returns:
+            本次取出的用户ID列表
+        """
+        user_ids, oldest = self._pop_expired_presence(
+            keys=self._with_global_keys([self._get_presence_key(room_id)], self._get_presence_index_key()),
+            args=[room_id, before_ms, count],
+        )
+        self._sync_presence_index(room_id, oldest)
+        return user_ids
+
+    def iter_cloud_task_room_ids(self, batch_size: int = 100):
+        """
+        遍历所有登记了云端任务的房间ID（SSCAN，不阻塞Redis）
+
+        Args:
+            batch_size: 每次扫描的数量
+        """
+        return self._client.sscan_iter(self._get_task_rooms_key(), count=batch_size)
+
+    def set_agent_session(self, room_id: str, fields: Dict[str, Any], ttl_seconds: int) -> None:
+        """
+        保存/更新房间AI智能体会话信息
+
+        Args:
+            room_id: 房间ID
+            fields: 会话字段
+            ttl_seconds: 过期时间，单位秒
+        """
+        key = self._get_room_agent_key(room_id)
+        pipeline = self._pipeline()
+        pipeline.hset(key, mapping=fields)
+        pipeline.expire(key, ttl_seconds)
+        pipeline.execute()
+
+    def get_agent_session(self, room_id: str) -> Dict[str, str]:
+        """
+        获取房间AI智能体会话信息
+
+        Returns:
+            会话字段，不存在时返回空字典
+        """
+        return self._client.hgetall(self._get_room_agent_key(room_id))
+
+    def delete_agent_session(self, room_id: str) -> None:
+        """
+        删除房间AI智能体会话信息
+        """
+        self._client.delete(self._get_room_agent_key(room_id))
+
+    def acquire_rate_token(self, name: str, rate: float, burst: float) -> float:
+        """
+        从共享令牌桶中获取一个令牌（多个worker进程共享同一个桶）
+
+        Args:
+            name: 令牌桶名称（通常为OpenAPI的Action）
+            rate: 每秒补充的令牌数
+            burst: 桶容量
+
+        Returns:
+            需要等待的秒数，0表示已获取令牌
+        """
+        key = self._get_rate_limit_key(name)
+        return float(self._token_bucket(keys=[key], args=[rate, burst]))
+
+    def ensure_outbox_group(self, name: str, group: str) -> None:
+        """
+        创建出站消息流的消费组（流不存在时自动创建，消费组已存在时忽略）
+
+        Args:
+            name: 消息流名称
+            group: 消费组名称
+        """
+        try:
+            self._client.xgroup_create(self._get_outbox_key(name), group, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def add_outbox_message(self, name: str, fields: Dict[str, Any], maxlen: Optional[int] = None) -> str:
+        """
+        写入一条出站消息
+
+        Args:
+            name: 消息流名称
+            fields: 消息字段
+            maxlen: 消息流的近似最大长度（用于死信流等只写不消费的流）
+
+        Returns:
+            消息ID
+        """
+        key = self._get_outbox_key(name)
+        return self._client.xadd(key, fields, maxlen=maxlen, approximate=True)
+
+    def read_outbox_messages(
+            self, names: List[str],
+            group: str,
+            consumer: str,
+            count: int,
+            block_ms: Optional[int] = None
+            ) -> List[Tuple[str, str, Dict[str, str]]]:
+        """
+        以消费组方式从一个或多个消息流读取新的出站消息
+
+        Args:
+            names: 消息流名称列表
+            group: 消费组名称
+            consumer: 消费者名称
+            count: 每个消息流最多读取的消息数量
+            block_ms: 无消息时阻塞等待的时长，None表示不阻塞
+
+        Returns:
+            [(消息流名称, 消息ID, 消息字段), ...]
+        """
+        streams = {self._get_outbox_key(name): ">" for name in names}
+        result = self._client.xreadgroup(group, consumer, streams, count=count, block=block_ms)
+        prefix_len = len(self._get_outbox_key(""))
+        return [
+            (key[prefix_len:], entry_id, fields)
+            for key, entries in (result or [])
+            for entry_id, fields in entries
+        ]
+
+    def claim_outbox_messages(
+            self, name: str,
+            group: str,
+            consumer: str,
+            min_idle_ms: int,
+            count: int
+            ) -> List[Tuple[str, Dict[str, str]]]:
+        """
+        认领超时未确认的出站消息（投递失败或消费者崩溃后重新投递）
+
+        Returns:
+            [(消息ID, 消息字段), ...]
+        """
+        key = self._get_outbox_key(name)
+        result = self._client.xautoclaim(key, group, consumer, min_idle_ms, start_id="0-0", count=count)
+        # 已被删除的消息会返回None字段，直接跳过
+        return [(entry_id, fields) for entry_id, fields in result[1] if fields]
+
+    def get_outbox_delivery_count(self, name: str, group: str, entry_id: str) -> int:
+        """
+        获取出站消息的已投递次数
+
+        Returns:
+            投递次数，消息不在待确认列表中时返回0
+        """
+        key = self._get_outbox_key(name)
+        pending = self._client.xpending_range(key, group, min=entry_id, max=entry_id, count=1)
+        return pending[0]["times_delivered"] if pending else 0
+
+    def ack_outbox_message(self, name: str, group: str, entry_id: str) -> None:
+        """
+        确认并删除已处理的出站消息
+        """
+        key = self._get_outbox_key(name)
+        pipeline = self._pipeline()
+        pipeline.xack(key, group, entry_id)
+        pipeline.xdel(key, entry_id)
+        pipeline.execute()
 
     def ping(self) -> bool:
         """
@@ -273,9 +1835,57 @@ class RedisClient:
         except Exception:
             return False
 
+    @contextmanager
+    def replica_reads(self):
+        """
+        范围内可以容忍短暂延迟的读操作（@replica_read）路由到复制延迟在 redis_replica_max_lag_ms 以内的副本，
+        同一范围内使用同一个副本（SSCAN的游标在不同节点间不通用），没有可用的副本时读取主节点；写操作始终在主节点
+        """
+        token = _read_node.set(self._pick_replica())
+        try:
+            yield
+        finally:
+            _read_node.reset(token)
+
+    def in_replica_reads(self) -> bool:
+        """当前是否在 replica_reads() 中且选定了副本（读到的数据可能落后）"""
+        node = _read_node.get()
+        return node is not None and node is not self._primary
+
+    def _pick_replica(self) -> RedisReadNode:
+        """轮流选择可用的副本；检测结果过期（检测任务停止或阻塞）的副本视为不可用"""
+        now = time.monotonic()
+        stale_after = settings.redis_replica_check_interval * 3
+        nodes = [node for node in self.replicas if node.healthy and now - node.checked_at <= stale_after]
+        if not nodes:
+            return self._primary
+        self._replica_turn += 1
+        return nodes[self._replica_turn % len(nodes)]
+
+    def check_replicas(self) -> None:
+        """
+        检测副本的复制延迟：在主节点写入本进程的心跳时间戳后从各副本读回，
+        复制延迟不超过 当前时间 - 副本上的时间戳（副本已同步本次心跳时接近0，否则至多多算一个检测周期）
+        """
+        if not self.replicas:
+            return
+        key = f"{REDIS_PREFIX}replica:heartbeat:{socket.gethostname()}:{os.getpid()}"
+        self._client.set(key, int(time.time() * 1000), ex=60)
+        for node in self.replicas:
+            try:
+                value = node.client.get(key)
+                node.lag_ms = max(0, int(time.time() * 1000) - int(value)) if value else None
+            except redis.RedisError as e:
+                logger.warning(f"检测Redis副本失败: {node.name}, {e}")
+                node.lag_ms = None
+            node.checked_at = time.monotonic()
+            node.healthy = node.lag_ms is not None and node.lag_ms <= settings.redis_replica_max_lag_ms
+
     def close(self) -> None:
         """关闭Redis连接"""
         self._client.close()
+        for node in self.replicas:
+            node.client.close()
 
 
 # 创建全局Redis客户端实例
@@ -0,0 +1,55 @@
+'''
+Redis副本复制延迟检测
+定期在主节点写入心跳时间戳并从各副本读回，估算复制延迟；
+延迟超过 redis_replica_max_lag_ms、连接失败或检测结果过期的副本不再路由读请求（见 RedisClient.replica_reads）
+'''
+import asyncio
+import logging
+from redis_client import redis_client
+from metrics import metrics
+from config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicaMonitor:
+    """Redis副本复制延迟检测"""
+
+    def __init__(self):
+        self._task: asyncio.Task = None
+
+    # 执行一轮检测，返回可用的副本数量
+    async def check_once(self) -> int:
+        healthy = {node.name: node.healthy for node in redis_client.replicas}
+        redis_client.check_replicas()
+        for node in redis_client.replicas:
+            if node.healthy != healthy[node.name]:
+                logger.warning(f"Redis副本{'恢复可用' if node.healthy else '不可用'}: {node.name}, 复制延迟{node.lag_ms}ms")
+            metrics.set("redis_replica_lag_ms", -1 if node.lag_ms is None else node.lag_ms, replica=node.name)
+            metrics.set("redis_replica_healthy", int(node.healthy), replica=node.name)
+        return sum(1 for node in redis_client.replicas if node.healthy)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.check_once()
+            except Exception as e:
+                logger.error(f"Redis副本检测失败: {e}")
+            await asyncio.sleep(settings.redis_replica_check_interval)
+
+    # 启动副本检测（配置了副本时）
+    async def start(self) -> None:
+        if redis_client.replicas and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    # 停止副本检测
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# 创建副本检测实例
+replica_monitor = ReplicaMonitor()
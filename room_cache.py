@@ -0,0 +1,153 @@
+'''
+房间近端缓存
+每个实例在内存中缓存最近访问的房间状态和成员（房间数据、成员记录、版本号），
+获取成员列表、检查房间和成员、用户列表快照的版本校验等只读操作命中缓存时不访问Redis；
+读取-修改-写入的操作（修改成员状态等）仍然读取Redis，不会基于缓存覆盖其他实例的修改
+
+一致性：
+    - RedisClient 每次修改房间时通知本进程的缓存，并在同一个pipeline/脚本中发布房间变更通知（meet:rooms:changed），
+      各实例订阅通知后删除对应的缓存
+    - 订阅断开期间的通知会丢失：断开时停止使用缓存（直接读取Redis），重新订阅后清空缓存
+    - 每个房间最多缓存 room_cache_ttl 秒，兜底房间过期等没有通知的变化
+    - 从只读副本读到的数据可能落后于已经收到的通知，不写入缓存
+缓存的房间数超过 room_cache_max_rooms 时按LRU淘汰
+'''
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+from redis_client import redis_client
+from metrics import metrics
+from schemas import HUMAN_USER_ID_LENGTH
+from config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class CachedRoom:
+    """缓存的房间数据，读取方不能修改其中的字典"""
+    __slots__ = ("room_data", "users", "version", "expires_at")
+
+    def __init__(self, room_data: Dict[str, Any], users: Dict[str, Dict[str, Any]], version: int):
+        self.room_data = room_data
+        self.users = users
+        self.version = version
+        self.expires_at = time.monotonic() + settings.room_cache_ttl
+
+    # 房间内的真人用户ID
+    @property
+    def human_ids(self) -> List[str]:
+        return [user_id for user_id in self.users if len(user_id) == HUMAN_USER_ID_LENGTH]
+
+    # 房间内的设备ID
+    @property
+    def device_ids(self) -> List[str]:
+        return [user_id for user_id in self.users if len(user_id) != HUMAN_USER_ID_LENGTH]
+
+
+class RoomCache:
+    """房间近端缓存，通过Redis发布订阅失效"""
+
+    def __init__(self):
+        self._rooms: OrderedDict[str, CachedRoom] = OrderedDict()
+        self._pubsub = None
+        self._task: asyncio.Task = None
+        self._hits = 0
+        self._lookups = 0
+        # 本进程的修改同步删除缓存，不等待发布订阅的通知
+        redis_client.add_room_change_listener(self.invalidate)
+
+    # 是否可以使用缓存（已开启且订阅正常）
+    @property
+    def enabled(self) -> bool:
+        return self._pubsub is not None
+
+    def _count(self, hit: bool) -> None:
+        self._lookups += 1
+        self._hits += hit
+        metrics.inc("room_cache_total", result="hit" if hit else "miss")
+        metrics.set("room_cache_hit_ratio", round(self._hits / self._lookups, 4))
+
+    # 获取已缓存的房间，不加载
+    def peek(self, room_id: str) -> Optional[CachedRoom]:
+        if not self.enabled:
+            return None
+        room = self._rooms.get(room_id)
+        if room is not None and room.expires_at <= time.monotonic():
+            self._rooms.pop(room_id)
+            room = None
+        if room is not None:
+            self._rooms.move_to_end(room_id)
+        self._count(room is not None)
+        return room
+
+    # 获取房间，未缓存时用load从Redis加载并缓存；房间不存在时返回None
+    def get(self, room_id: str, load: Callable[[str], Optional[CachedRoom]]) -> Optional[CachedRoom]:
+        room = self.peek(room_id)
+        if room is not None:
+            return room
+        room = load(room_id)
+        if room is None or not self.enabled or redis_client.in_replica_reads():
+            return room
+
+        self._rooms[room_id] = room
+        while len(self._rooms) > settings.room_cache_max_rooms:
+            self._rooms.popitem(last=False)
+            metrics.inc("room_cache_evictions_total")
+        metrics.set("room_cache_rooms", len(self._rooms))
+        return room
+
+    # 删除房间的缓存
+    def invalidate(self, room_ids: List[str]) -> None:
+        for room_id in room_ids:
+            if self._rooms.pop(room_id, None) is not None:
+                metrics.inc("room_cache_invalidations_total")
+        metrics.set("room_cache_rooms", len(self._rooms))
+
+    # 清空缓存并停止使用，直到重新订阅
+    def _reset(self) -> None:
+        if self._pubsub is not None:
+            try:
+                self._pubsub.close()
+            except Exception:
+                pass
+            self._pubsub = None
+        self._rooms.clear()
+        metrics.set("room_cache_rooms", 0)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if self._pubsub is None:
+                    # 订阅之前的通知已经丢失，从空缓存开始
+                    self._rooms.clear()
+                    self._pubsub = redis_client.subscribe_room_changes()
+                room_ids = await asyncio.to_thread(redis_client.wait_messages, self._pubsub, 1.0)
+                if room_ids:
+                    self.invalidate(room_ids)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"房间变更订阅中断，暂停使用房间缓存: {e}")
+                metrics.inc("room_cache_resets_total")
+                self._reset()
+                await asyncio.sleep(1)
+
+    # 启动变更订阅（开启近端缓存时）
+    async def start(self) -> None:
+        if settings.room_cache_enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    # 停止变更订阅并清空缓存
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._reset()
+
+
+# 创建房间近端缓存实例
+room_cache = RoomCache()
@@ -0,0 +1,129 @@
+'''
+房间号分配
+空闲的6位房间号预先打乱顺序后保存在Redis列表中（meet:roomno:pool），分配时由Lua脚本原子地取出一个号码，
+不再随机生成后逐个检查是否冲突（房间越多冲突越多，请求次数越不可控）
+
+分配出的号码登记租约（meet:{roomno}:leases），创建房间后租约随房间数据的过期时间续期；
+room_number_lease_seconds 内没有创建房间的号码、以及房间数据已过期（预定后未使用的会议等）的号码，
+租约到期后由后续的分配请求回收到号池。
+房间删除（取消/结束/回收）时删除租约并归还号码；没有租约的号码（客户端指定的房间ID）不会放入号池，
+号池中不会出现重复的号码
+'''
+import random
+import logging
+from typing import Optional, Set
+import redis_client as redis_module
+from redis_client import redis_client
+from rts_service import rtsService
+from metrics import metrics
+from config import settings
+
+
+logger = logging.getLogger(__name__)
+
+# 初始化号池的锁名
+POOL_INIT_LOCK = "roomno:init"
+
+
+class RoomNumberAllocator:
+    """房间号分配器"""
+
+    # 号池不存在时初始化（排除已被占用的房间号），返回号池中的号码数量；其他实例正在初始化时返回0
+    async def ensure_pool(self, force: bool = False) -> int:
+        if not force and redis_client.is_room_number_pool_ready():
+            return 0
+        if not redis_client.acquire_lock(POOL_INIT_LOCK, 60):
+            return 0
+        try:
+            in_use: Set[str] = set()
+            async for room_ids in rtsService.iter_room_ids():
+                in_use.update(room_ids)
+            numbers = [
+                number for number in map(str, range(redis_module.ROOM_NUMBER_MIN, redis_module.ROOM_NUMBER_MAX + 1))
+                if number not in in_use
+            ]
+            random.shuffle(numbers)
+            held = [room_id for room_id in in_use if redis_module.is_pool_room_number(room_id)]
+            redis_client.init_room_number_pool(numbers, held, settings.room_idle_ttl)
+            logger.info(f"初始化房间号池: 空闲{len(numbers)}个, 已占用{len(in_use)}个")
+            return len(numbers)
+        finally:
+            redis_client.release_lock(POOL_INIT_LOCK)
+
+    # 分配一个空闲的房间号，号池已耗尽时返回None
+    async def allocate(self) -> Optional[str]:
+        room_id = redis_client.pop_room_number(settings.room_number_lease_seconds)
+        if room_id is None and not redis_client.is_room_number_pool_ready():
+            # 号池尚未初始化（或已被清除）
+            await self.ensure_pool()
+            room_id = redis_client.pop_room_number(settings.room_number_lease_seconds)
+        metrics.inc("room_number_allocate_total", result="ok" if room_id else "exhausted")
+        return room_id
+
+    # 归还分配后未使用的房间号
+    def release(self, room_id: str) -> None:
+        redis_client.release_room_number(room_id)
+
+
+# 创建房间号分配器实例
+room_number_allocator = RoomNumberAllocator()
+
+
+# 不同占用率下分配一个房间号的Redis请求次数和耗时：原先的随机生成+逐个检查 vs 号池
+# 使用独立的键前缀和缩小的号码范围，不影响线上数据
+if __name__ == "__main__":
+    import time
+    import asyncio
+
+    redis_module.REDIS_PREFIX = "bench:"
+    redis_module.ROOM_NUMBER_MIN, redis_module.ROOM_NUMBER_MAX = 100000, 109999
+    total = redis_module.ROOM_NUMBER_MAX - redis_module.ROOM_NUMBER_MIN + 1
+    allocations = 200
+
+    def clear():
+        keys = list(redis_client._client.scan_iter("bench:*", count=1000))
+        for i in range(0, len(keys), 1000):
+            redis_client._client.delete(*keys[i:i + 1000])
+
+    def occupy(occupancy: float):
+        numbers = random.sample(range(redis_module.ROOM_NUMBER_MIN, redis_module.ROOM_NUMBER_MAX + 1), int(total * occupancy))
+        pipeline = redis_client._client.pipeline(transaction=False)
+        for number in numbers:
+            pipeline.set(redis_client._get_room_key(str(number)), "{}")
+            pipeline.sadd("bench:rooms", number)
+        pipeline.execute()
+
+    # 原实现：随机生成后检查是否存在，最多尝试100次
+    def random_allocate():
+        for attempt in range(1, 101):
+            room_id = str(random.randint(redis_module.ROOM_NUMBER_MIN, redis_module.ROOM_NUMBER_MAX))
+            if not redis_client.exists_room(room_id):
+                return room_id, attempt
+        return None, 100
+
+    async def bench():
+        for occupancy in (0.1, 0.5, 0.9):
+            clear()
+            occupy(occupancy)
+            round_trips, worst, failed = 0, 0, 0
+            started = time.perf_counter()
+            for _ in range(allocations):
+                room_id, attempts = random_allocate()
+                round_trips += attempts
+                worst = max(worst, attempts)
+                failed += room_id is None
+            random_ms = (time.perf_counter() - started) * 1000 / allocations
+            print(f"占用率{occupancy:.0%} 随机+检查: 平均{round_trips / allocations:.2f}次请求, "
+                  f"最多{worst}次, 失败{failed}次, {random_ms:.3f}ms/次")
+
+            await room_number_allocator.ensure_pool(force=True)
+            started = time.perf_counter()
+            for _ in range(allocations):
+                room_id = await room_number_allocator.allocate()
+                assert room_id and not redis_client.exists_room(room_id)
+                room_number_allocator.release(room_id)
+            pool_ms = (time.perf_counter() - started) * 1000 / allocations
+            print(f"占用率{occupancy:.0%} 号池: 平均1.00次请求, {pool_ms:.3f}ms/次（含归还）")
+        clear()
+
+    asyncio.run(bench())
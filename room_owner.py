@@ -0,0 +1,200 @@
+'''
+房间归属
+多实例部署时每个房间的事件由固定的实例处理：
+    - 成员：各实例定期在 meet:instances 中续约在线租约，并读取在线的实例列表
+    - 归属：在线实例上的rendezvous哈希（房间ID与实例ID的哈希值最大的实例），实例上下线时只有该实例的房间改变归属
+    - 转发：非归属实例收到的RTS消息和回调通过Redis发布订阅转发给归属实例（meet:instance:{实例ID}），
+      归属实例按到达顺序处理同一房间的事件；归属实例不在线（没有订阅者）时由收到事件的实例直接处理
+    - 租约：归属实例处理房间事件时获取房间的归属租约（meet:room:{房间ID}:owner），并随心跳续约；
+      各实例的在线列表可能短暂不一致，只有持有租约的实例可以在内存中保存房间的状态（is_owner）
+房间数据仍以Redis为准，非归属实例处理事件（转发失败、实例列表不一致）时结果仍然正确
+'''
+import os
+import json
+import time
+import socket
+import asyncio
+import hashlib
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+from redis_client import redis_client
+from metrics import metrics
+from config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+# 房间ID在实例上的rendezvous哈希值
+def _rendezvous_weight(instance_id: str, room_id: str) -> bytes:
+    return hashlib.blake2b(f"{instance_id}:{room_id}".encode(), digest_size=8).digest()
+
+
+class RoomOwnership:
+    """房间归属与事件转发"""
+
+    def __init__(self):
+        self.instance_id = f"{socket.gethostname()}-{os.getpid()}"
+        # 在线的实例（最近一次心跳读取）
+        self._instances: List[str] = []
+        # 持有归属租约的房间 -> 租约到期时间（time.monotonic）
+        self._leases: Dict[str, float] = {}
+        # 房间最近一次处理事件的时间（time.monotonic），长时间没有事件的房间不再续约
+        self._active: Dict[str, float] = {}
+        # 转发事件的处理程序：类型 -> 处理程序（参数为事件内容）
+        self._handlers: Dict[str, Callable[[str], Awaitable[None]]] = {}
+        # 每个房间最后一个正在处理的转发事件，同一房间的事件按到达顺序处理
+        self._room_tasks: Dict[str, asyncio.Task] = {}
+        self._pubsub = None
+        self._tasks: List[asyncio.Task] = []
+
+    # 是否已开启
+    @property
+    def enabled(self) -> bool:
+        return bool(self._tasks)
+
+    # 注册转发事件的处理程序
+    def register_handler(self, kind: str, handler: Callable[[str], Awaitable[None]]) -> None:
+        self._handlers[kind] = handler
+
+    # 房间的归属实例
+    def owner_of(self, room_id: str) -> str:
+        instances = self._instances or [self.instance_id]
+        return max(instances, key=lambda instance_id: _rendezvous_weight(instance_id, room_id))
+
+    # 本实例是否持有房间的归属租约（持有时可以在内存中保存房间的状态）；房间归属本实例时获取租约
+    async def is_owner(self, room_id: str) -> bool:
+        if not self.enabled:
+            return False
+        now = time.monotonic()
+        self._active[room_id] = now
+        if self._leases.get(room_id, 0) > now:
+            return True
+        if self.owner_of(room_id) != self.instance_id:
+            return False
+        owner = redis_client.claim_rooms([room_id], self.instance_id, int(settings.instance_lease_seconds * 1000))[0]
+        if owner != self.instance_id:
+            return False
+        self._leases[room_id] = now + settings.instance_lease_seconds
+        return True
+
+    # 房间归属其他实例时转发事件并返回True；由本实例处理（未开启、归属本实例、归属实例不在线）时返回False
+    async def route(self, kind: str, room_id: Optional[str], payload: str) -> bool:
+        if not self.enabled or not room_id:
+            return False
+        owner = self.owner_of(room_id)
+        if owner == self.instance_id:
+            await self.is_owner(room_id)
+            metrics.inc("room_events_total", route="local")
+            return False
+
+        data = json.dumps({"kind": kind, "room_id": room_id, "payload": payload}, ensure_ascii=False)
+        if redis_client.publish_instance_message(owner, data) > 0:
+            metrics.inc("room_events_total", route="forwarded")
+            return True
+        # 归属实例已下线（没有订阅），下次心跳前不再转发给它
+        logger.warning(f"房间的归属实例不在线，由本实例处理: {room_id}, {owner}")
+        self._instances = [instance_id for instance_id in self._instances if instance_id != owner]
+        metrics.inc("room_events_total", route="fallback")
+        return False
+
+    # 续约实例和房间的租约，释放归属已经变化或长时间没有事件的房间
+    def heartbeat(self) -> None:
+        lease_ms = int(settings.instance_lease_seconds * 1000)
+        instances = redis_client.heartbeat_instance(self.instance_id, lease_ms)
+        if set(instances) != set(self._instances):
+            logger.info(f"在线实例变化: {instances}")
+        self._instances = instances
+        metrics.set("room_owner_instances", len(instances))
+
+        now = time.monotonic()
+        idle_before = now - settings.instance_lease_seconds
+        self._active = {room_id: t for room_id, t in self._active.items() if t > idle_before}
+        renew = [room_id for room_id in self._leases if room_id in self._active and self.owner_of(room_id) == self.instance_id]
+        redis_client.release_rooms([room_id for room_id in self._leases if room_id not in renew], self.instance_id)
+        owners = redis_client.claim_rooms(renew, self.instance_id, lease_ms)
+        expires_at = now + settings.instance_lease_seconds
+        self._leases = {room_id: expires_at for room_id, owner in zip(renew, owners) if owner == self.instance_id}
+        metrics.set("room_owner_rooms", len(self._leases))
+
+    async def _run_heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(settings.instance_heartbeat_interval)
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logger.error(f"实例心跳失败: {e}")
+
+    # 处理转发来的事件：等待同一房间之前的事件处理完成
+    async def _handle(self, message: Dict, previous: Optional[asyncio.Task]) -> None:
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        handler = self._handlers.get(message["kind"])
+        if handler is None:
+            logger.warning(f"收到未知类型的转发事件: {message['kind']}")
+            return
+        await self.is_owner(message["room_id"])
+        try:
+            await handler(message["payload"])
+        except Exception as e:
+            logger.error(f"处理转发的事件失败: {message['room_id']}, {e}")
+
+    def _dispatch(self, data: str) -> None:
+        message = json.loads(data)
+        room_id = message["room_id"]
+        task = asyncio.create_task(self._handle(message, self._room_tasks.get(room_id)))
+        self._room_tasks[room_id] = task
+        task.add_done_callback(lambda t: self._room_tasks.pop(room_id) if self._room_tasks.get(room_id) is t else None)
+        metrics.inc("room_events_total", route="received")
+
+    async def _run_receiver(self) -> None:
+        while True:
+            try:
+                if self._pubsub is None:
+                    self._pubsub = redis_client.subscribe_instance_messages(self.instance_id)
+                for data in await asyncio.to_thread(redis_client.wait_messages, self._pubsub, 1.0, True):
+                    self._dispatch(data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"接收转发的事件失败: {e}")
+                self._close_pubsub()
+                await asyncio.sleep(1)
+
+    def _close_pubsub(self) -> None:
+        if self._pubsub is not None:
+            try:
+                self._pubsub.close()
+            except Exception:
+                pass
+            self._pubsub = None
+
+    # 启动房间归属：先订阅转发频道再加入在线实例，其他实例转发来的事件不会丢失
+    async def start(self) -> None:
+        if not settings.room_owner_enabled or self._tasks:
+            return
+        self._pubsub = redis_client.subscribe_instance_messages(self.instance_id)
+        self.heartbeat()
+        self._tasks = [asyncio.create_task(self._run_receiver()), asyncio.create_task(self._run_heartbeat())]
+
+    # 停止房间归属：退出在线实例并释放租约，其他实例立即接管
+    async def stop(self) -> None:
+        if not self._tasks:
+            return
+        try:
+            redis_client.remove_instance(self.instance_id)
+            redis_client.release_rooms(list(self._leases), self.instance_id)
+        except Exception as e:
+            logger.error(f"释放房间归属失败: {e}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # 处理完已经收到的转发事件
+        await asyncio.gather(*self._room_tasks.values(), return_exceptions=True)
+        self._close_pubsub()
+        self._leases.clear()
+
+
+# 创建房间归属实例
+room_ownership = RoomOwnership()
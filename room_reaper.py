@@ -0,0 +1,113 @@
+'''
+遗弃房间回收
+房间数据设置了滑动过期时间（RTS消息、心跳和RTC回调都会刷新），回收器定期按最近活跃时间分批检查长时间没有活跃的房间：
+    - 有成员但成员都已离开的房间（真人用户的在线记录已过期、进程在关闭房间途中崩溃等）：关闭房间并停止云端任务
+    - 仍有成员在线的房间（安静的会议、只有设备的房间）：推迟检查，不刷新数据的过期时间。
+      设备不发送RTS消息，只能通过RTC离开回调移出房间，有设备的房间不会被关闭；
+      离开回调丢失时房间数据最终过期，按下一种情况清理
+    - 房间数据已过期：清理残留的用户映射，停止云端任务
+    - 没有成员的房间（预定的会议）：不做处理，由过期时间清理
+'''
+import asyncio
+import logging
+from typing import List
+from redis_client import redis_client
+from vertc_client import ban_room
+from cloud_tasks import stop_room_tasks
+from rts_inform import finish_room_infom
+from room_snapshot import room_snapshot_cache
+from metrics import metrics
+from utils import current_timestamp_s
+from config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class RoomReaper:
+    """遗弃房间回收器"""
+
+    def __init__(self):
+        self._task: asyncio.Task = None
+
+    # 执行一轮回收，返回关闭的房间数量
+    async def reap_once(self) -> int:
+        before = current_timestamp_s() - settings.room_reap_idle_seconds
+        batch_size = max(1, settings.room_reap_batch_size)
+        reaped = 0
+        while True:
+            room_ids = redis_client.get_idle_room_ids(before, batch_size)
+            if not room_ids:
+                break
+
+            stale_rooms: List[str] = []
+            empty_rooms: List[str] = []
+            live_rooms: List[str] = []
+            for room_id in room_ids:
+                member_ids = redis_client.get_room_member_ids(room_id)
+                if member_ids is not None and not any(member_ids):
+                    empty_rooms.append(room_id)
+                elif member_ids is not None and self._has_present_members(room_id, *member_ids, before):
+                    live_rooms.append(room_id)
+                else:
+                    stale_rooms.append(room_id)
+
+            redis_client.remove_room_activity(empty_rooms)
+            redis_client.defer_room_activity(live_rooms, current_timestamp_s())
+            if live_rooms:
+                metrics.inc("room_reap_deferred_total", len(live_rooms))
+            room_users = redis_client.purge_rooms(stale_rooms)
+            for room_id in stale_rooms:
+                await self._finish_room(room_id, len(room_users.get(room_id) or []))
+            reaped += len(stale_rooms)
+
+            if len(room_ids) < batch_size:
+                break
+
+        if reaped:
+            logger.warning(f"回收遗弃的房间: {reaped}个")
+            metrics.inc("room_reaped_total", reaped)
+        return reaped
+
+    # 房间内是否还有成员在线：有设备（只能通过RTC离开回调确认离开），或真人用户在 before 之后还在线
+    def _has_present_members(self, room_id: str, human_ids: List[str], device_ids: List[str], before: int) -> bool:
+        if device_ids:
+            return True
+        before_ms = before * 1000
+        return any(t is not None and t > before_ms for t in redis_client.get_presence_times(room_id, human_ids))
+
+    # 通知残留成员并解散房间，停止房间内的云端任务
+    async def _finish_room(self, room_id: str, user_count: int) -> None:
+        room_snapshot_cache.invalidate(room_id)
+        try:
+            if user_count:
+                logger.debug(f"关闭遗弃的房间：{room_id}, 残留成员{user_count}个")
+                await finish_room_infom(settings.rtc_app_id, room_id)
+                await ban_room(room_id)
+            await stop_room_tasks(room_id)
+        except Exception as e:
+            logger.error(f"关闭遗弃的房间失败: {room_id}, {str(e)}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.room_reap_interval)
+            try:
+                await self.reap_once()
+            except Exception as e:
+                logger.error(f"遗弃房间回收失败: {e}")
+
+    # 启动周期回收
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    # 停止周期回收
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# 创建遗弃房间回收器实例
+room_reaper = RoomReaper()
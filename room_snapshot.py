@@ -0,0 +1,112 @@
+'''
+房间快照缓存
+按 (房间ID, 版本号) 缓存序列化好的房间状态和用户列表JSON片段，
+vcJoinRoom/vcResync/vcGetUserList 的响应直接拼接缓存的片段，房间没有变化时不再重新校验和序列化
+房间版本号变化后旧快照自动失效，缓存总大小超过 room_snapshot_cache_bytes 时按LRU淘汰
+可以容忍短暂延迟的请求（vcGetUserList、vcResync）从Redis只读副本加载快照
+'''
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from meeting_room import MeetingRoom
+from rts_service import rtsService
+from metrics import metrics
+from schemas import ResponseMessageBase
+from config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+# 与pydantic的model_dump_json输出格式一致
+def dumps(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+# 将序列化好的response拼接到响应消息中
+def splice_response(res: ResponseMessageBase, response_json: str) -> str:
+    head = res.model_dump_json(exclude={"response"})
+    return f'{head[:-1]},"response":{response_json}}}'
+
+
+class RoomSnapshot:
+    """某个版本的房间快照"""
+    __slots__ = ("room_id", "version", "room_json", "users_json", "user_list_json", "size")
+
+    def __init__(self, room: MeetingRoom, room_id: str):
+        room_dict = room.to_dict()
+        self.room_id = room_id
+        self.version = room.version
+        self.room_json = dumps(room_dict["room_data"])
+        self.users_json: Dict[str, str] = {u["user_id"]: dumps(u) for u in room_dict["user_list"]}
+        self.user_list_json = f'[{",".join(self.users_json.values())}]'
+        # 用户片段和拼接好的用户列表各占一份
+        self.size = len(self.room_json.encode()) + 2 * len(self.user_list_json.encode())
+
+    @property
+    def user_count(self) -> int:
+        return len(self.users_json)
+
+
+class RoomSnapshotCache:
+    """房间快照LRU缓存，按总字节数限制大小"""
+
+    def __init__(self):
+        self._snapshots: OrderedDict[str, RoomSnapshot] = OrderedDict()
+        self._bytes = 0
+
+    def _remove(self, room_id: str) -> None:
+        snapshot = self._snapshots.pop(room_id, None)
+        if snapshot is not None:
+            self._bytes -= snapshot.size
+
+    # 缓存房间快照；版本号为0（没有版本记录）的房间不缓存
+    def put(self, room_id: str, room: MeetingRoom) -> RoomSnapshot:
+        snapshot = RoomSnapshot(room, room_id)
+        if not snapshot.version or snapshot.size > settings.room_snapshot_cache_bytes:
+            return snapshot
+
+        self._remove(room_id)
+        self._snapshots[room_id] = snapshot
+        self._bytes += snapshot.size
+        while self._bytes > settings.room_snapshot_cache_bytes:
+            _, evicted = self._snapshots.popitem(last=False)
+            self._bytes -= evicted.size
+            metrics.inc("room_snapshot_cache_evictions_total")
+        metrics.set("room_snapshot_cache_bytes", self._bytes)
+        return snapshot
+
+    # 获取房间当前版本的快照，版本变化时重新加载；房间不存在时返回None
+    async def get(self, room_id: str) -> Optional[RoomSnapshot]:
+        version = await rtsService.get_room_version(room_id)
+        snapshot = self._snapshots.get(room_id)
+        # 从副本读到的版本号可能落后于已缓存的快照，此时直接使用更新的快照
+        if snapshot is not None and version and snapshot.version >= version:
+            self._snapshots.move_to_end(room_id)
+            metrics.inc("room_snapshot_cache_total", result="hit")
+            return snapshot
+
+        metrics.inc("room_snapshot_cache_total", result="miss")
+        room: MeetingRoom = await rtsService.get_room(room_id)
+        if room is None:
+            self._remove(room_id)
+            return None
+        return self.put(room_id, room)
+
+    # 从Redis只读副本获取房间快照；副本上还没有房间或指定的用户（刚加入房间）时读取主节点
+    async def get_stale_ok(self, room_id: str, user_id: Optional[str] = None) -> Optional[RoomSnapshot]:
+        with rtsService.replica_reads():
+            snapshot = await self.get(room_id)
+        if snapshot is None or (user_id is not None and user_id not in snapshot.users_json):
+            snapshot = await self.get(room_id)
+        return snapshot
+
+    # 删除房间快照
+    def invalidate(self, room_id: str) -> None:
+        self._remove(room_id)
+        metrics.set("room_snapshot_cache_bytes", self._bytes)
+
+
+# 创建房间快照缓存实例
+room_snapshot_cache = RoomSnapshotCache()
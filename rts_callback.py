@@ -12,11 +12,14 @@ import json
 from typing import Dict
 from schemas import *
 from meeting_member import MeetingMember
-from meeting_room import MeetingRoom
+from meeting_room import MeetingRoom, RoomMembers
 from rts_service import rtsService
 from config import settings
 from vertc_client import ban_room
 from drift_api import drift_leave_room
+from cloud_tasks import stop_room_tasks
+from agent_prewarm import agent_prewarmer
+from room_owner import room_ownership
 from rts_inform import (
     join_room_infom,
     leave_room_infom,
@@ -35,19 +38,17 @@ async def handle_rts_callback(request: Request):
     body = await request.body()
     
     # 手动解析JSON，不管Content-Type头是什么
-    request_data = json.loads(body.decode("utf-8"))
+    body_str = body.decode("utf-8")
+    request_data = json.loads(body_str)
 
     notify_msg = RtsCallback(**request_data)
     event_data = json.loads(notify_msg.EventData)
 
     # TODO: 验证签名
 
-    # 根据不同的事件名称处理不同的消息
-    handler = EVENT_HANDLERS.get(notify_msg.EventType)
-    if handler:
-        await handler(notify_msg, event_data)
-    else:
-        logger.warning(f"收到未知事件消息: {notify_msg}")
+    # 房间归属其他实例时转发给归属实例处理
+    if not await room_ownership.route("callback", event_data.get("RoomId"), body_str):
+        await dispatch_callback(notify_msg, event_data)
     
     return Response(
         status_code=200,
@@ -55,9 +56,31 @@ async def handle_rts_callback(request: Request):
     )
 
 
+# 根据不同的事件名称处理不同的消息
+async def dispatch_callback(notify_msg: RtsCallback, event_data: Dict):
+    # RTC回调也刷新房间活跃时间（只有设备的房间没有RTS消息）
+    if event_data.get("RoomId"):
+        await rtsService.touch_room(event_data["RoomId"])
+
+    handler = EVENT_HANDLERS.get(notify_msg.EventType)
+    if handler:
+        await handler(notify_msg, event_data)
+    else:
+        logger.warning(f"收到未知事件消息: {notify_msg}")
+
+
+# 处理其他实例转发来的回调
+async def handle_forwarded_callback(payload: str):
+    notify_msg = RtsCallback(**json.loads(payload))
+    await dispatch_callback(notify_msg, json.loads(notify_msg.EventData))
+
+
 # 处理用户加入房间通知
 async def handle_user_join_room(notify_msg: RtsCallback, event_data: Dict):
     rts_event = UserJoinRoomEvent(**event_data)
+    # 真人用户进房时预热的智能体才算被使用，需要在过滤真人用户之前处理
+    if agent_prewarmer.on_user_join(rts_event.RoomId, rts_event.UserId):
+        return  # 智能体不作为参会成员
     if len(rts_event.UserId) == HUMAN_USER_ID_LENGTH:
         return  # 只有设备需要借助回调方式加入会议
     
@@ -80,10 +103,10 @@ async def handle_user_join_room(notify_msg: RtsCallback, event_data: Dict):
     user = MeetingMember(user_model)
 
     # 将设备加入房间中
-    room: MeetingRoom = await rtsService.join_room(user, rts_event.RoomId)
+    room, version = await rtsService.join_room(user, rts_event.RoomId)
 
     # 发送设备加入房间通知
-    await join_room_infom(settings.rtc_app_id, room, user)
+    await join_room_infom(settings.rtc_app_id, room, user, version)
 
 
 # 处理用户离开房间通知
@@ -91,14 +114,16 @@ async def handle_user_leave_room(notify_msg: RtsCallback, event_data: Dict):
     rts_event = UserLeaveRoomEvent(**event_data)
     if len(rts_event.UserId) == HUMAN_USER_ID_LENGTH:
         return  # 只有设备需要借助回调方式退出会议
+    if agent_prewarmer.is_bot(rts_event.UserId):
+        return  # 智能体不作为参会成员
     
     # 将设备移出房间
-    await rtsService.leave_room(rts_event.UserId, rts_event.RoomId)
-    # 如果设备是最后一个离开会议，房间已被销毁
-    room: MeetingRoom = await rtsService.get_room(rts_event.RoomId)
+    version = await rtsService.leave_room(rts_event.UserId, rts_event.RoomId)
+    # 如果设备是最后一个离开会议，房间已被销毁；通知只需要房间内的用户ID
+    room: RoomMembers = await rtsService.get_room_members(rts_event.RoomId)
     if room:
         # 发送设备离开房间通知
-        await leave_room_infom(settings.rtc_app_id, room, rts_event.UserId)
+        await leave_room_infom(settings.rtc_app_id, room, rts_event.UserId, version)
     else:
         # 发送房间销毁通知
         await finish_room_infom(settings.rtc_app_id, rts_event.RoomId)
@@ -111,6 +136,8 @@ async def handle_user_leave_room(notify_msg: RtsCallback, event_data: Dict):
             device_sn=rts_event.UserId,
             )
         )
+        # 停止房间内其它遗留的云端任务
+        await stop_room_tasks(rts_event.RoomId)
 
 
 # 处理程序映射
@@ -118,3 +145,6 @@ EVENT_HANDLERS = {
     "UserJoinRoom": handle_user_join_room,
     "UserLeaveRoom": handle_user_leave_room,
 }
+
+
+room_ownership.register_handler("callback", handle_forwarded_callback)
@@ -1,10 +1,10 @@
 import logging
 import json
 from schemas import *
-from vertc_service import rtc_service
+from rts_outbox import rts_outbox, Priority
 from mysql_client import mysql_client
 from rts_service import rtsService
-from meeting_room import MeetingRoom
+from meeting_room import MeetingRoom, RoomMembers
 from meeting_member import MeetingMember
 
 
@@ -26,13 +26,12 @@ async def finish_room_infom(app_id: str, room_id: str):
         RoomId=room_id,
         Message=inform.model_dump_json(),
     )
-    logger.debug(f"发送房间外广播消息: {json.dumps(body.model_dump(), indent=2, ensure_ascii=False)}")
-    response = await rtc_service.send_broadcast(body.model_dump_json())
-    logger.debug(f"房间外广播消息发送结果: {json.dumps(response, indent=2, ensure_ascii=False)}")
+    # 广播需要在解散房间（ban_room）之前送达，不经过队列
+    await rts_outbox.send_broadcast(body, immediate=True)
 
 
-# 用户加入房间通知
-async def join_room_infom(app_id: str, room: MeetingRoom, user: MeetingMember):
+# 用户加入房间通知；version为本次加入的房间状态版本号
+async def join_room_infom(app_id: str, room: MeetingRoom, user: MeetingMember, version: int):
 
     # 从数据库查询用户名
     if len(user.id) == HUMAN_USER_ID_LENGTH:
@@ -52,6 +51,7 @@ async def join_room_infom(app_id: str, room: MeetingRoom, user: MeetingMember):
     event = InformVcOnJoinRoom(
         user=user_model.model_dump(),
         user_count=room.user_count,
+        version=version,
     )
 
     inform = RtsInform(
@@ -59,22 +59,19 @@ async def join_room_infom(app_id: str, room: MeetingRoom, user: MeetingMember):
         data=event.model_dump(),
     )
 
-    room_users = room.get_all_users()
-    for room_user in room_users:
-        if room_user.id == user.id or len(room_user.id) != HUMAN_USER_ID_LENGTH:
+    for room_user_id in room.human_ids:
+        if room_user_id == user.id:
             continue
         body = UnicastMessageBase(
             AppId=app_id,
-            To=room_user.id,
+            To=room_user_id,
             Message=inform.model_dump_json(),
         )
-        logger.debug(f"发送房间外点对点消息: {json.dumps(body.model_dump(), indent=2, ensure_ascii=False)}")
-        response = await rtc_service.send_unicast(body.model_dump_json())
-        logger.debug(f"房间外点对点消息发送结果: {json.dumps(response, indent=2, ensure_ascii=False)}")
+        await rts_outbox.send_unicast(body, priority=Priority.ROSTER)
 
 
-# 用户离开房间通知
-async def leave_room_infom(app_id: str, room: MeetingRoom, user_id: str):
+# 用户离开房间通知；version为本次离开的房间状态版本号
+async def leave_room_infom(app_id: str, room: RoomMembers, user_id: str, version: int):
     if len(user_id) == HUMAN_USER_ID_LENGTH:
         user_name = await mysql_client.get_user_name(user_id)
     else:
@@ -92,6 +89,7 @@ async def leave_room_infom(app_id: str, room: MeetingRoom, user_id: str):
     event = InformVcOnLeaveRoom(
         user=user_model.model_dump(),
         user_count=room.user_count,
+        version=version,
     )
 
     inform = RtsInform(
@@ -99,15 +97,12 @@ async def leave_room_infom(app_id: str, room: MeetingRoom, user_id: str):
         data=event.model_dump(),
     )
     
-    room_users = room.get_all_users()
-    for room_user in room_users:
-        if room_user.id == user_id or len(room_user.id) != HUMAN_USER_ID_LENGTH:
+    for room_user_id in room.human_ids:
+        if room_user_id == user_id:
             continue
         body = UnicastMessageBase(
             AppId=app_id,
-            To=room_user.id,
+            To=room_user_id,
             Message=inform.model_dump_json(),
         )
-        logger.debug(f"发送房间外点对点消息: {json.dumps(body.model_dump(), indent=2, ensure_ascii=False)}")
-        response = await rtc_service.send_unicast(body.model_dump_json())
-        logger.debug(f"房间外点对点消息发送结果: {json.dumps(response, indent=2, ensure_ascii=False)}")
+        await rts_outbox.send_unicast(body, priority=Priority.ROSTER)
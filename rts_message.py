@@ -9,16 +9,22 @@ from fastapi import (
     )
 import json
 from typing import Dict
+from pydantic import ValidationError
 
 from fastapi.background import P
 from py import log
 from schemas import *
 from meeting_member import MeetingMember
 from meeting_room import MeetingRoom
-from utils import generate_token
+from utils import generate_token, current_timestamp_s
 from rts_service import rtsService
-from vertc_service import rtc_service
+from rts_outbox import rts_outbox
+from room_snapshot import room_snapshot_cache, splice_response, dumps
+from room_owner import room_ownership
+from config import settings
+from metrics import metrics
 from vertc_client import ban_room
+from cloud_tasks import stop_room_tasks
 from rts_inform import (
     join_room_infom,
     leave_room_infom,
@@ -78,7 +84,9 @@ async def handle_rts_message(request: Request):
             content="invalid message format",
             )
 
-    await send_return_message(message)
+    # 房间归属其他实例时转发给归属实例处理
+    if not await room_ownership.route("message", message.room_id, message.model_dump_json()):
+        await send_return_message(message)
     
     return ResponseMessageBase(
         code=200,
@@ -103,6 +111,11 @@ async def send_return_message(message: RequestMessageBase):
         logger.error(f"JSON解析错误: {message}")
         return
 
+    # 刷新房间活跃时间和用户在线状态，长时间没有任何消息的房间和用户会被回收
+    if message.room_id:
+        await rtsService.touch_room(message.room_id)
+        await rtsService.touch_presence(message.room_id, message.user_id)
+
     # 根据不同的事件名称处理不同的消息
     handler = EVENT_HANDLERS.get(message.event_name)
     if handler:
@@ -129,30 +142,30 @@ async def handle_join_room(message: RequestMessageBase, content: Dict):
         )
         user = MeetingMember(user_model)
 
-        room: MeetingRoom = await rtsService.join_room(user, message.room_id)
-
-        # 发送用户加入房间通知
-        await join_room_infom(message.app_id, room, user)
+        room, version = await rtsService.join_room(user, message.room_id)
+        snapshot = room_snapshot_cache.put(message.room_id, room)
 
         wb_room_id = f"whiteboard_{message.room_id}"
         wb_user_id = f"whiteboard_{message.user_id}"
 
-        room_dict = room.to_dict()
-        response = JoinMeetingRoomRes(
-            room = room_dict["room_data"],
-            user = user.to_dict(),
-            user_list = [u.to_dict() for u in room.get_all_users()],
-            token = generate_token(user.id, message.room_id),
-            wb_room_id = wb_room_id,
-            wb_user_id = wb_user_id,
-            wb_token = generate_token(wb_user_id, wb_room_id),
+        # 字段与 JoinMeetingRoomRes 一致，房间和用户列表使用快照中序列化好的片段
+        response_json = (
+            f'{{"nts":{current_timestamp_s()},'
+            f'"room":{snapshot.room_json},'
+            f'"user":{snapshot.users_json[user.id]},'
+            f'"user_list":{snapshot.user_list_json},'
+            f'"token":{dumps(generate_token(user.id, message.room_id))},'
+            f'"wb_room_id":{dumps(wb_room_id)},'
+            f'"wb_user_id":{dumps(wb_user_id)},'
+            f'"wb_token":{dumps(generate_token(wb_user_id, wb_room_id))},'
+            f'"version":{snapshot.version}}}'
         )
 
         res = ResponseMessageBase(
             request_id=message.request_id,
             event_name=message.event_name,
-            response=response,
         )
+        res_json = splice_response(res, response_json)
     else:
         res = ResponseMessageBase(
             code=422,
@@ -160,22 +173,25 @@ async def handle_join_room(message: RequestMessageBase, content: Dict):
             event_name=message.event_name,
             message="room not exists",
         )
+        res_json = res.model_dump_json()
     
     body = UnicastMessageBase(
         AppId=message.app_id,
         To=message.user_id,
-        Message=res.model_dump_json(),
+        Message=res_json,
     )
 
-    logger.debug(f"发送房间外点对点消息: {json.dumps(body.model_dump(), indent=2, ensure_ascii=False)}")
-    response = await rtc_service.send_unicast(body.model_dump_json())
-    logger.debug(f"房间外点对点消息发送结果: {json.dumps(response, indent=2, ensure_ascii=False)}")
+    await rts_outbox.send_unicast(body)
+
+    # 先答复请求者，再发送用户加入房间通知
+    if room_exists:
+        await join_room_infom(message.app_id, room, user, version)
 
 
 # 处理离开房间事件
 async def handle_leave_room(message: RequestMessageBase, content: Dict):
     # 从缓存中删除用户
-    await rtsService.leave_room(message.user_id, message.room_id)
+    version = await rtsService.leave_room(message.user_id, message.room_id)
 
     res = ResponseMessageBase(
         request_id=message.request_id,
@@ -189,23 +205,30 @@ async def handle_leave_room(message: RequestMessageBase, content: Dict):
         Message=res.model_dump_json(),
     )
 
-    logger.debug(f"发送房间外点对点消息: {json.dumps(body.model_dump(), indent=2, ensure_ascii=False)}")
-    response = await rtc_service.send_unicast(body.model_dump_json())
-    logger.debug(f"房间外点对点消息发送结果: {json.dumps(response, indent=2, ensure_ascii=False)}")
+    await rts_outbox.send_unicast(body)
+
+    await on_user_left(message.app_id, message.room_id, message.user_id, version)
+
 
-    # 最后一个人离开房间后，会从缓存中删除房间
-    room = await rtsService.get_room(message.room_id)
+# 用户离开房间后：房间已解散时停止房间相关的服务，否则通知房间内的其他用户；version为离开的变更版本号
+async def on_user_left(app_id: str, room_id: str, user_id: str, version: int):
+    # 最后一个人离开房间后，会从缓存中删除房间；通知只需要房间内的用户ID
+    room = await rtsService.get_room_members(room_id)
     if not room:
-        logger.debug(f"解散房间：{message.room_id}")
-        await ban_room(message.room_id)
+        logger.debug(f"解散房间：{room_id}")
+        room_snapshot_cache.invalidate(room_id)
+        await ban_room(room_id)
+        # 停止房间内遗留的云端任务
+        await stop_room_tasks(room_id)
     else:
-        await leave_room_infom(message.app_id, room, message.user_id)
+        await leave_room_infom(app_id, room, user_id, version)
 
 
 # 处理关闭房间事件
 async def handle_finish_room(message: RequestMessageBase, content: Dict):
     # 清空房间缓存
     await rtsService.finish_room(message.user_id, message.room_id)
+    room_snapshot_cache.invalidate(message.room_id)
     
     res = ResponseMessageBase(
         request_id=message.request_id,
@@ -219,62 +242,174 @@ async def handle_finish_room(message: RequestMessageBase, content: Dict):
         Message=res.model_dump_json(),
     )
     
-    logger.debug(f"发送房间外点对点消息: {json.dumps(body.model_dump(), indent=2, ensure_ascii=False)}")
-    response = await rtc_service.send_unicast(body.model_dump_json())
-    logger.debug(f"房间外点对点消息发送结果: {json.dumps(response, indent=2, ensure_ascii=False)}")
+    await rts_outbox.send_unicast(body)
 
     # 广播通知房间内的用户
     await finish_room_infom(message.app_id, message.room_id)
 
     logger.debug(f"解散房间：{message.room_id}")
     await ban_room(message.room_id)
+    # 停止房间内的云端任务
+    await stop_room_tasks(message.room_id)
 
 
-# 处理重连同步
+# 处理重连同步：客户端带上版本号时只返回之后的变更，变更日志已被截断时返回全量数据
+# 重连同步可以容忍短暂的延迟，从Redis只读副本读取，之后的变更由广播补齐
 async def handle_resync(message: RequestMessageBase, content: Dict):
-    room: MeetingRoom = await rtsService.get_room(message.room_id)
-    user: MeetingMember = room.get_user(message.user_id)
+    try:
+        req = ResyncReq.model_validate(content)
+    except ValidationError as e:
+        logger.warning(f"断线重连的参数错误: {content}, {e}")
+        res = ResponseMessageBase(
+            code=400,
+            request_id=message.request_id,
+            event_name=message.event_name,
+            message="invalid parameters",
+        )
+        body = UnicastMessageBase(
+            AppId=message.app_id,
+            To=message.user_id,
+            Message=res.model_dump_json(),
+        )
+        await rts_outbox.send_unicast(body)
+        return
 
-    room_dict = room.to_dict()
-    response = ReconnectRes(
-        room = room_dict["room_data"],
-        user= user.to_dict(),
-        user_list = room_dict["user_list"],
-    )
+    response_json = None
+    if req.version is not None:
+        with rtsService.replica_reads():
+            version, changes = await rtsService.get_room_changes_since(message.room_id, req.version)
+            user: MeetingMember = await rtsService.get_room_user(message.room_id, message.user_id)
+        if changes is not None and user:
+            response = ReconnectDeltaRes(
+                user = user.to_dict(),
+                changes = changes,
+                version = version,
+            )
+            response_json = response.model_dump_json()
+            metrics.inc("resync_total", mode="delta")
+            metrics.observe("resync_delta_changes", len(changes))
+
+    if response_json is None:
+        # 字段与 ReconnectRes 一致，使用快照中序列化好的片段
+        snapshot = await room_snapshot_cache.get_stale_ok(message.room_id, message.user_id)
+        response_json = (
+            f'{{"room":{snapshot.room_json},'
+            f'"user":{snapshot.users_json[message.user_id]},'
+            f'"user_list":{snapshot.user_list_json},'
+            f'"version":{snapshot.version}}}'
+        )
+        metrics.inc("resync_total", mode="full")
 
     res = ResponseMessageBase(
         request_id=message.request_id,
         event_name=message.event_name,
-        response=response,
     )
 
     body = UnicastMessageBase(
         AppId=message.app_id,
         To=message.user_id,
-        Message=res.model_dump_json(),
+        Message=splice_response(res, response_json),
     )
-    logger.debug(f"发送房间外点对点消息: {json.dumps(body.model_dump(), indent=2, ensure_ascii=False)}")
-    response = await rtc_service.send_unicast(body.model_dump_json())
-
-    # 检查API调用是否成功
-    logger.debug(f"房间外点对点消息发送结果: {json.dumps(response, indent=2, ensure_ascii=False)}")
+    await rts_outbox.send_unicast(body)
 
 
 # 处理获取用户列表
+# 可选参数: limit 每页数量, cursor 上一页返回的next_cursor, fields 只返回指定字段（如 ["user_id", "user_name", "mic"]）
+# 用户列表可以容忍短暂的延迟，从Redis只读副本读取
 async def handle_get_user_list(message: RequestMessageBase, content: Dict):
-    room: MeetingRoom = await rtsService.get_room(message.room_id)
-    user: MeetingMember = room.get_user(message.user_id)
+    try:
+        req = GetUserListReq.model_validate(content)
+    except ValidationError as e:
+        logger.warning(f"获取用户列表的参数错误: {content}, {e}")
+        res = ResponseMessageBase(
+            code=400,
+            request_id=message.request_id,
+            event_name=message.event_name,
+            message="invalid parameters",
+        )
+        body = UnicastMessageBase(
+            AppId=message.app_id,
+            To=message.user_id,
+            Message=res.model_dump_json(),
+        )
+        await rts_outbox.send_unicast(body)
+        return
+
+    fields = None
+    if req.fields:
+        fields = ["user_id"] + [f for f in req.fields if f in UserModel.model_fields and f != "user_id"]
+
+    # 房间不存在时为None
+    response_json = None
+    paged = req.limit is not None or bool(req.cursor)
+    if not paged and not fields:
+        # 返回全部用户的全部字段，字段与 GetUserListRes 一致，使用快照中序列化好的片段
+        snapshot = await room_snapshot_cache.get_stale_ok(message.room_id)
+        if snapshot is not None:
+            response_json = (
+                f'{{"user_count":{snapshot.user_count},'
+                f'"user_list":{snapshot.user_list_json},'
+                f'"version":{snapshot.version},'
+                f'"next_cursor":null}}'
+            )
+    elif not paged:
+        # 未指定分页参数时返回全部用户
+        with rtsService.replica_reads():
+            room: MeetingRoom = await rtsService.get_room(message.room_id)
+        if room is None:
+            room = await rtsService.get_room(message.room_id)
+        if room is not None:
+            user_list = [u.to_dict() for u in room.get_all_users()]
+            response_json = GetUserListRes(
+                user_count = len(user_list),
+                user_list = [{field: u[field] for field in fields} for u in user_list],
+                version = room.version,
+            ).model_dump_json()
+    else:
+        limit = min(req.limit or settings.user_list_max_page_size, settings.user_list_max_page_size)
+        with rtsService.replica_reads():
+            version = await rtsService.get_room_version(message.room_id)
+            user_count, user_list, next_cursor = await rtsService.get_room_users_page(
+                message.room_id, req.cursor, limit, fields,
+            )
+        # 空页才需要区分空房间和不存在的房间
+        if user_count > 0 or await rtsService.check_room_exists(message.room_id):
+            response_json = GetUserListRes(
+                user_count = user_count,
+                user_list = user_list,
+                version = version,
+                next_cursor = next_cursor,
+            ).model_dump_json()
+
+    if response_json is not None:
+        res = ResponseMessageBase(
+            request_id=message.request_id,
+            event_name=message.event_name,
+        )
+        res_json = splice_response(res, response_json)
+    else:
+        res = ResponseMessageBase(
+            code=422,
+            request_id=message.request_id,
+            event_name=message.event_name,
+            message="room not exists",
+        )
+        res_json = res.model_dump_json()
 
-    all_users = room.get_all_users()
-    response = GetUserListRes(
-        user_count = len(all_users),
-        user_list = [u.to_dict() for u in all_users],
+    body = UnicastMessageBase(
+        AppId=message.app_id,
+        To=message.user_id,
+        Message=res_json,
     )
+    await rts_outbox.send_unicast(body)
 
+
+# 处理心跳（在线状态已在收到消息时刷新）
+async def handle_heartbeat(message: RequestMessageBase, content: Dict):
     res = ResponseMessageBase(
         request_id=message.request_id,
         event_name=message.event_name,
-        response=response,
+        response=None,
     )
 
     body = UnicastMessageBase(
@@ -282,9 +417,7 @@ async def handle_get_user_list(message: RequestMessageBase, content: Dict):
         To=message.user_id,
         Message=res.model_dump_json(),
     )
-    logger.debug(f"发送房间外点对点消息: {json.dumps(body.model_dump(), indent=2, ensure_ascii=False)}")
-    response = await rtc_service.send_unicast(body.model_dump_json())
-    logger.debug(f"房间外点对点消息发送结果: {json.dumps(response, indent=2, ensure_ascii=False)}")
+    await rts_outbox.send_unicast(body)
 
 
 # 处理操纵自己的摄像头
@@ -304,9 +437,7 @@ async def handle_operate_self_camera(message: RequestMessageBase, content: Dict)
         To=message.user_id,
         Message=res.model_dump_json(),
     )
-    logger.debug(f"发送房间外点对点消息: {json.dumps(body.model_dump(), indent=2, ensure_ascii=False)}")
-    response = await rtc_service.send_unicast(body.model_dump_json())
-    logger.debug(f"房间外点对点消息发送结果: {json.dumps(response, indent=2, ensure_ascii=False)}")
+    await rts_outbox.send_unicast(body)
 
 
 # 处理操纵自己的麦克风
@@ -327,9 +458,7 @@ async def handle_operate_self_mic(message: RequestMessageBase, content: Dict):
         Message=res.model_dump_json(),
     )
 
-    logger.debug(f"发送房间外点对点消息: {json.dumps(body.model_dump(), indent=2, ensure_ascii=False)}")
-    response = await rtc_service.send_unicast(body.model_dump_json())
-    logger.debug(f"房间外点对点消息发送结果: {json.dumps(response, indent=2, ensure_ascii=False)}")
+    await rts_outbox.send_unicast(body)
 
 
 # 处理操纵自己麦克风权限申请
@@ -350,9 +479,7 @@ async def handle_operate_self_mic_apply(message: RequestMessageBase, content: Di
         Message=res.model_dump_json(),
     )
 
-    logger.debug(f"发送房间外点对点消息: {json.dumps(body.model_dump(), indent=2, ensure_ascii=False)}")
-    response = await rtc_service.send_unicast(body.model_dump_json())
-    logger.debug(f"房间外点对点消息发送结果: {json.dumps(response, indent=2, ensure_ascii=False)}")
+    await rts_outbox.send_unicast(body)
 
 
 # 处理本地用户开始共享
@@ -373,9 +500,7 @@ async def handle_start_share(message: RequestMessageBase, content: Dict):
         Message=res.model_dump_json(),
     )
 
-    logger.debug(f"发送房间外点对点消息: {json.dumps(body.model_dump(), indent=2, ensure_ascii=False)}")
-    response = rtc_service.send_unicast(body.model_dump_json())
-    logger.debug(f"房间外点对点消息发送结果: {json.dumps(response, indent=2, ensure_ascii=False)}")
+    await rts_outbox.send_unicast(body)
 
 
 # 处理本地用户停止共享
@@ -394,9 +519,7 @@ async def handle_finish_share(message: RequestMessageBase, content: Dict):
         Message=res.model_dump_json(),
     )
 
-    logger.debug(f"发送房间外点对点消息: {json.dumps(body.model_dump(), indent=2, ensure_ascii=False)}")
-    response = rtc_service.send_unicast(body.model_dump_json())
-    logger.debug(f"房间外点对点消息发送结果: {json.dumps(response, indent=2, ensure_ascii=False)}")
+    await rts_outbox.send_unicast(body)
 
 
 # 处理申请共享权限
@@ -415,9 +538,7 @@ async def handle_share_permission_apply(message: RequestMessageBase, content: Di
         Message=res.model_dump_json(),
     )
 
-    logger.debug(f"发送房间外点对点消息: {json.dumps(body.model_dump(), indent=2, ensure_ascii=False)}")
-    response = rtc_service.send_unicast(body.model_dump_json())
-    logger.debug(f"房间外点对点消息发送结果: {json.dumps(response, indent=2, ensure_ascii=False)}")
+    await rts_outbox.send_unicast(body)
 
 
 # 处理操纵参会人的摄像头
@@ -439,9 +560,7 @@ async def handle_operate_other_camera(message: RequestMessageBase, content: Dict
         Message=res.model_dump_json(),
     )
 
-    logger.debug(f"发送房间外点对点消息: {json.dumps(body.model_dump(), indent=2, ensure_ascii=False)}")
-    response = rtc_service.send_unicast(body.model_dump_json())
-    logger.debug(f"房间外点对点消息发送结果: {json.dumps(response, indent=2, ensure_ascii=False)}")
+    await rts_outbox.send_unicast(body)
 
 
 # 处理操纵参会人的麦克风
@@ -463,9 +582,7 @@ async def handle_operate_other_mic(message: RequestMessageBase, content: Dict):
         Message=res.model_dump_json(),
     )
 
-    logger.debug(f"发送房间外点对点消息: {json.dumps(body.model_dump(), indent=2, ensure_ascii=False)}")
-    response = rtc_service.send_unicast(body.model_dump_json())
-    logger.debug(f"房间外点对点消息发送结果: {json.dumps(response, indent=2, ensure_ascii=False)}")
+    await rts_outbox.send_unicast(body)
 
 
 # 处理操纵参会人屏幕共享权限
@@ -487,9 +604,7 @@ async def handle_operate_other_share_permission(message: RequestMessageBase, con
         Message=res.model_dump_json(),
     )
 
-    logger.debug(f"发送房间外点对点消息: {json.dumps(body.model_dump(), indent=2, ensure_ascii=False)}")
-    response = rtc_service.send_unicast(body.model_dump_json())
-    logger.debug(f"房间外点对点消息发送结果: {json.dumps(response, indent=2, ensure_ascii=False)}")
+    await rts_outbox.send_unicast(body)
 
 
 # 处理全员麦克风操作
@@ -511,9 +626,7 @@ async def handle_operate_all_mic(message: RequestMessageBase, content: Dict):
         Message=res.model_dump_json(),
     )
 
-    logger.debug(f"发送房间外点对点消息: {json.dumps(body.model_dump(), indent=2, ensure_ascii=False)}")
-    response = rtc_service.send_unicast(body.model_dump_json())
-    logger.debug(f"房间外点对点消息发送结果: {json.dumps(response, indent=2, ensure_ascii=False)}")
+    await rts_outbox.send_unicast(body)
 
 
 # 观众请求麦克风使用权限后, 主持人答复
@@ -535,9 +648,7 @@ async def handle_operate_self_mic_permit(message: RequestMessageBase, content: D
         Message=res.model_dump_json(),
     )
 
-    logger.debug(f"发送房间外点对点消息: {json.dumps(body.model_dump(), indent=2, ensure_ascii=False)}")
-    response = rtc_service.send_unicast(body.model_dump_json())
-    logger.debug(f"房间外点对点消息发送结果: {json.dumps(response, indent=2, ensure_ascii=False)}")
+    await rts_outbox.send_unicast(body)
 
 
 # 观众请求屏幕共享权限后, 主持人答复
@@ -559,9 +670,7 @@ async def handle_share_permission_permit(message: RequestMessageBase, content: D
         Message=res.model_dump_json(),
     )
 
-    logger.debug(f"发送房间外点对点消息: {json.dumps(body.model_dump(), indent=2, ensure_ascii=False)}")
-    response = rtc_service.send_unicast(body.model_dump_json())
-    logger.debug(f"房间外点对点消息发送结果: {json.dumps(response, indent=2, ensure_ascii=False)}")
+    await rts_outbox.send_unicast(body)
 
 
 # 处理程序映射
@@ -571,6 +680,7 @@ EVENT_HANDLERS = {
     "vcFinishRoom": handle_finish_room,
     "vcResync": handle_resync,
     "vcGetUserList": handle_get_user_list,
+    "vcHeartbeat": handle_heartbeat,
     "vcOperateSelfCamera": handle_operate_self_camera,
     "vcOperateSelfMic": handle_operate_self_mic,
     "vcOperateSelfMicApply": handle_operate_self_mic_apply,
@@ -584,3 +694,11 @@ EVENT_HANDLERS = {
     "vcOperateSelfMicPermit": handle_operate_self_mic_permit,
     "vcSharePermissionPermit": handle_share_permission_permit,
 }
+
+
+# 处理其他实例转发来的RTS消息
+async def handle_forwarded_message(payload: str):
+    await send_return_message(RequestMessageBase.model_validate_json(payload))
+
+
+room_ownership.register_handler("message", handle_forwarded_message)
@@ -0,0 +1,214 @@
+'''
+RTS出站消息投递
+点对点/广播消息先写入Redis Stream，由消费组中的异步worker投递（至少一次语义），
+请求处理函数无需等待投递完成；多次投递失败的消息转入死信流，便于排查
+
+消息按优先级分流：请求的直接答复 > 成员进出通知，
+高优先级消息不会排在大房间的通知扇出之后
+
+投递顺序：多个worker并行投递，投递失败的消息超时后被重新认领，因此同一接收者的消息可能乱序或重复到达，
+    - 请求的直接答复：客户端按request_id匹配请求，与顺序无关
+    - 成员进出通知：data.version 为该次加入/离开的房间状态版本号（与增量同步的版本号相同），
+      客户端按用户记录已应用的版本号，丢弃版本号不大于该用户已应用版本的通知（包括早于加入房间响应版本的通知），
+      user_count 只采用版本号最大的通知中的值
+'''
+import os
+import json
+import time
+import socket
+import asyncio
+import logging
+from enum import IntEnum
+from typing import Dict, List, Optional, Tuple
+from schemas import UnicastMessageBase, BroadcastMessageBase
+from vertc_service import rtc_service, get_error_code, RETRIABLE_ERROR_CODES
+from redis_client import redis_client
+from metrics import metrics
+from utils import current_timestamp_ms
+from config import settings
+
+
+logger = logging.getLogger(__name__)
+
+DEAD_LETTER_STREAM = "dead"     # 死信流
+CONSUMER_GROUP = "rts"          # 消费组
+
+# 消息类型
+KIND_UNICAST = "unicast"
+KIND_BROADCAST = "broadcast"
+
+# 投递失败但可以稍后重试的错误码（熔断、调用异常等）
+# 失败的调用可能已经送达，重投后客户端会收到重复消息，依赖模块说明中的 request_id / version 去重约定
+RETRY_LATER_ERROR_CODES = RETRIABLE_ERROR_CODES | {"CircuitOpen", "APICallFailed"}
+
+
+# 出站消息优先级（数值越小越优先）
+class Priority(IntEnum):
+    RETURN = 0   # 请求的直接答复（message_type=return），包括主持人控制操作的答复
+    ROSTER = 1   # 成员进出通知（vcOnJoinRoom/vcOnLeaveRoom）
+
+
+# 各优先级对应的消息流（RETURN沿用原消息流名称，升级时未投递的消息不会丢失）
+PRIORITY_STREAMS = {
+    Priority.RETURN: "messages",
+    Priority.ROSTER: "messages:roster",
+}
+STREAM_PRIORITIES = {name: priority for priority, name in PRIORITY_STREAMS.items()}
+
+
+class RtsOutbox:
+    """出站消息队列"""
+
+    def __init__(self):
+        self._consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._workers: List[asyncio.Task] = []
+        self._next_claim_at = 0.0
+
+    # 发送房间外点对点消息
+    async def send_unicast(
+            self, body: UnicastMessageBase,
+            priority: Priority = Priority.RETURN,
+            immediate: bool = False
+            ) -> None:
+        await self._enqueue(KIND_UNICAST, body.model_dump_json(), priority, immediate)
+
+    # 发送房间内广播消息
+    async def send_broadcast(
+            self, body: BroadcastMessageBase,
+            priority: Priority = Priority.ROSTER,
+            immediate: bool = False
+            ) -> None:
+        await self._enqueue(KIND_BROADCAST, body.model_dump_json(), priority, immediate)
+
+    # immediate: 立即投递，用于必须先于后续操作（如解散房间）送达的消息
+    async def _enqueue(self, kind: str, payload: str, priority: Priority, immediate: bool = False) -> None:
+        if settings.outbox_enabled and self._workers and not immediate:
+            try:
+                redis_client.add_outbox_message(PRIORITY_STREAMS[priority], {
+                    "kind": kind,
+                    "body": payload,
+                    "ts": current_timestamp_ms(),
+                })
+                metrics.inc("outbox_enqueued_total", kind=kind, priority=priority.name)
+                return
+            except Exception as e:
+                logger.error(f"出站消息入队失败，直接投递: {e}")
+
+        # 未启用队列或入队失败时，直接投递
+        await self._deliver(kind, payload)
+
+    # 调用OpenAPI投递消息，返回错误码（成功时返回None）
+    async def _deliver(self, kind: str, payload: str) -> Optional[str]:
+        if kind == KIND_BROADCAST:
+            logger.debug(f"发送房间内广播消息: {payload}")
+            response = await rtc_service.send_broadcast(payload)
+        else:
+            logger.debug(f"发送房间外点对点消息: {payload}")
+            response = await rtc_service.send_unicast(payload)
+        logger.debug(f"消息发送结果: {json.dumps(response, ensure_ascii=False)}")
+        return get_error_code(response)
+
+    # 处理一条出站消息
+    async def _process(self, priority: Priority, entry_id: str, fields: Dict[str, str]) -> None:
+        stream = PRIORITY_STREAMS[priority]
+        kind = fields.get("kind", KIND_UNICAST)
+        error_code = await self._deliver(kind, fields.get("body", "{}"))
+
+        if error_code is None:
+            redis_client.ack_outbox_message(stream, CONSUMER_GROUP, entry_id)
+            metrics.inc("outbox_delivered_total", kind=kind, priority=priority.name)
+            latency = current_timestamp_ms() - int(fields.get("ts", 0))
+            metrics.observe("outbox_delivery_latency_ms", latency, priority=priority.name)
+            return
+
+        metrics.inc("outbox_failed_total", kind=kind, code=error_code)
+        attempts = redis_client.get_outbox_delivery_count(stream, CONSUMER_GROUP, entry_id)
+        if error_code in RETRY_LATER_ERROR_CODES and attempts < settings.outbox_max_attempts:
+            # 不确认消息，超过 outbox_retry_idle_ms 后会被重新认领投递
+            logger.warning(f"出站消息投递失败，稍后重试: {entry_id}, 错误码: {error_code}, 第{attempts}次")
+            return
+
+        # 不可重试或重试次数耗尽，转入死信流
+        logger.error(f"出站消息投递失败，转入死信流: {entry_id}, 错误码: {error_code}, 投递{attempts}次")
+        redis_client.add_outbox_message(DEAD_LETTER_STREAM, {
+            **fields,
+            "stream": stream,
+            "entry_id": entry_id,
+            "error": error_code,
+            "attempts": attempts,
+            "dead_ts": current_timestamp_ms(),
+        }, maxlen=settings.outbox_dead_letter_maxlen)
+        redis_client.ack_outbox_message(stream, CONSUMER_GROUP, entry_id)
+        metrics.inc("outbox_dead_letter_total", kind=kind)
+
+    # 按优先级获取一批待投递消息
+    async def _fetch(self, consumer: str, order: List[Priority]) -> List[Tuple[Priority, str, Dict[str, str]]]:
+        # 定期认领超时未确认的消息（投递失败或消费者崩溃）
+        now = time.monotonic()
+        if now >= self._next_claim_at:
+            self._next_claim_at = now + settings.outbox_retry_idle_ms / 2000
+            for priority in order:
+                entries = await asyncio.to_thread(
+                    redis_client.claim_outbox_messages,
+                    PRIORITY_STREAMS[priority], CONSUMER_GROUP, consumer,
+                    settings.outbox_retry_idle_ms, settings.outbox_batch_size,
+                )
+                if entries:
+                    return [(priority, entry_id, fields) for entry_id, fields in entries]
+
+        # 按优先级依次读取新消息，只取最高优先级的一批
+        for priority in order:
+            entries = await asyncio.to_thread(
+                redis_client.read_outbox_messages,
+                [PRIORITY_STREAMS[priority]], CONSUMER_GROUP, consumer, settings.outbox_batch_size,
+            )
+            if entries:
+                return [(priority, entry_id, fields) for _, entry_id, fields in entries]
+
+        # 所有消息流都为空时，阻塞等待任意消息流的新消息
+        entries = await asyncio.to_thread(
+            redis_client.read_outbox_messages,
+            [PRIORITY_STREAMS[p] for p in order], CONSUMER_GROUP, consumer,
+            settings.outbox_batch_size, settings.outbox_block_ms,
+        )
+        entries = [(STREAM_PRIORITIES[stream], entry_id, fields) for stream, entry_id, fields in entries]
+        return sorted(entries, key=lambda entry: entry[0])
+
+    # 投递worker：严格按优先级调度，每 outbox_starvation_interval 轮反转一次顺序，防止低优先级消息饿死
+    async def _run_worker(self, consumer: str) -> None:
+        rounds = 0
+        while True:
+            try:
+                rounds += 1
+                order = sorted(Priority)
+                if rounds % max(1, settings.outbox_starvation_interval) == 0:
+                    order.reverse()
+                for priority, entry_id, fields in await self._fetch(consumer, order):
+                    await self._process(priority, entry_id, fields)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"出站消息worker异常: {consumer}, {e}")
+                await asyncio.sleep(1)
+
+    # 启动投递worker
+    async def start(self) -> None:
+        if not settings.outbox_enabled or self._workers:
+            return
+        for stream in PRIORITY_STREAMS.values():
+            redis_client.ensure_outbox_group(stream, CONSUMER_GROUP)
+        for i in range(settings.outbox_workers):
+            consumer = f"{self._consumer}-{i}"
+            self._workers.append(asyncio.create_task(self._run_worker(consumer)))
+        logger.info(f"出站消息队列已启动，worker数量: {settings.outbox_workers}")
+
+    # 停止投递worker（未确认的消息保留在流中，由其它进程或重启后继续投递）
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+
+# 创建出站消息队列实例
+rts_outbox = RtsOutbox()
@@ -1,28 +1,96 @@
+import time
+import asyncio
+from typing import AsyncIterator
 from meeting_member import MeetingMember
-from meeting_room import MeetingRoom
+from meeting_room import MeetingRoom, RoomHeader, RoomMembers
 from schemas import *
 from redis_client import redis_client
-from utils import current_timestamp_s
+from room_cache import room_cache, CachedRoom
+from utils import current_timestamp_s, current_timestamp_ms
 from config import settings
 
 
+# 取消会议的结果
+CANCEL_MEETING_MESSAGES = {
+    200: "会议已取消",
+    403: "只有主持人可以取消会议",
+    404: "房间不存在",
+    409: "会议中有人，无法取消",
+}
+
+
 class RtsService:
     def __init__(self):
-        pass  # 纯Redis存储，不需要内存缓存
+        # 房间数据以Redis为准（只读操作可以使用 room_cache 近端缓存），这里只记录最近一次刷新房间活跃的时间，用于限制刷新频率
+        self._touched_at: Dict[str, float] = {}
 
 
-    # 从Redis获取房间
-    def _get_room_from_redis(self, room_id: str) -> MeetingRoom:
-        """从Redis加载房间数据"""
+    # 从Redis加载房间数据（房间、成员记录、版本号），房间不存在时返回None
+    def _load_room(self, room_id: str) -> Optional[CachedRoom]:
+        # 先读取版本号再读取数据：读取期间发生的变更会在增量同步时重复应用，变更是幂等的
+        version = redis_client.get_room_version(room_id)
         room_data = redis_client.get_room(room_id)
         if room_data:
-            users_data = redis_client.get_room_users(room_id)
-            # 将字典格式的用户数据转换为列表格式
-            user_list = list(users_data.values()) if users_data else None
-            return MeetingRoom.from_dict(room_data, user_list)
+            return CachedRoom(room_data, redis_client.get_room_users(room_id), version)
         return None
 
 
+    # 由房间数据创建房间实例
+    def _build_room(self, data: CachedRoom) -> MeetingRoom:
+        # 数据由本服务写入，成员跳过校验
+        room = MeetingRoom.from_dict(data.room_data, list(data.users.values()) or None, trusted=True)
+        room.version = data.version
+        return room
+
+
+    # 从Redis获取房间
+    def _get_room_from_redis(self, room_id: str) -> MeetingRoom:
+        """从Redis加载房间数据"""
+        data = self._load_room(room_id)
+        return self._build_room(data) if data else None
+
+
+    # 记录房间变更，返回新版本号
+    def _record_change(self, room_id: str, op: str, **data) -> int:
+        """
+        变更类型:
+            join: 用户加入，data为 user
+            leave: 用户离开，data为 user_id
+            update: 用户状态变化，data为 user
+            update_all: 批量更新用户状态，data为 users
+        """
+        return redis_client.record_room_change(room_id, {"op": op, **data}, settings.room_change_log_size)
+
+
+    # 记录房间活跃，刷新房间数据的过期时间
+    async def touch_room(self, room_id: str, force: bool = False) -> None:
+        """
+        Args:
+            room_id: 房间ID
+            force: 为False时同一房间在 room_touch_interval 内只刷新一次，且只更新已在回收列表中的房间
+        """
+        now = time.monotonic()
+        if not force and now - self._touched_at.get(room_id, 0) < settings.room_touch_interval:
+            return
+        if len(self._touched_at) > 100000:
+            self._touched_at.clear()
+        self._touched_at[room_id] = now
+        redis_client.touch_room(room_id, settings.room_idle_ttl, current_timestamp_s(), add=force)
+
+
+    # 记录用户在线（收到该用户的任意消息时调用）
+    async def touch_presence(self, room_id: str, user_id: str) -> None:
+        if settings.presence_enabled:
+            redis_client.update_presence(room_id, [user_id], current_timestamp_ms())
+
+
+    # 保存用户状态并记录变更
+    def _save_user(self, room_id: str, user: MeetingMember) -> None:
+        user_dict = user.to_dict()
+        redis_client.set_room_user(room_id, user.id, user_dict)
+        self._record_change(room_id, "update", user=user_dict)
+
+
     # 保存房间到Redis
     def _save_room_to_redis(self, room_id: str, room: MeetingRoom) -> None:
         """将房间数据保存到Redis"""
@@ -34,9 +102,89 @@ class RtsService:
         redis_client.set_room_users(room_id, users_data)
 
 
-    # 获取房间
+    # 获取房间（只读，优先使用近端缓存）
     async def get_room(self, room_id: str) -> MeetingRoom:
-        return self._get_room_from_redis(room_id)
+        data = room_cache.get(room_id, self._load_room)
+        return self._build_room(data) if data else None
+
+
+    # 获取房间状态（不加载用户），房间不存在时返回None
+    async def get_room_header(self, room_id: str) -> RoomHeader:
+        cached = room_cache.peek(room_id)
+        room_data = cached.room_data if cached else redis_client.get_room(room_id)
+        return RoomHeader(RoomState.model_validate(room_data)) if room_data else None
+
+
+    # 获取房间成员（只读取真人用户/设备ID集合，用户数据按需读取），房间不存在时返回None
+    async def get_room_members(self, room_id: str) -> RoomMembers:
+        if room_cache.enabled:
+            data = room_cache.get(room_id, self._load_room)
+            return RoomMembers(room_id, data.human_ids, data.device_ids, data.users.get) if data else None
+
+        member_ids = redis_client.get_room_member_ids(room_id)
+        if member_ids is None:
+            return None
+        human_ids, device_ids = member_ids
+        return RoomMembers(room_id, human_ids, device_ids, lambda user_id: redis_client.get_room_user(room_id, user_id))
+
+
+    # 获取房间当前的版本号
+    async def get_room_version(self, room_id: str) -> int:
+        if room_cache.enabled:
+            data = room_cache.get(room_id, self._load_room)
+            return data.version if data else 0
+        return redis_client.get_room_version(room_id)
+
+
+    # 按加入时间分页获取房间内的用户
+    async def get_room_users_page(
+            self, room_id: str,
+            cursor: Optional[str],
+            limit: int,
+            fields: Optional[List[str]] = None
+            ) -> tuple[int, List[Dict[str, Any]], Optional[str]]:
+        """
+        Args:
+            cursor: 上一页返回的游标，None表示第一页
+            limit: 每页数量
+            fields: 只返回指定的字段，None表示返回全部字段
+
+        Returns:
+            (房间用户总数, 用户数据列表, 下一页的游标)，没有更多数据时游标为None
+        """
+        after = None
+        if cursor:
+            # 游标格式: {加入时间}:{用户ID}
+            join_time, user_id = cursor.split(":", 1)
+            after = (int(join_time), user_id)
+        elif redis_client.get_room_members_count(room_id) == 0:
+            redis_client.rebuild_room_members_index(room_id)
+
+        users, next_after = redis_client.get_room_users_page(room_id, after, limit)
+        if fields:
+            users = [{field: user.get(field) for field in fields} for user in users]
+        next_cursor = f"{next_after[0]}:{next_after[1]}" if next_after else None
+        return redis_client.get_room_user_count(room_id), users, next_cursor
+
+
+    # 获取房间内的单个用户
+    async def get_room_user(self, room_id: str, user_id: str) -> MeetingMember:
+        user_data = redis_client.get_room_user(room_id, user_id)
+        return MeetingMember.from_dict(user_data, trusted=True) if user_data else None
+
+
+    # 获取客户端版本之后的房间变更
+    async def get_room_changes_since(self, room_id: str, version: int) -> tuple[int, Optional[List[Dict[str, Any]]]]:
+        """
+        Returns:
+            (当前版本号, 变更列表)，变更日志已被截断或版本号不属于当前房间时变更列表为None，需要全量同步
+        """
+        current, changes = redis_client.get_room_changes(room_id)
+        if version == current:
+            return current, []
+        if version > current or not changes or changes[0]["version"] > version + 1:
+            return current, None
+        return current, [change for change in changes if change["version"] > version]
 
 
     # 获取房间内的用户列表
@@ -61,14 +209,6 @@ class RtsService:
             1: room_id 冲突（已被占用）
             2: 设备已有房间
         """
-        # 检查房间是否已存在
-        if redis_client.exists_room(room_id):
-            return 1
-
-        # 检查设备是否已在房间中
-        if redis_client.get_user_room(host_device_sn):
-            return 2  # 设备已在其他房间中
-
         # 创建房间
         room_state = RoomState(
             app_id=settings.rtc_app_id,
@@ -80,8 +220,12 @@ class RtsService:
             start_time=current_timestamp_s(),
             base_time=current_timestamp_s(),
         )
-        redis_client.set_room(room_id, room_state.model_dump())
-        return 0
+        # 检查房间是否已存在、设备是否已在房间中，并写入房间数据（原子操作，并发创建时只有一个成功）
+        # 版本号从创建时间（毫秒）开始，同一房间号重建后版本号不会与旧房间的重叠
+        return redis_client.create_room(
+            room_id, room_state.model_dump(), host_device_sn,
+            current_timestamp_ms(), settings.room_idle_ttl, current_timestamp_s(),
+        )
 
 
     # 取消会议
@@ -100,45 +244,70 @@ class RtsService:
             - 404: 房间不存在
             - 409: 会议中有人
         """
-        # 检查房间是否存在
-        room_data = redis_client.get_room(room_id)
-        if not room_data:
-            return 404, "房间不存在"
-
-        # 验证是否是主持人
-        room_state = RoomState.model_validate(room_data)
-        if room_state.host_user_id != user_id:
-            return 403, "只有主持人可以取消会议"
-
-        # 检查房间是否有人
-        user_count = redis_client.get_room_user_count(room_id)
-        if user_count > 0:
-            return 409, "会议中有人，无法取消"
-
-        # 删除房间
-        redis_client.delete_room(room_id)
-        return 200, "会议已取消"
+        # 检查房间是否存在、是否是主持人、房间是否有人，并删除房间（原子操作）
+        code = redis_client.cancel_room(room_id, user_id)
+        return code, CANCEL_MEETING_MESSAGES[code]
+
+
+    # 范围内可以容忍短暂延迟的读操作从Redis只读副本读取（见 RedisClient.replica_reads）
+    def replica_reads(self):
+        return redis_client.replica_reads()
+
+
+    # 分批遍历所有房间ID（SSCAN），每批之间让出事件循环，内存占用与房间总数无关
+    async def iter_room_ids(self, batch_size: Optional[int] = None) -> AsyncIterator[List[str]]:
+        batch_size = batch_size or settings.room_scan_batch_size
+        cursor = 0
+        while True:
+            cursor, room_ids = redis_client.scan_room_ids(cursor, batch_size)
+            if room_ids:
+                yield room_ids
+            if cursor == 0:
+                break
+            await asyncio.sleep(0)
+
+
+    # 分批遍历所有房间，返回 [(房间ID, 房间状态), ...]，并移除数据已过期的房间ID
+    async def iter_rooms(self, batch_size: Optional[int] = None) -> AsyncIterator[List[tuple[str, RoomState]]]:
+        async for room_ids in self.iter_room_ids(batch_size):
+            rooms, expired = [], []
+            for room_id, room_data in zip(room_ids, redis_client.get_rooms(room_ids)):
+                if room_data:
+                    rooms.append((room_id, RoomState.model_validate(room_data)))
+                else:
+                    expired.append(room_id)
+            redis_client.remove_room_index(expired)
+            if rooms:
+                yield rooms
+
+
+    # 根据已有的房间键重建房间ID集合（SCAN，兼容集合上线前创建的房间）
+    async def rebuild_room_index(self) -> int:
+        count = 0
+        for room_ids in redis_client.iter_room_keys(settings.room_scan_batch_size):
+            redis_client.add_room_index(room_ids)
+            count += len(room_ids)
+            await asyncio.sleep(0)
+        return count
 
 
     # 查询用户创建的所有会议
     async def get_my_rooms(self, user_id: str) -> List[Dict[str, Any]]:
         meetings = []
-        all_room_ids = redis_client.get_all_room_ids()
-
-        for room_id in all_room_ids:
-            room_data = redis_client.get_room(room_id)
-            if room_data:
-                room_state = RoomState.model_validate(room_data)
-                if room_state.host_user_id == user_id:
-                    user_count = redis_client.get_room_user_count(room_id)
-                    meetings.append({
-                        "room_id": room_state.room_id,
-                        "room_name": room_state.room_name,
-                        "host_user_id": room_state.host_user_id,
-                        "host_user_name": room_state.host_user_name,
-                        "start_time": room_state.start_time,
-                        "user_count": user_count,  # 会议中的用户数量
-                    })
+        async for rooms in self.iter_rooms():
+            my_rooms = [room_state for _, room_state in rooms if room_state.host_user_id == user_id]
+            if not my_rooms:
+                continue
+            user_counts = redis_client.get_room_user_counts([room_state.room_id for room_state in my_rooms])
+            for room_state, user_count in zip(my_rooms, user_counts):
+                meetings.append({
+                    "room_id": room_state.room_id,
+                    "room_name": room_state.room_name,
+                    "host_user_id": room_state.host_user_id,
+                    "host_user_name": room_state.host_user_name,
+                    "start_time": room_state.start_time,
+                    "user_count": user_count,  # 会议中的用户数量
+                })
 
         return meetings
     
@@ -150,11 +319,15 @@ class RtsService:
 
     # 检查房间是否存在
     async def check_room_exists(self, room_id: str) -> bool:
-        return redis_client.exists_room(room_id)
+        return room_cache.peek(room_id) is not None or redis_client.exists_room(room_id)
 
 
     # 检查用户是否在房间中
     async def check_user_in_room(self, room_id: str, user_id: str) -> int:
+        cached = room_cache.peek(room_id)
+        if cached is not None:
+            return 1 if user_id in cached.users else 0
+
         # 检查房间是否存在
         if not redis_client.exists_room(room_id):
             return -1
@@ -164,10 +337,11 @@ class RtsService:
         return 1 if user_data is not None else 0
 
 
-    # 用户进入房间
-    async def join_room(self, user: MeetingMember, room_id: str) -> MeetingRoom:
+    # 用户进入房间，返回 (房间, 本次加入的变更版本号)，房间不存在时返回 (None, 0)
+    async def join_room(self, user: MeetingMember, room_id: str) -> tuple[MeetingRoom, int]:
         # 检查房间是否存在
         room = self._get_room_from_redis(room_id)
+        version = 0
         if room:
             # 使用 MeetingRoom 的业务逻辑来添加用户（自动判断角色）
             room.add_user(user)
@@ -175,35 +349,36 @@ class RtsService:
             redis_client.add_room_user(room_id, user.id, user.to_dict())
             # 建立用户->房间的映射关系
             redis_client.set_user_room(user.id, room_id)
+            version = self._record_change(room_id, "join", user=user.to_dict())
+            # 加载房间后没有其它变更时，房间数据正好是本次加入后的状态
+            if version == room.version + 1:
+                room.version = version
+            await self.touch_room(room_id, force=True)
 
         # 返回完整房间数据（加载所有用户）
-        return room
+        return room, version
 
 
-    # 用户离开房间
-    async def leave_room(self, user_id: str, room_id: str) -> None:
+    # 用户离开房间，返回本次离开的变更版本号（房间不存在或已删除时为0）
+    async def leave_room(self, user_id: str, room_id: str) -> int:
         if redis_client.exists_room(room_id):
             redis_client.remove_room_user(room_id, user_id)
+            redis_client.update_presence(room_id, [user_id], None)
             # 解除用户->房间的映射关系
             redis_client.remove_user_room(user_id)
             if redis_client.get_room_user_count(room_id) == 0:
                 # 房间没有用户了，从Redis中删除
                 redis_client.delete_room(room_id)
+            else:
+                return self._record_change(room_id, "leave", user_id=user_id)
+        return 0
 
 
     # 用户关闭房间
     async def finish_room(self, user_id: str, room_id: str) -> None:
-        room_data = redis_client.get_room(room_id)
-        if room_data:
-            room_state = RoomState.model_validate(room_data)
-            assert room_state.host_user_id == user_id, "只允许主持人关闭房间"
-            # 获取房间内所有用户ID，解除所有用户的映射关系
-            user_ids = redis_client.get_room_user_ids(room_id)
-            for uid in user_ids:
-                redis_client.remove_user_room(uid)
-            # 从Redis中删除房间数据
-            redis_client.clear_room_users(room_id)
-            redis_client.delete_room(room_id)
+        # 解除所有用户的映射关系，并从Redis中删除房间数据（原子操作）
+        result = redis_client.finish_room(room_id, user_id)
+        assert result >= 0, "只允许主持人关闭房间"
 
 
     # 操作自己的摄像头
@@ -211,9 +386,9 @@ class RtsService:
         assert redis_client.exists_room(room_id), "房间不存在"
         user_data = redis_client.get_room_user(room_id, user_id)
         assert user_data, "用户不在房间内"
-        user = MeetingMember.from_dict(user_data)
+        user = MeetingMember.from_dict(user_data, trusted=True)
         user.operate_camera(operate)
-        redis_client.set_room_user(room_id, user_id, user.to_dict())
+        self._save_user(room_id, user)
 
 
     # 操作自己的麦克风
@@ -221,9 +396,9 @@ class RtsService:
         assert redis_client.exists_room(room_id), "房间不存在"
         user_data = redis_client.get_room_user(room_id, user_id)
         assert user_data, "用户不在房间内"
-        user = MeetingMember.from_dict(user_data)
+        user = MeetingMember.from_dict(user_data, trusted=True)
         user.operate_mic(operate)
-        redis_client.set_room_user(room_id, user_id, user.to_dict())
+        self._save_user(room_id, user)
 
 
     # 操作其他用户的摄像头
@@ -231,14 +406,14 @@ class RtsService:
         assert redis_client.exists_room(room_id), "房间不存在"
         user_data = redis_client.get_room_user(room_id, user_id)
         assert user_data, "操作用户不在房间内"
-        user = MeetingMember.from_dict(user_data)
+        user = MeetingMember.from_dict(user_data, trusted=True)
         assert user.role == UserRole.HOST, "只有主持人才能操作其他用户的摄像头"
 
         operate_user_data = redis_client.get_room_user(room_id, operate_user_id)
         assert operate_user_data, "被操作用户不在房间内"
-        operate_user = MeetingMember.from_dict(operate_user_data)
+        operate_user = MeetingMember.from_dict(operate_user_data, trusted=True)
         operate_user.operate_camera(operate)
-        redis_client.set_room_user(room_id, operate_user_id, operate_user.to_dict())
+        self._save_user(room_id, operate_user)
 
 
     # 操作其他用户的麦克风
@@ -246,14 +421,14 @@ class RtsService:
         assert redis_client.exists_room(room_id), "房间不存在"
         user_data = redis_client.get_room_user(room_id, user_id)
         assert user_data, "操作用户不在房间内"
-        user = MeetingMember.from_dict(user_data)
+        user = MeetingMember.from_dict(user_data, trusted=True)
         assert user.role == UserRole.HOST, "只有主持人才能操作其他用户的麦克风"
 
         operate_user_data = redis_client.get_room_user(room_id, operate_user_id)
         assert operate_user_data, "被操作用户不在房间内"
-        operate_user = MeetingMember.from_dict(operate_user_data)
+        operate_user = MeetingMember.from_dict(operate_user_data, trusted=True)
         operate_user.operate_mic(operate)
-        redis_client.set_room_user(room_id, operate_user_id, operate_user.to_dict())
+        self._save_user(room_id, operate_user)
 
 
     # 操作其他用户的屏幕共享权限
@@ -261,23 +436,23 @@ class RtsService:
         assert redis_client.exists_room(room_id), "房间不存在"
         user_data = redis_client.get_room_user(room_id, user_id)
         assert user_data, "操作用户不在房间内"
-        user = MeetingMember.from_dict(user_data)
+        user = MeetingMember.from_dict(user_data, trusted=True)
         assert user.role == UserRole.HOST, "只有主持人才能操作其他用户的屏幕共享权限"
 
         operate_user_data = redis_client.get_room_user(room_id, operate_user_id)
         assert operate_user_data, "被操作用户不在房间内"
-        operate_user = MeetingMember.from_dict(operate_user_data)
+        operate_user = MeetingMember.from_dict(operate_user_data, trusted=True)
         operate_user.update_share_permission(operate)
-        redis_client.set_room_user(room_id, operate_user_id, operate_user.to_dict())
+        self._save_user(room_id, operate_user)
 
     # 操作自己的麦克风权限申请
     async def operate_self_mic_apply(self, user_id: str, room_id: str, operate: Permission) -> None:
         assert redis_client.exists_room(room_id), "房间不存在"
         user_data = redis_client.get_room_user(room_id, user_id)
         assert user_data, "用户不在房间内"
-        user = MeetingMember.from_dict(user_data)
+        user = MeetingMember.from_dict(user_data, trusted=True)
         user.update_mic_permission(operate)
-        redis_client.set_room_user(room_id, user_id, user.to_dict())
+        self._save_user(room_id, user)
     
 
     # 开始共享
@@ -285,9 +460,9 @@ class RtsService:
         assert redis_client.exists_room(room_id), "房间不存在"
         user_data = redis_client.get_room_user(room_id, user_id)
         assert user_data, "用户不在房间内"
-        user = MeetingMember.from_dict(user_data)
+        user = MeetingMember.from_dict(user_data, trusted=True)
         user.start_share(share_type)
-        redis_client.set_room_user(room_id, user_id, user.to_dict())
+        self._save_user(room_id, user)
 
 
     # 结束共享
@@ -295,18 +470,18 @@ class RtsService:
         assert redis_client.exists_room(room_id), "房间不存在"
         user_data = redis_client.get_room_user(room_id, user_id)
         assert user_data, "用户不在房间内"
-        user = MeetingMember.from_dict(user_data)
+        user = MeetingMember.from_dict(user_data, trusted=True)
         user.finish_share()
-        redis_client.set_room_user(room_id, user_id, user.to_dict())
+        self._save_user(room_id, user)
 
     # 申请共享权限
     async def share_permission_apply(self, user_id: str, room_id: str) -> None:
         assert redis_client.exists_room(room_id), "房间不存在"
         user_data = redis_client.get_room_user(room_id, user_id)
         assert user_data, "用户不在房间内"
-        user = MeetingMember.from_dict(user_data)
+        user = MeetingMember.from_dict(user_data, trusted=True)
         user.update_share_permission(Permission.HAS_PERMISSION)
-        redis_client.set_room_user(room_id, user_id, user.to_dict())
+        self._save_user(room_id, user)
 
 
     # 操作所有用户的麦克风
@@ -314,20 +489,21 @@ class RtsService:
         assert redis_client.exists_room(room_id), "房间不存在"
         user_data = redis_client.get_room_user(room_id, user_id)
         assert user_data, "用户不在房间内"
-        user = MeetingMember.from_dict(user_data)
+        user = MeetingMember.from_dict(user_data, trusted=True)
         assert user.role == UserRole.HOST, "只有主持人才能操作所有用户的麦克风"
 
         # 批量读取所有用户
         all_users_data = redis_client.get_room_users(room_id)
         for other_user_id, other_user_data in all_users_data.items():
             if other_user_id != user_id:
-                other_user = MeetingMember.from_dict(other_user_data)
+                other_user = MeetingMember.from_dict(other_user_data, trusted=True)
                 other_user.operate_mic(operate)
                 other_user.update_mic_permission(operate_self_mic_permission)
                 all_users_data[other_user_id] = other_user.to_dict()
 
         # 批量保存所有用户
         redis_client.set_room_users(room_id, all_users_data)
+        self._record_change(room_id, "update_all", users=list(all_users_data.values()))
 
 
     # 观众请求麦克风使用权限后, 主持人答复
@@ -335,14 +511,14 @@ class RtsService:
         assert redis_client.exists_room(room_id), "房间不存在"
         user_data = redis_client.get_room_user(room_id, user_id)
         assert user_data, "用户不在房间内"
-        user = MeetingMember.from_dict(user_data)
+        user = MeetingMember.from_dict(user_data, trusted=True)
         assert user.role == UserRole.HOST, "只有主持人才能审批其他用户的麦克风权限申请"
 
         apply_user_data = redis_client.get_room_user(room_id, apply_user_id)
         assert apply_user_data, "申请用户不在房间内"
-        apply_user = MeetingMember.from_dict(apply_user_data)
+        apply_user = MeetingMember.from_dict(apply_user_data, trusted=True)
         apply_user.update_mic_permission(permit)
-        redis_client.set_room_user(room_id, apply_user_id, apply_user.to_dict())
+        self._save_user(room_id, apply_user)
 
 
     # 操作自己的屏幕共享权限申请
@@ -350,14 +526,14 @@ class RtsService:
         assert redis_client.exists_room(room_id), "房间不存在"
         user_data = redis_client.get_room_user(room_id, user_id)
         assert user_data, "用户不在房间内"
-        user = MeetingMember.from_dict(user_data)
+        user = MeetingMember.from_dict(user_data, trusted=True)
         assert user.role == UserRole.HOST, "只有主持人才能审批其他用户的屏幕共享权限申请"
 
         apply_user_data = redis_client.get_room_user(room_id, apply_user_id)
         assert apply_user_data, "申请用户不在房间内"
-        apply_user = MeetingMember.from_dict(apply_user_data)
+        apply_user = MeetingMember.from_dict(apply_user_data, trusted=True)
         apply_user.update_share_permission(permit)
-        redis_client.set_room_user(room_id, apply_user_id, apply_user.to_dict())
+        self._save_user(room_id, apply_user)
 
 # 创建服务实例
 rtsService = RtsService()
@@ -132,17 +132,45 @@ class JoinMeetingRoomRes(BaseModel):
     wb_room_id: str
     wb_user_id: str
     wb_token: str
+    version: int = 0  # 房间状态版本号，重连时带上用于增量同步
 
 # 断线之后重连响应
 class ReconnectRes(BaseModel):
     room: RoomState
     user: UserModel
     user_list: List[UserModel]
+    version: int = 0  # 房间状态版本号
+
+# 房间状态变更
+class RoomChange(BaseModel):
+    version: int
+    op: str  # join: 用户加入, leave: 用户离开, update: 用户状态变化, update_all: 批量更新用户状态
+    user: Optional[Dict[str, Any]] = None
+    user_id: Optional[str] = None
+    users: Optional[List[Dict[str, Any]]] = None
+
+# 断线之后重连请求参数
+class ResyncReq(BaseModel):
+    version: Optional[int] = Field(default=None, ge=0)  # 客户端已应用的房间状态版本号，不传时返回全量快照
+
+# 断线之后重连的增量响应：只返回客户端版本之后的变更
+class ReconnectDeltaRes(BaseModel):
+    user: UserModel
+    changes: List[RoomChange]
+    version: int  # 房间状态版本号
+
+# 获取用户列表请求参数
+class GetUserListReq(BaseModel):
+    limit: Optional[int] = Field(default=None, ge=0)  # 每页数量，0表示默认值，超过上限时取上限
+    cursor: Optional[str] = Field(default=None, pattern=r"^(\d+:.+)?$")  # 上一页返回的next_cursor: {加入时间}:{用户ID}
+    fields: Optional[List[str]] = None  # 只返回指定字段
 
 # 获取用户列表响应
 class GetUserListRes(BaseModel):
     user_count: int
-    user_list: List[UserModel]
+    user_list: List[Dict[str, Any]]  # 请求指定fields时只包含这些字段
+    version: int = 0  # 房间状态版本号
+    next_cursor: Optional[str] = None  # 分页获取时下一页的游标，没有更多数据时为None
 
 # ================================== Callback ==================================
 
@@ -199,11 +227,13 @@ class RtsInform(BaseModel):
 class InformVcOnJoinRoom(BaseModel):
     user: Dict[str, Any]
     user_count: int
+    version: int  # 本次加入的房间状态版本号，成员通知可能乱序到达，客户端按用户丢弃旧版本的通知
 
 # 用户离开房间通知(vcOnLeaveRoom)
 class InformVcOnLeaveRoom(BaseModel):
     user: Dict[str, Any]
     user_count: int
+    version: int  # 本次离开的房间状态版本号
 
 # 房间销毁通知(vcOnFinishRoom)
 # meeting\src\main\java\com\volcengine\vertcdemo\framework\meeting\internal\IMeetingRtmDef.java:202
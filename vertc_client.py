@@ -2,13 +2,61 @@
 import time
 import json
 import logging
-from vertc_service import rtc_service
+from typing import Any, Awaitable, Callable, Dict
+from vertc_service import rtc_service, classify_exception, RETRIABLE_ERROR_CODES
+from redis_client import redis_client
 from access_token import AccessToken, PrivSubscribeStream, PrivPublishStream
+from agent_templates import agent_templates, TEMPLATE_VOICE_CHAT, TEMPLATE_VIDEO_CHAT
 from config import settings
+from utils import current_timestamp_s
 
 
 logger = logging.getLogger(__name__)
 
+# 云端任务类型
+TASK_PUSH_MIXED_STREAM = "push"
+TASK_RELAY_STREAM = "relay"
+TASK_VOICE_CHAT = "voice_chat"
+TASK_VIDEO_CHAT = "video_chat"
+
+
+# 幂等启动云端任务：先登记到任务注册表，去重窗口内的重复启动直接跳过，启动失败时撤销登记
+async def _start_cloud_task(
+        kind: str, room_id: str,
+        task_id: str,
+        start: Callable[[str], Awaitable[Dict[str, Any]]],
+        body: str
+        ) -> Dict[str, Any]:
+    field = f"{kind}:{task_id}"
+    task_info = {"kind": kind, "room_id": room_id, "task_id": task_id, "started_at": current_timestamp_s()}
+    if not redis_client.register_cloud_task(room_id, field, task_info, settings.cloud_task_dedupe_seconds):
+        logger.info(f"云端任务已在运行，跳过重复启动: {room_id}/{field}")
+        return {"ResponseMetadata": {}, "Result": "duplicate"}
+
+    try:
+        return await start(body)
+    except Exception:
+        redis_client.unregister_cloud_task(room_id, field)
+        raise
+
+
+# 停止云端任务并注销登记；不可重试的失败（如任务已不存在）同样注销，可重试的失败保留登记以便回收
+async def _stop_cloud_task(
+        kind: str, room_id: str,
+        task_id: str,
+        stop: Callable[[str], Awaitable[Dict[str, Any]]],
+        body: str
+        ) -> Dict[str, Any]:
+    field = f"{kind}:{task_id}"
+    try:
+        response = await stop(body)
+    except Exception as e:
+        if classify_exception(e) not in RETRIABLE_ERROR_CODES:
+            redis_client.unregister_cloud_task(room_id, field)
+        raise
+    redis_client.unregister_cloud_task(room_id, field)
+    return response
+
 # ============================ 转推直播 ============================
 
 # 启动合流转推（StartPushMixedStreamToCDN）
@@ -35,7 +83,7 @@ async def start_push_mixed_stream(room_id, user_id, task_id, push_url="", **kwar
     logger.debug(f"启动合流转推请求: {json.dumps(request, indent=2, ensure_ascii=False)}")
 
     body = json.dumps(request)
-    response = await rtc_service.start_push_mixed_stream_to_cdn(body)
+    response = await _start_cloud_task(TASK_PUSH_MIXED_STREAM, room_id, task_id, rtc_service.start_push_mixed_stream_to_cdn, body)
 
     logger.debug(f"启动合流转推响应: {json.dumps(response, indent=2, ensure_ascii=False)}")
     return response
@@ -53,7 +101,7 @@ async def stop_push_stream_to_cdn(room_id, task_id):
     logger.debug(f"停止合流转推请求: {json.dumps(request, indent=2, ensure_ascii=False)}")
 
     body = json.dumps(request)
-    response = await rtc_service.stop_push_stream_to_cdn(body)
+    response = await _stop_cloud_task(TASK_PUSH_MIXED_STREAM, room_id, task_id, rtc_service.stop_push_stream_to_cdn, body)
 
     logger.debug(f"停止合流转推响应: {json.dumps(response, indent=2, ensure_ascii=False)}")
     return response
@@ -85,7 +133,7 @@ async def start_relay_stream(room_id, user_id, task_id, stream_url, **kwargs):
     logger.debug(f"启动在线媒体流输入请求: {json.dumps(request, indent=2, ensure_ascii=False)}")
 
     body = json.dumps(request)
-    response = await rtc_service.start_relay_stream(body)
+    response = await _start_cloud_task(TASK_RELAY_STREAM, room_id, task_id, rtc_service.start_relay_stream, body)
 
     logger.debug(f"启动在线媒体流输入响应: {json.dumps(response, indent=2, ensure_ascii=False)}")
     return response
@@ -103,7 +151,7 @@ async def stop_relay_stream(room_id, task_id):
     logger.debug(f"停止在线媒体流输入请求: {json.dumps(request, indent=2, ensure_ascii=False)}")
 
     body = json.dumps(request)
-    response = await rtc_service.stop_relay_stream(body)
+    response = await _stop_cloud_task(TASK_RELAY_STREAM, room_id, task_id, rtc_service.stop_relay_stream, body)
 
     logger.debug(f"停止在线媒体流输入响应: {json.dumps(response, indent=2, ensure_ascii=False)}")
     return response
@@ -113,44 +161,18 @@ async def stop_relay_stream(room_id, task_id):
 # 启动实时对话式AI（StartVoiceChat）
 async def start_voice_chat(room_id, bot_id, user_id, task_id, dialog_id, **kwargs):
     """启动实时对话式AI"""
-    request = {
-        "AppId": settings.rtc_app_id,
-        "RoomId": room_id,
-        "TaskId": task_id,
-        "Config": {
-            "S2SConfig": {           # 端到端语音模型核心配置
-                "Provider": "volcano",  # 端到端语音模型服务提供商，当前固定取值 volcano
-                "ProviderParams": {  # 语音端到端模型的详细配置
-                    "app": {         # 认证信息
-                        "appid": settings.doubao_s2s_app_id,  # 必填，端到端模型的appid
-                        "token": settings.doubao_s2s_access_token  # 必填，端到端模型的token
-                    },
-                    "tts": {  # TTS配置
-                        "speaker": "zh_female_vv_jupiter_bigtts"  # 指定发音人
-                    },
-                    "dialog": {  # 对话设定
-                        "bot_name": "巨思AI助手",
-                        "system_role": ("##人设\n你的名字叫巨思（英文Juice），是一个全能的超级助手，具备强大的知识库、情感理解能力和解决问题的能力。"
-                            + "你的目标是高效、专业、友好地帮助用户完成各类任务，包括但不限于日常生活、工作安排、信息检索、学习辅导、创意写作、语言翻译和技术支持等；"
-                            + "\n\n##约束\n始终主动、礼貌、有条理；\n回答准确但不冗长，必要时可提供简洁总结+详细解释；\n不清楚的任务会主动澄清，不假设、不误导。"
-                            ),
-                        "speaking_style": "亲切",
-                        "dialog_id": dialog_id  # 可选项，加载相同dialog id的对话历史，如未设置，会默认生成一个唯一的 ID
-                    }
-                }
-            }
-        },
-        "AgentConfig": {
-            "TargetUserId": [user_id],  # 单个房间内，仅支持一个用户与智能体一对一通话
-            "WelcomeMessage": "我是巨思AI助手，有什么需要我为您效劳的吗？",  # 智能体启动后的欢迎词
-            "UserId": bot_id  # 智能体 ID，用于标识智能体
-        }
-    }
+    body = agent_templates.render(
+        TEMPLATE_VOICE_CHAT,
+        room_id=room_id,
+        task_id=task_id,
+        user_id=user_id,
+        bot_id=bot_id,
+        dialog_id=dialog_id,
+    )
 
-    logger.debug(f"启动实时对话式AI请求: {json.dumps(request, indent=2, ensure_ascii=False)}")
+    logger.debug(f"启动实时对话式AI请求: {body}")
 
-    body = json.dumps(request)
-    response = await rtc_service.start_voice_chat(body)
+    response = await _start_cloud_task(TASK_VOICE_CHAT, room_id, task_id, rtc_service.start_voice_chat, body)
 
     logger.debug(f"启动实时对话式AI响应: {json.dumps(response, indent=2, ensure_ascii=False)}")
     return response
@@ -168,7 +190,7 @@ async def stop_voice_chat(room_id, task_id):
     logger.debug(f"关闭实时对话式AI请求: {json.dumps(request, indent=2, ensure_ascii=False)}")
 
     body = json.dumps(request)
-    response = await rtc_service.stop_voice_chat(body)
+    response = await _stop_cloud_task(TASK_VOICE_CHAT, room_id, task_id, rtc_service.stop_voice_chat, body)
 
     logger.debug(f"关闭实时对话式AI响应: {json.dumps(response, indent=2, ensure_ascii=False)}")
     return response
@@ -178,74 +200,17 @@ async def stop_voice_chat(room_id, task_id):
 # 启动音视频互动智能体（StartVideoChat）
 async def start_video_chat(room_id, bot_id, user_id, task_id, **kwargs):
     """启动音视频互动智能体"""
-    request = {
-        "AppId": settings.volc_cai_app_id,
-        "RoomId": room_id,  # 房间ID
-        "TaskId": task_id,  # 任务ID
-        "Config": {
-            "ASRConfig": {
-            "Provider": "volcano",
-            "ProviderParams": {
-                "Mode": "bigmodel",
-                "StreamMode": 0
-            },
-            "VADConfig": {},
-            "InterruptConfig": {}
-            },
-            "LLMConfig": {
-                "Mode": "ArkV3",
-                "ModelName": "doubao-seed-1-6-251015",
-                "TopP": 0.3,
-                "SystemMessages": [
-                    "##人设\n你的名字叫巨思（英文Juice），是一个全能的超级助手，具备强大的知识库、情感理解能力和解决问题的能力。你的目标是高效、专业、友好地帮助用户完成各类任务，包括但不限于日常生活、工作安排、信息检索、学习辅导、创意写作、语言翻译和技术支持等；\n\n##约束\n始终主动、礼貌、有条理；\n回答准确但不冗长，必要时可提供简洁总结+详细解释；\n不清楚的任务会主动澄清，不假设、不误导。"
-                ],
-                "HistoryLength": 10,
-                "ThinkingType": "disabled",
-                "VisionConfig": {
-                    "SnapshotConfig": {},
-                    "StorageConfig": {
-                    "TosConfig": {}
-                    }
-                }
-            },
-            "TTSConfig": {
-                "Provider": "volcano_bidirection",
-                "ProviderParams": {
-                    "Credential": {
-                        "ResourceId": "seed-tts-1.0"
-                    },
-                    "VolcanoTTSParameters": "{\"req_params\":{\"speaker\":\"zh_female_shuangkuaisisi_emo_v2_mars_bigtts\",\"audio_params\":{\"speech_rate\":0}}}"
-                }
-            },
-            "SubtitleConfig": {
-                "DisableRTSSubtitle": True
-            },
-            "InterruptMode": 0,
-            "FunctionCallingConfig": {},
-            "WebSearchAgentConfig": {},
-            "MemoryConfig": {},
-            "MusicAgentConfig": {}
-        },
-        "AgentConfig": {
-            "TargetUserId": [user_id],  # 目前仅支持一个用户与智能体对话
-            "UserId": bot_id,
-            "WelcomeMessage": "我是巨思AI助手，有什么需要我为您效劳的吗？",
-            "Burst": {
-                "Enable": False,
-                "BufferSize": 0,
-                "Interval": 0
-            },
-            "VoicePrint": {
-                "MetaList": None,
-                "VoicePrintList": None
-            }
-        }
-    }
+    body = agent_templates.render(
+        TEMPLATE_VIDEO_CHAT,
+        room_id=room_id,
+        task_id=task_id,
+        user_id=user_id,
+        bot_id=bot_id,
+    )
 
-    logger.debug(f"启动音视频互动智能体请求: {json.dumps(request, indent=2, ensure_ascii=False)}")
+    logger.debug(f"启动音视频互动智能体请求: {body}")
 
-    body = json.dumps(request)
-    response = await rtc_service.start_video_chat(body)
+    response = await _start_cloud_task(TASK_VIDEO_CHAT, room_id, task_id, rtc_service.start_video_chat, body)
 
     logger.debug(f"启动音视频互动智能体响应: {json.dumps(response, indent=2, ensure_ascii=False)}")
     return response
@@ -263,7 +228,7 @@ async def stop_video_chat(room_id, task_id):
     logger.debug(f"关闭音视频互动智能体请求: {json.dumps(request, indent=2, ensure_ascii=False)}")
 
     body = json.dumps(request)
-    response = await rtc_service.stop_video_chat(body)
+    response = await _stop_cloud_task(TASK_VIDEO_CHAT, room_id, task_id, rtc_service.stop_video_chat, body)
 
     logger.debug(f"关闭音视频互动智能体响应: {json.dumps(response, indent=2, ensure_ascii=False)}")
     return response
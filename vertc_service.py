@@ -1,12 +1,276 @@
 # coding:utf-8
+import re
 import json
+import time
+import random
+import asyncio
+import logging
 import threading
+import requests
+from typing import Dict, Optional
 
 from volcengine.ApiInfo import ApiInfo
 from volcengine.Credentials import Credentials
 from volcengine.base.Service import Service
 from volcengine.ServiceInfo import ServiceInfo
 from config import settings
+from redis_client import redis_client
+from metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+# ============================ 限流 ============================
+
+# ResponseMetadata.Error.Code 中表示被限流的错误码
+THROTTLE_ERROR_CODES = {
+    "Throttling",
+    "TooManyRequests",
+    "RequestLimitExceeded",
+    "FlowLimitExceeded",
+    "LimitExceeded",
+    "QPSLimitExceeded",
+}
+
+
+# 从响应中提取错误码
+def get_error_code(res_json: Dict) -> Optional[str]:
+    if not isinstance(res_json, dict):
+        return None
+    error = (res_json.get("ResponseMetadata") or {}).get("Error")
+    if not error:
+        return None
+    return error.get("Code") or "Unknown"
+
+
+# 判断是否为限流错误（响应体或非200状态码时抛出的异常内容）
+def is_throttled(error_code: Optional[str] = None, error_text: str = "") -> bool:
+    if error_code in THROTTLE_ERROR_CODES:
+        return True
+    return any(code in error_text for code in THROTTLE_ERROR_CODES)
+
+
+# 本地令牌桶（单进程）
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._ts = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._ts) * self.rate)
+        self._ts = now
+
+    # 修改速率：先按原速率补充到当前时间，保留已有的令牌（不超过新的容量）
+    def set_rate(self, rate: float, burst: float) -> None:
+        self._refill()
+        self.rate = rate
+        self.burst = burst
+        self._tokens = min(self._tokens, burst)
+
+    # 尝试获取一个令牌，返回需要等待的秒数（0表示已获取）
+    def try_acquire(self) -> float:
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self.rate
+
+
+# 按Action限流器：令牌桶 + FIFO排队 + 限流错误自适应退避
+class ActionRateLimiter:
+    MIN_FACTOR = 0.1      # 自适应退避时速率的最低比例
+    BACKOFF = 0.5         # 每次被限流后速率乘以该系数
+    RECOVER_STEP = 0.05   # 每次成功调用后速率比例的恢复步长
+
+    def __init__(self, default_qps: float, action_qps: Dict[str, float], shared: bool = False):
+        self._default_qps = default_qps
+        self._action_qps = dict(action_qps)
+        self._shared = shared
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._factors: Dict[str, float] = {}
+
+    # 当前生效的QPS（配置值 * 自适应系数）
+    def get_rate(self, action: str) -> float:
+        qps = self._action_qps.get(action, self._default_qps)
+        return max(qps * self._factors.get(action, 1.0), 0.1)
+
+    # 配置某个Action的QPS
+    def set_qps(self, action: str, qps: float) -> None:
+        self._action_qps[action] = qps
+        self._buckets.pop(action, None)
+
+    def _try_acquire(self, action: str) -> float:
+        rate = self.get_rate(action)
+        burst = max(1.0, rate)
+        if self._shared:
+            try:
+                return redis_client.acquire_rate_token(action, rate, burst)
+            except Exception as e:
+                logger.warning(f"共享令牌桶不可用，退化为本地限流: {action}, {e}")
+
+        bucket = self._buckets.get(action)
+        if bucket is None:
+            bucket = TokenBucket(rate, burst)
+            self._buckets[action] = bucket
+        elif bucket.rate != rate:
+            # 自适应系数变化时沿用原令牌桶，否则恢复期间每次成功调用都会得到一个满的令牌桶
+            bucket.set_rate(rate, burst)
+        return bucket.try_acquire()
+
+    # 获取令牌，令牌不足时按FIFO顺序排队等待
+    async def acquire(self, action: str) -> None:
+        lock = self._locks.setdefault(action, asyncio.Lock())
+        async with lock:
+            wait = self._try_acquire(action)
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = self._try_acquire(action)
+
+    # 被限流后降低速率
+    def on_throttled(self, action: str) -> None:
+        factor = max(self.MIN_FACTOR, self._factors.get(action, 1.0) * self.BACKOFF)
+        self._factors[action] = factor
+        logger.warning(f"OpenAPI被限流: {action}, 速率降低为 {self.get_rate(action):.2f} QPS")
+
+    # 调用成功后逐步恢复速率
+    def on_success(self, action: str) -> None:
+        factor = self._factors.get(action)
+        if factor is not None:
+            factor += self.RECOVER_STEP
+            if factor >= 1.0:
+                del self._factors[action]
+            else:
+                self._factors[action] = factor
+
+
+# ============================ 重试与熔断 ============================
+
+# 可重试的错误码：限流、上游内部错误、超时、网络异常等
+RETRIABLE_ERROR_CODES = THROTTLE_ERROR_CODES | {
+    "InternalError",
+    "InternalServiceError",
+    "ServiceUnavailable",
+    "ServiceBusy",
+    "SystemBusy",
+    "RequestTimeout",
+    "Timeout",
+    "EmptyResponse",
+    "NetworkError",
+    "HTTPError",
+}
+
+# 幂等的API：重复调用不会产生额外副作用（Start*以TaskId去重）
+# 消息类API（SendUnicast等）不在其中：这里只在明确被限流时重试，其余失败交给调用方；
+# 经 rts_outbox 发送的消息由出站队列稍后重投，重复送达靠客户端按 request_id / version 去重
+IDEMPOTENT_APIS = {
+    "StartRecord",
+    "StopRecord",
+    "GetRecordTask",
+    "StartPushMixedStreamToCDN",
+    "StopPushStreamToCDN",
+    "StartRelayStream",
+    "StopRelayStream",
+    "StartVoiceChat",
+    "StopVoiceChat",
+    "StartVideoChat",
+    "StopVideoChat",
+    "BanRoomUser",
+}
+
+_ERROR_CODE_PATTERN = re.compile(r'"Code"\s*:\s*"([^"]+)"')
+
+
+# 异常分类：非200响应体中的错误码，或网络类异常
+def classify_exception(e: Exception) -> str:
+    if isinstance(e, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return "NetworkError"
+    match = _ERROR_CODE_PATTERN.search(str(e))
+    return match.group(1) if match else "HTTPError"
+
+
+# 判断是否可以重试：限流的请求未被执行，任何API都可重试；其它可重试错误仅限幂等API
+def is_retriable(api: str, error_code: str) -> bool:
+    if error_code in THROTTLE_ERROR_CODES:
+        return True
+    return error_code in RETRIABLE_ERROR_CODES and api in IDEMPOTENT_APIS
+
+
+# 指数退避 + 全随机抖动
+def backoff_delay(attempt: int) -> float:
+    cap = min(settings.vertc_retry_max_delay, settings.vertc_retry_base_delay * (2 ** attempt))
+    return random.uniform(0, cap)
+
+
+# 熔断器打开时快速失败
+class CircuitOpenError(Exception):
+    def __init__(self, api: str):
+        super().__init__(f"{api}: circuit breaker is open")
+        self.api = api
+
+
+# 按API的熔断器：连续失败达到阈值后打开，冷却后半开放行一个探测请求
+class CircuitBreaker:
+    CLOSED = 0
+    OPEN = 1
+    HALF_OPEN = 2
+
+    def __init__(self, api: str, failure_threshold: int, reset_timeout: float):
+        self.api = api
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CircuitBreaker.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._export()
+
+    def _export(self) -> None:
+        metrics.set("vertc_circuit_state", self.state, api=self.api)
+
+    def _set_state(self, state: int) -> None:
+        if self.state != state:
+            logger.warning(f"OpenAPI熔断器状态变化: {self.api}, {self.state} -> {state}")
+            self.state = state
+            self._export()
+
+    # 冷却期内直接拒绝，不改变状态，可在排队限流前快速失败
+    def is_open(self) -> bool:
+        return self.state == CircuitBreaker.OPEN and time.monotonic() - self._opened_at < self.reset_timeout
+
+    # 是否允许发起请求
+    def allow_request(self) -> bool:
+        if self.state == CircuitBreaker.OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._set_state(CircuitBreaker.HALF_OPEN)
+            self._probing = False
+        if self.state == CircuitBreaker.HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    # 探测请求未得出结果（如被取消）时释放探测名额，让下一个请求继续探测
+    def release_probe(self) -> None:
+        self._probing = False
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._probing = False
+        self._set_state(CircuitBreaker.CLOSED)
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._probing = False
+        if self.state == CircuitBreaker.HALF_OPEN or self._failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            if self.state != CircuitBreaker.OPEN:
+                metrics.inc("vertc_circuit_open_total", api=self.api)
+            self._set_state(CircuitBreaker.OPEN)
 
 
 class VertcService(Service):
@@ -23,6 +287,12 @@ class VertcService(Service):
         self.service_info = VertcService.get_service_info()
         self.api_info = VertcService.get_api_info()
         super(VertcService, self).__init__(self.service_info, self.api_info)
+        self.rate_limiter = ActionRateLimiter(
+            settings.vertc_rate_limit_default_qps,
+            settings.vertc_rate_limit_action_qps,
+            shared=settings.vertc_rate_limit_shared,
+        )
+        self._circuit_breakers: Dict[str, CircuitBreaker] = {}
 
     @staticmethod
     def get_service_info():
@@ -64,11 +334,98 @@ class VertcService(Service):
         }
         return api_info
 
+    # 统一的OpenAPI调用入口：熔断检查 + 失败重试（指数退避 + 随机抖动）
+    async def _request(self, api, body=None, params=None):
+        breaker = self._get_circuit_breaker(api)
+        max_attempts = max(1, settings.vertc_retry_max_attempts)
+
+        for attempt in range(max_attempts):
+            if breaker.is_open():
+                metrics.inc("vertc_requests_total", api=api, result="circuit_open")
+                raise CircuitOpenError(api)
+
+            # 先排队拿到限流令牌再占用探测名额，避免半开时探测请求卡在限流队列里
+            # StartVideoChat 与 StartVoiceChat 的Action相同但配额独立，按API名称限流
+            if settings.vertc_rate_limit_enabled:
+                await self.rate_limiter.acquire(api)
+
+            if not breaker.allow_request():
+                metrics.inc("vertc_requests_total", api=api, result="circuit_open")
+                raise CircuitOpenError(api)
+
+            exc = None
+            try:
+                res = await self._send_once(api, body, params)
+                if res == '':
+                    error_code = "EmptyResponse"
+                elif '"Error"' in res:
+                    error_code = get_error_code(json.loads(res))
+                else:
+                    error_code = None
+            except Exception as e:
+                exc = e
+                error_code = classify_exception(e)
+            except BaseException:
+                # 取消等非业务异常：结果未知，既不算成功也不算失败，但必须释放探测名额
+                breaker.release_probe()
+                raise
+
+            if error_code is None:
+                breaker.record_success()
+                metrics.inc("vertc_requests_total", api=api, result="ok")
+                return res
+
+            # 限流和参数类错误不代表上游不可用，不计入熔断
+            if error_code in RETRIABLE_ERROR_CODES and error_code not in THROTTLE_ERROR_CODES:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            metrics.inc("vertc_requests_total", api=api, result=error_code)
+
+            if attempt + 1 >= max_attempts or not is_retriable(api, error_code):
+                if exc is not None:
+                    raise exc
+                return res
+
+            delay = backoff_delay(attempt)
+            metrics.inc("vertc_retries_total", api=api)
+            logger.warning(f"OpenAPI调用失败，{delay:.2f}s后重试: {api}, 错误码: {error_code}, 第{attempt + 1}次")
+            await asyncio.sleep(delay)
+
+    # 单次OpenAPI调用（调用方已完成限流排队），并根据限流错误自适应退避
+    async def _send_once(self, api, body=None, params=None):
+        try:
+            # SDK使用同步HTTP请求，放到线程中执行，避免阻塞事件循环，并发调用才能真正并行
+            if body is None:
+                res = await asyncio.to_thread(self.get, api, params or {})
+            else:
+                res = await asyncio.to_thread(self.json, api, {}, body)
+        except Exception as e:
+            if is_throttled(error_text=str(e)):
+                self.rate_limiter.on_throttled(api)
+            raise
+
+        if '"Error"' in res and is_throttled(get_error_code(json.loads(res))):
+            self.rate_limiter.on_throttled(api)
+        else:
+            self.rate_limiter.on_success(api)
+        return res
+
+    def _get_circuit_breaker(self, api) -> 'CircuitBreaker':
+        breaker = self._circuit_breakers.get(api)
+        if breaker is None:
+            breaker = self._circuit_breakers[api] = CircuitBreaker(
+                api,
+                settings.vertc_circuit_failure_threshold,
+                settings.vertc_circuit_reset_timeout,
+            )
+        return breaker
+
     # ============================ 云端录制 ============================
 
     # 开始录制
     async def start_record(self, body):
-        res = self.json("StartRecord", {}, body)
+        res = await self._request("StartRecord", body)
         if res == '':
             raise Exception("StartRecord: empty response")
         res_json = json.loads(res)
@@ -77,7 +434,7 @@ class VertcService(Service):
 
     # 停止录制
     async def stop_record(self, body):
-        res = self.json("StopRecord", {}, body)
+        res = await self._request("StopRecord", body)
         if res == '':
             raise Exception("StopRecord: empty response")
         res_json = json.loads(res)
@@ -86,7 +443,7 @@ class VertcService(Service):
 
     # 获取录制任务详情
     async def get_record_task(self, params):
-        res = self.get("GetRecordTask", params)
+        res = await self._request("GetRecordTask", params=params)
         if res == '':
             raise Exception("GetRecordTask: empty response")
         res_json = json.loads(res)
@@ -96,7 +453,7 @@ class VertcService(Service):
 
     # 启动合流转推（StartPushMixedStreamToCDN）
     async def start_push_mixed_stream_to_cdn(self, body):
-        res = self.json("StartPushMixedStreamToCDN", {}, body)
+        res = await self._request("StartPushMixedStreamToCDN", body)
         if res == '':
             raise Exception("StartPushMixedStreamToCDN: empty response")
         res_json = json.loads(res)
@@ -105,7 +462,7 @@ class VertcService(Service):
 
     # 停止转推直播（StopPushStreamToCDN）
     async def stop_push_stream_to_cdn(self, body):
-        res = self.json("StopPushStreamToCDN", {}, body)
+        res = await self._request("StopPushStreamToCDN", body)
         if res == '':
             raise Exception("StopPushStreamToCDN: empty response")
         res_json = json.loads(res)
@@ -115,7 +472,7 @@ class VertcService(Service):
 
     # 开始在线媒体流输入（StartRelayStream）
     async def start_relay_stream(self, body):
-        res = self.json("StartRelayStream", {}, body)
+        res = await self._request("StartRelayStream", body)
         if res == '':
             raise Exception("StartRelayStream: empty response")
         res_json = json.loads(res)
@@ -124,7 +481,7 @@ class VertcService(Service):
 
     # 停止在线媒体流输入（StopRelayStream）
     async def stop_relay_stream(self, body):
-        res = self.json("StopRelayStream", {}, body)
+        res = await self._request("StopRelayStream", body)
         if res == '':
             raise Exception("StopRelayStream: empty response")
         res_json = json.loads(res)
@@ -134,7 +491,7 @@ class VertcService(Service):
 
     # 启动音视频互动智能体（StartVoiceChat）
     async def start_voice_chat(self, body):
-        res = self.json("StartVoiceChat", {}, body)
+        res = await self._request("StartVoiceChat", body)
         if res == '':
             raise Exception("StartVoiceChat: empty response")
         res_json = json.loads(res)
@@ -143,7 +500,7 @@ class VertcService(Service):
 
     # 停止音视频互动智能体（StopVoiceChat）
     async def stop_voice_chat(self, body):
-        res = self.json("StopVoiceChat", {}, body)
+        res = await self._request("StopVoiceChat", body)
         if res == '':
             raise Exception("StopVoiceChat: empty response")
         res_json = json.loads(res)
@@ -153,7 +510,7 @@ class VertcService(Service):
 
     # 启动音视频互动智能体（StartVoiceChat）
     async def start_video_chat(self, body):
-        res = self.json("StartVideoChat", {}, body)
+        res = await self._request("StartVideoChat", body)
         if res == '':
             raise Exception("StartVideoChat: empty response")
         res_json = json.loads(res)
@@ -162,7 +519,7 @@ class VertcService(Service):
 
     # 停止音视频互动智能体（StopVideoChat）
     async def stop_video_chat(self, body):
-        res = self.json("StopVideoChat", {}, body)
+        res = await self._request("StopVideoChat", body)
         if res == '':
             raise Exception("StopVideoChat: empty response")
         res_json = json.loads(res)
@@ -173,33 +530,39 @@ class VertcService(Service):
 # 发送房间外点对点消息（SendUnicast）
     async def send_unicast(self, body):
         try:
-            res = self.json("SendUnicast", {}, body)
+            res = await self._request("SendUnicast", body)
             if res == '':
                 return {"ResponseMetadata": {"Error": {"Code": "EmptyResponse", "Message": "Empty response from server"}}}
             res_json = json.loads(res)
             return res_json
+        except CircuitOpenError as e:
+            return {"ResponseMetadata": {"Error": {"Code": "CircuitOpen", "Message": str(e)}}}
         except Exception as e:
             return {"ResponseMetadata": {"Error": {"Code": "APICallFailed", "Message": f"API call failed: {str(e)}"}}}
 
 # 发送房间内广播消息（SendBroadcast）
     async def send_broadcast(self, body):
         try:
-            res = self.json("SendBroadcast", {}, body)
+            res = await self._request("SendBroadcast", body)
             if res == '':
                 return {"ResponseMetadata": {"Error": {"Code": "EmptyResponse", "Message": "Empty response from server"}}}
             res_json = json.loads(res)
             return res_json
+        except CircuitOpenError as e:
+            return {"ResponseMetadata": {"Error": {"Code": "CircuitOpen", "Message": str(e)}}}
         except Exception as e:
             return {"ResponseMetadata": {"Error": {"Code": "APICallFailed", "Message": f"API call failed: {str(e)}"}}}
 
 # 发送房间内点对点消息（SendRoomUnicast）
     async def send_room_unicast(self, body):
         try:
-            res = self.json("SendRoomUnicast", {}, body)
+            res = await self._request("SendRoomUnicast", body)
             if res == '':
                 return {"ResponseMetadata": {"Error": {"Code": "EmptyResponse", "Message": "Empty response from server"}}}
             res_json = json.loads(res)
             return res_json
+        except CircuitOpenError as e:
+            return {"ResponseMetadata": {"Error": {"Code": "CircuitOpen", "Message": str(e)}}}
         except Exception as e:
             return {"ResponseMetadata": {"Error": {"Code": "APICallFailed", "Message": f"API call failed: {str(e)}"}}}
 
@@ -207,11 +570,13 @@ class VertcService(Service):
     # 封禁房间用户（BanRoomUser）
     async def ban_room_user(self, body):
         try:
-            res = self.json("BanRoomUser", {}, body)
+            res = await self._request("BanRoomUser", body)
             if res == '':
                 return {"ResponseMetadata": {"Error": {"Code": "EmptyResponse", "Message": "Empty response from server"}}}
             res_json = json.loads(res)
             return res_json
+        except CircuitOpenError as e:
+            return {"ResponseMetadata": {"Error": {"Code": "CircuitOpen", "Message": str(e)}}}
         except Exception as e:
             return {"ResponseMetadata": {"Error": {"Code": "APICallFailed", "Message": f"API call failed: {str(e)}"}}}
 